@@ -8,19 +8,12 @@ from __future__ import annotations
 
 import argparse
 import logging
-from typing import Callable, Dict
-
-from src.scripts.hyper_api.generate_hyper_from_csv import (
-    main as main_generate_hyper_from_csv,
-)
-from src.scripts.hyper_api.generate_hyper_with_databricks import (
-    main as main_generate_hyper_with_databricks,
-)
-from src.scripts.hyper_api.publish_hyper import main as main_publish_hyper
+
+from src.scripts.registry import available_scripts, load_script
 from src.utils.logging_setup import setup_logging
+from src.utils.metrics import MetricsRegistry
 from src.wrapper.config import ConfigWrapper
 
-ScriptFn = Callable[[ConfigWrapper, argparse.Namespace], None]
 logger = logging.getLogger(__name__)
 
 
@@ -34,13 +27,14 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--script",
         required=True,
-        choices=[
-            "generate_hyper_from_csv",
-            "generate_hyper_with_databricks",
-            "publish_hyper",
-        ],
+        # Script modules are only imported once selected
+        choices=sorted(available_scripts()),
         help="Which script to run",
     )
+    parser.add_argument(
+        "--manifest",
+        help="Path to the TOML job manifest (run_manifest script)",
+    )
 
     return parser
 
@@ -62,14 +56,14 @@ def main() -> int:
     # Load and validate configuration (raises ValueError if missing env vars)
     cfg = ConfigWrapper()
 
-    scripts: Dict[str, ScriptFn] = {
-        "generate_hyper_from_csv": main_generate_hyper_from_csv,
-        "generate_hyper_with_databricks": main_generate_hyper_with_databricks,
-        "publish_hyper": main_publish_hyper,
-    }
-
-    script_fn = scripts.get(args.script)
-    script_fn(cfg, args)
+    script_fn = load_script(args.script)
+    try:
+        script_fn(cfg, args)
+    finally:
+        # Export the stage metrics of the run, including failed runs
+        textfile = MetricsRegistry().export(job=args.script)
+        if textfile:
+            logger.info(f"Metrics written to {textfile}")
 
     return 0
 
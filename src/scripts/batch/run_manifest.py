@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import tomllib
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from src.scripts.hyper_api.generate_hyper_from_csv import (
+    generate_from_csv,
+    generate_tables_from_csv,
+)
+from src.scripts.hyper_api.generate_hyper_with_databricks import (
+    generate_from_databricks,
+    generate_tables_from_databricks,
+)
+from src.scripts.hyper_api.publish_hyper import (
+    DELTA_APPEND,
+    DELTA_MODES,
+    publish_delta,
+    publish_hyper,
+    publish_with_backoff,
+)
+from src.utils.aggregates import Aggregate, aggregate_path
+from src.utils.incremental import UPSERT, IncrementalConfig
+from src.utils.log_duration import log_duration
+from src.utils.luid_index import LuidIndex
+from src.utils.throttle import AdaptiveLimiter
+from src.utils.transforms import Transform
+from src.wrapper.config import ConfigWrapper
+from src.wrapper.tableau_wrapper import TableauClient
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("csv", "databricks")
+
+
+@dataclass(frozen=True)
+class PublishTarget:
+    project_luid: str = ""
+    # Project path from the top level (e.g. "Sales/Extracts"), as an
+    # alternative to project_luid
+    project: str = ""
+    mode: str = "Overwrite"
+    resumable: bool = True
+    # Publish only the rows of the last incremental run: "append" or
+    # "update" (see publish_delta). Replaces mode when set.
+    delta: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if bool(self.project_luid) == bool(self.project):
+            raise ValueError("Set exactly one of project_luid and project")
+        if self.delta is not None and self.delta not in DELTA_MODES:
+            raise ValueError(f"Unsupported delta mode: {self.delta}")
+
+
+@dataclass(frozen=True)
+class ExtractJob:
+    name: str
+    source: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    incremental: Optional[IncrementalConfig] = None
+    publish: Optional[PublishTarget] = None
+
+
+@dataclass(frozen=True)
+class Manifest:
+    extracts: List[ExtractJob]
+    max_generate: int = 2
+    max_publish: int = 2
+
+
+def load_manifest(path: Path) -> Manifest:
+    """Parse a TOML job manifest.
+
+    Example:
+        [limits]
+        max_generate = 4
+        max_publish = 2
+
+        [[extracts]]
+        name = "pokemon"
+        source = "csv"
+        csv_filepath = "sample_data/pokemon.csv"
+
+        [extracts.publish]
+        project_luid = "..."
+        mode = "Overwrite"
+
+    A multi-table extract lists its tables instead of a single source
+    (queries for Databricks, file paths for CSV):
+
+        [extracts.tables]
+        orders = "SELECT * FROM sales.orders"
+        customers = "SELECT * FROM sales.customers"
+
+    Databricks extracts can be reshaped by Hyper while loading with a
+    transform table (transforms, keyed by table, for multi-table extracts):
+
+        [extracts.transform]
+        filter = "amount > 0"
+        rename = { cust_id = "customer_id" }
+        dedup_on = ["order_id"]
+
+    Aggregates are built from the loaded table, each in a companion file
+    published with the extract (or as a table of it, companion = false);
+    multi-table extracts name the source table of each aggregate:
+
+        [[extracts.aggregates]]
+        name = "daily"
+        table = "orders"
+        group_by = { day = "CAST(order_date AS DATE)", country = "country" }
+        measures = { revenue = "SUM(amount)", orders = "COUNT(*)" }
+
+    Args:
+        path: Path to the manifest file.
+
+    Returns:
+        Parsed manifest.
+    """
+    with open(path, "rb") as f:
+        raw = tomllib.load(f)
+
+    extracts: List[ExtractJob] = []
+    for entry in raw.get("extracts", []):
+        entry = dict(entry)
+        name = entry.pop("name", None)
+        source = entry.pop("source", None)
+        if not name or source not in SOURCES:
+            raise ValueError(
+                f"Each extract needs a name and a source in {SOURCES}: {entry}"
+            )
+
+        incremental = entry.pop("incremental", None)
+        publish = entry.pop("publish", None)
+        if incremental:
+            incremental = IncrementalConfig(**incremental)
+        if publish:
+            publish = PublishTarget(**publish)
+        if incremental and "tables" in entry:
+            raise ValueError(
+                f"Incremental refresh is not supported for multi-table extracts: "
+                f"{name}"
+            )
+        if publish and publish.delta:
+            if not incremental or source != "databricks":
+                raise ValueError(
+                    "Delta publishing requires an incremental Databricks "
+                    f"extract: {name}"
+                )
+            # An upserted delta holds new versions of published rows
+            if incremental.mode == UPSERT and publish.delta == DELTA_APPEND:
+                raise ValueError(
+                    f"Upsert extracts publish deltas with delta = 'update': {name}"
+                )
+        if ("transform" in entry or "transforms" in entry) and source != "databricks":
+            raise ValueError(f"Transforms require a Databricks extract: {name}")
+        if "transform" in entry:
+            entry["transform"] = Transform(**entry["transform"])
+        if "transforms" in entry:
+            entry["transforms"] = {
+                table: Transform(**transform)
+                for table, transform in entry["transforms"].items()
+            }
+        if "aggregates" in entry:
+            entry["aggregates"] = _parse_aggregates(
+                name, entry["aggregates"], multi_table="tables" in entry
+            )
+        extracts.append(
+            ExtractJob(
+                name=name,
+                source=source,
+                options=entry,
+                incremental=incremental or None,
+                publish=publish or None,
+            )
+        )
+
+    names = [job.name for job in extracts]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate extract names in manifest: {duplicates}")
+
+    limits = raw.get("limits", {})
+    return Manifest(
+        extracts=extracts,
+        max_generate=limits.get("max_generate", 2),
+        max_publish=limits.get("max_publish", 2),
+    )
+
+
+def _parse_aggregates(
+    name: str, raw: List[Dict[str, Any]], multi_table: bool
+) -> Union[List[Aggregate], Dict[str, List[Aggregate]]]:
+    """Parse the aggregates of an extract, keyed by table if multi-table."""
+    if not multi_table:
+        if any("table" in entry for entry in raw):
+            raise ValueError(
+                f"Aggregates of single-table extracts take no table: {name}"
+            )
+        return [Aggregate(**entry) for entry in raw]
+
+    by_table: Dict[str, List[Aggregate]] = {}
+    for entry in raw:
+        entry = dict(entry)
+        table = entry.pop("table", None)
+        if not table:
+            raise ValueError(f"Aggregates of multi-table extracts need a table: {name}")
+        by_table.setdefault(table, []).append(Aggregate(**entry))
+    return by_table
+
+
+def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
+    """
+    Generate and publish every extract listed in a job manifest.
+
+    Generation jobs run concurrently up to max_generate. Each extract is
+    handed to the publishing pool (up to max_publish concurrent uploads) as
+    soon as its Hyper file is ready, so publishing overlaps with the
+    generation of the remaining extracts.
+
+    Args:
+        cfg: Configuration wrapper containing environment settings.
+        args: Command-line arguments containing script name and manifest path.
+    """
+    logger.info(f"Starting script: {args.script}")
+
+    if not args.manifest:
+        raise ValueError("--manifest is required for the run_manifest script")
+
+    manifest = load_manifest(Path(args.manifest))
+    logger.info(f"Loaded {len(manifest.extracts)} extracts from {args.manifest}")
+
+    with log_duration(args.script):
+        failures = run_manifest(manifest, work_root=Path("temp"))
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(manifest.extracts)} extracts failed: "
+            f"{sorted(failures)}"
+        )
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def run_manifest(manifest: Manifest, work_root: Path) -> Dict[str, BaseException]:
+    """Run the generation and publishing jobs of a manifest.
+
+    Args:
+        manifest: Parsed manifest.
+        work_root: Root directory of the generated files.
+
+    Returns:
+        Exceptions of the failed extracts, keyed by extract name.
+    """
+    failures: Dict[str, BaseException] = {}
+    needs_publish = any(job.publish for job in manifest.extracts)
+    tsc = TableauClient() if needs_publish else None
+    luid_index = LuidIndex(tsc) if needs_publish else None
+    # Publishes start one at a time and ramp up to max_publish, backing off
+    # when the server throttles them
+    limiter = AdaptiveLimiter(initial=1, maximum=manifest.max_publish)
+
+    try:
+        if tsc is not None:
+            tsc.sign_in()
+
+        with ThreadPoolExecutor(
+            max_workers=manifest.max_generate, thread_name_prefix="generate"
+        ) as generate_pool, ThreadPoolExecutor(
+            max_workers=manifest.max_publish, thread_name_prefix="publish"
+        ) as publish_pool:
+            generating: Dict[Future, ExtractJob] = {
+                generate_pool.submit(_generate, job, work_root): job
+                for job in manifest.extracts
+            }
+            publishing: Dict[Future, ExtractJob] = {}
+
+            # Start publishing each extract as soon as its file is ready
+            for future in as_completed(generating):
+                job = generating[future]
+                try:
+                    hyper_path = future.result()
+                except Exception as exc:
+                    logger.error("Generation of %s failed: %s", job.name, exc)
+                    failures[job.name] = exc
+                    continue
+
+                logger.info("Generated %s: %s", job.name, hyper_path)
+                if job.publish is not None:
+                    try:
+                        project_luid = job.publish.project_luid or (
+                            luid_index.project_luid(job.publish.project)
+                        )
+                    except Exception as exc:
+                        logger.error("Cannot resolve %s: %s", job.publish.project, exc)
+                        failures[job.name] = exc
+                        continue
+
+                    if job.publish.delta:
+                        publish_args = dict(
+                            publish_fn=publish_delta,
+                            delta_mode=job.publish.delta,
+                            key_columns=(
+                                job.incremental.key_columns
+                                if job.incremental.mode == UPSERT
+                                else ()
+                            ),
+                        )
+                    else:
+                        publish_args = dict(
+                            publish_fn=publish_hyper, mode=job.publish.mode
+                        )
+                    publishing[
+                        publish_pool.submit(
+                            publish_with_backoff,
+                            tsc,
+                            limiter,
+                            hyper_filepath=str(hyper_path),
+                            project_luid=project_luid,
+                            resumable=job.publish.resumable,
+                            **publish_args,
+                        )
+                    ] = job
+
+                    # Aggregates are rebuilt in full, so their companion
+                    # files always replace the published ones
+                    for companion_path in _companion_paths(job, hyper_path):
+                        publishing[
+                            publish_pool.submit(
+                                publish_with_backoff,
+                                tsc,
+                                limiter,
+                                hyper_filepath=str(companion_path),
+                                project_luid=project_luid,
+                                resumable=job.publish.resumable,
+                                mode="Overwrite",
+                            )
+                        ] = job
+
+            for future in as_completed(publishing):
+                job = publishing[future]
+                try:
+                    future.result()
+                    logger.info("Published %s", job.name)
+                except Exception as exc:
+                    logger.error("Publishing of %s failed: %s", job.name, exc)
+                    failures[job.name] = exc
+    finally:
+        if tsc is not None:
+            tsc.sign_out()
+
+    return failures
+
+
+def _companion_paths(job: ExtractJob, hyper_path: Path) -> List[Path]:
+    aggregates = job.options.get("aggregates") or []
+    if isinstance(aggregates, dict):
+        aggregates = [a for table in aggregates.values() for a in table]
+    return [aggregate_path(hyper_path, a.name) for a in aggregates if a.companion]
+
+
+def _generate(job: ExtractJob, work_root: Path) -> Path:
+    work_dir = work_root / job.name / "run_manifest"
+
+    with log_duration(f"generate {job.name}"):
+        tables = job.options.get("tables")
+        if job.source == "csv" and tables:
+            return generate_tables_from_csv(
+                csv_filepaths={table: Path(p) for table, p in tables.items()},
+                hyper_filename=job.name,
+                work_dir=work_dir,
+                delimiter=job.options.get("delimiter", ","),
+                encoding=job.options.get("encoding", "utf-8"),
+                column_types=job.options.get("column_types"),
+                aggregates=job.options.get("aggregates"),
+            )
+        if job.source == "csv":
+            return generate_from_csv(
+                csv_filepath=Path(job.options["csv_filepath"]),
+                work_dir=work_dir,
+                hyper_filename=job.name,
+                delimiter=job.options.get("delimiter", ","),
+                encoding=job.options.get("encoding", "utf-8"),
+                column_types=job.options.get("column_types"),
+                incremental=job.incremental,
+                aggregates=job.options.get("aggregates", ()),
+            )
+
+        options = {
+            key: job.options[key]
+            for key in (
+                "batch_size",
+                "max_batch_bytes",
+                "cache_dir",
+                "cache_max_bytes",
+                "cache_tables",
+                "staging",
+                "allow_disk_spool",
+                "build_shards",
+                "pipeline_depth",
+                "column_types",
+            )
+            if key in job.options
+        }
+        if tables:
+            return generate_tables_from_databricks(
+                queries=tables,
+                hyper_filename=job.name,
+                work_dir=work_dir,
+                transforms=job.options.get("transforms"),
+                aggregates=job.options.get("aggregates"),
+                **options,
+            )
+        return generate_from_databricks(
+            query=job.options["query"],
+            hyper_filename=job.name,
+            work_dir=work_dir,
+            incremental=job.incremental,
+            write_delta=bool(job.publish and job.publish.delta),
+            transform=job.options.get("transform"),
+            aggregates=job.options.get("aggregates", ()),
+            **options,
+        )
@@ -0,0 +1,548 @@
+"""Local stand-in for the Tableau REST API.
+
+Implements the handful of endpoints used by TableauClient (sign-in, file
+upload sessions, datasource publishing, lookup and tags, "update hyper data"
+requests and their jobs) so that publishing
+can be exercised and timed without a Tableau site.
+
+Run it with:
+    python -m src.scripts.benchmark.mock_tableau_server --port 8080
+then point tab_site_url at http://localhost:8080.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import quoteattr
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "http://tableau.com/api"
+SITE_LUID = "00000000-0000-0000-0000-000000000001"
+USER_LUID = "00000000-0000-0000-0000-000000000002"
+
+
+@dataclass
+class UploadSession:
+    size: int = 0
+    # Running hash of the appended bytes: content is discarded, so multi-GB
+    # files can be uploaded without holding them in memory
+    sha256: Any = field(default_factory=hashlib.sha256)
+
+
+@dataclass
+class PublishedDatasource:
+    id: str
+    name: str
+    project_id: str
+    mode: str
+    size: int
+    sha256: str = ""
+    tags: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class HyperDataUpdate:
+    job_id: str
+    datasource_id: str
+    request_id: str
+    actions: List[Dict[str, Any]]
+    size: int
+    sha256: str = ""
+
+
+@dataclass
+class MockProject:
+    id: str
+    name: str
+    parent_id: Optional[str] = None
+
+
+@dataclass
+class MockState:
+    """In-memory content of the mock server, shared by all request threads."""
+
+    # Open upload sessions, by id
+    uploads: Dict[str, UploadSession] = field(default_factory=dict)
+    # Number of upload sessions initiated, and of chunks appended to them
+    upload_sessions: int = 0
+    appended_chunks: int = 0
+    # Every publish request, in order
+    published: List[PublishedDatasource] = field(default_factory=list)
+    # Current datasources of the site, by id
+    datasources: Dict[str, PublishedDatasource] = field(default_factory=dict)
+    # Every "update hyper data" request, by request id (requests reusing an
+    # id are not applied again, as on Tableau)
+    data_updates: Dict[str, HyperDataUpdate] = field(default_factory=dict)
+    # Projects of the site, by id
+    projects: Dict[str, MockProject] = field(default_factory=dict)
+    # Number of upcoming chunk appends to reject with a 500 error, after
+    # accepting fail_appends_after more appends
+    fail_next_appends: int = 0
+    fail_appends_after: int = 0
+    # Delay (seconds) added to every listing request
+    list_delay: float = 0.0
+    # Maximum number of upload sessions open at the same time; initiating
+    # one more is rejected with 429 Too Many Requests. None for no limit
+    max_open_uploads: Optional[int] = None
+    # Number of requests rejected with 429 Too Many Requests
+    throttled: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _job_xml(update: HyperDataUpdate, completed: bool) -> str:
+    now = dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    status = (
+        f'progress="100" finishCode="0" completedAt="{now}"'
+        if completed
+        else 'progress="0"'
+    )
+    return (
+        f'<job id="{update.job_id}" mode="Asynchronous" type="UpdateUploadedFile" '
+        f'createdAt="{now}" {status}>'
+        f'<datasource id="{update.datasource_id}"/></job>'
+    )
+
+
+def _xml(body: str) -> bytes:
+    return f'<tsResponse xmlns="{NAMESPACE}">{body}</tsResponse>'.encode()
+
+
+def _datasource_xml(datasource: PublishedDatasource) -> str:
+    tags = "".join(f"<tag label={quoteattr(tag)}/>" for tag in sorted(datasource.tags))
+    return (
+        f"<datasource id={quoteattr(datasource.id)} name={quoteattr(datasource.name)} "
+        'type="hyper">'
+        f'<project id={quoteattr(datasource.project_id)} name=""/>'
+        f'<owner id="{USER_LUID}"/><tags>{tags}</tags></datasource>'
+    )
+
+
+def _project_xml(project: MockProject) -> str:
+    parent = (
+        f" parentProjectId={quoteattr(project.parent_id)}" if project.parent_id else ""
+    )
+    return (
+        f"<project id={quoteattr(project.id)} name={quoteattr(project.name)}{parent}/>"
+    )
+
+
+def _not_found(summary: str = "Not found") -> bytes:
+    return _xml(f'<error code="404000"><summary>{summary}</summary></error>')
+
+
+def _multipart_part(body: bytes, content_type: str, name: str) -> Optional[bytes]:
+    """Extract one named part of a multipart body without copying the rest."""
+    match = re.search(r"boundary=([^;]+)", content_type)
+    if not match:
+        return None
+    boundary = b"--" + match.group(1).strip('"').encode()
+
+    name_pos = body.find(f'name="{name}"'.encode())
+    if name_pos < 0:
+        return None
+    start = body.find(b"\r\n\r\n", name_pos) + 4
+    end = body.find(b"\r\n" + boundary, start)
+    return body[start:end]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path.endswith("/serverInfo"):
+            self._send(
+                200,
+                _xml(
+                    '<serverInfo><productVersion build="mock">2025.1</productVersion>'
+                    "<restApiVersion>3.25</restApiVersion></serverInfo>"
+                ),
+            )
+            return
+        job_match = re.search(r"/jobs/([^/]+)$", path)
+        if job_match:
+            self._job(job_match.group(1))
+            return
+        collection = path.rsplit("/", 1)[-1]
+        if collection in ("projects", "datasources"):
+            self._list(collection, parse_qs(urlparse(self.path).query))
+            return
+        self._send(404, _not_found())
+
+    def _list(self, collection: str, query: Dict[str, List[str]]) -> None:
+        state = self.server.state
+        name_filter = None
+        for condition in query.get("filter", [""])[0].split(","):
+            field_name, _, rest = condition.partition(":")
+            operator, _, value = rest.partition(":")
+            if field_name == "name" and operator == "eq":
+                name_filter = value
+
+        page_number = int(query.get("pageNumber", ["1"])[0])
+        page_size = int(query.get("pageSize", ["100"])[0])
+        items, render = (
+            (state.projects, _project_xml)
+            if collection == "projects"
+            else (state.datasources, _datasource_xml)
+        )
+        with state.lock:
+            matches = [
+                item
+                for item in items.values()
+                if name_filter is None or item.name == name_filter
+            ]
+            page = matches[(page_number - 1) * page_size : page_number * page_size]
+            body = "".join(render(item) for item in page)
+
+        # Simulated server latency, per listed page
+        time.sleep(state.list_delay)
+        self._send(
+            200,
+            _xml(
+                f'<pagination pageNumber="{page_number}" pageSize="{page_size}" '
+                f'totalAvailable="{len(matches)}"/>'
+                f"<{collection}>{body}</{collection}>"
+            ),
+        )
+
+    def _job(self, job_id: str) -> None:
+        state = self.server.state
+        with state.lock:
+            update = next(
+                (u for u in state.data_updates.values() if u.job_id == job_id), None
+            )
+        if update is None:
+            self._send(404, _not_found())
+            return
+        # Updates are applied synchronously: their job is always complete
+        self._send(200, _xml(_job_xml(update, completed=True)))
+
+    def do_PATCH(self) -> None:
+        parsed = urlparse(self.path)
+        body = self._read_body()
+        state = self.server.state
+
+        match = re.search(r"/datasources/([^/]+)/data$", parsed.path)
+        if not match:
+            self._send(404, _not_found())
+            return
+
+        try:
+            actions = json.loads(body)["actions"]
+            if not actions or any("action" not in action for action in actions):
+                raise ValueError("every action needs an action type")
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send(
+                400,
+                _xml(
+                    f'<error code="400000"><summary>Bad Request</summary>'
+                    f"<detail>{exc}</detail></error>"
+                ),
+            )
+            return
+
+        request_id = self.headers.get("requestid") or uuid.uuid4().hex
+        upload_id = parse_qs(parsed.query).get("uploadSessionId", [None])[0]
+        with state.lock:
+            if match.group(1) not in state.datasources:
+                self._send(404, _not_found())
+                return
+            update = state.data_updates.get(request_id)
+            if update is None:
+                session = (
+                    state.uploads.pop(upload_id, None) if upload_id else UploadSession()
+                )
+                if session is None:
+                    self._send(
+                        404,
+                        _xml(
+                            '<error code="404003"><summary>Upload session not found'
+                            "</summary></error>"
+                        ),
+                    )
+                    return
+                update = HyperDataUpdate(
+                    job_id=str(uuid.uuid4()),
+                    datasource_id=match.group(1),
+                    request_id=request_id,
+                    actions=actions,
+                    size=session.size,
+                    sha256=session.sha256.hexdigest(),
+                )
+                state.data_updates[request_id] = update
+        self._send(202, _xml(_job_xml(update, completed=False)))
+
+    def do_POST(self) -> None:
+        parsed = urlparse(self.path)
+        path, query = parsed.path, parse_qs(parsed.query)
+        body = self._read_body()
+        state = self.server.state
+
+        if path.endswith("/auth/signin"):
+            self._send(
+                200,
+                _xml(
+                    '<credentials token="mock-token">'
+                    f'<site id="{SITE_LUID}" contentUrl="mock"/>'
+                    f'<user id="{USER_LUID}"/></credentials>'
+                ),
+            )
+        elif path.endswith("/auth/signout"):
+            self._send(204)
+        elif path.endswith("/fileUploads"):
+            upload_id = uuid.uuid4().hex
+            with state.lock:
+                throttled = (
+                    state.max_open_uploads is not None
+                    and len(state.uploads) >= state.max_open_uploads
+                )
+                if throttled:
+                    state.throttled += 1
+                else:
+                    state.uploads[upload_id] = UploadSession()
+                    state.upload_sessions += 1
+            if throttled:
+                self._send(
+                    429,
+                    _xml(
+                        '<error code="429000"><summary>Too many requests</summary>'
+                        "<detail>Too many concurrent upload sessions</detail></error>"
+                    ),
+                )
+                return
+            self._send(
+                201, _xml(f'<fileUpload uploadSessionId="{upload_id}" fileSize="0"/>')
+            )
+        elif path.endswith("/datasources"):
+            self._publish(body, query)
+        else:
+            self._send(404, _not_found())
+
+    def do_PUT(self) -> None:
+        path = urlparse(self.path).path
+        body = self._read_body()
+        state = self.server.state
+
+        tags_match = re.search(r"/datasources/([^/]+)/tags$", path)
+        if tags_match:
+            self._add_tags(tags_match.group(1), body)
+            return
+
+        match = re.search(r"/fileUploads/([^/]+)$", path)
+        if not match:
+            self._send(404, _not_found())
+            return
+
+        upload_id = match.group(1)
+        with state.lock:
+            if upload_id not in state.uploads:
+                self._send(
+                    404,
+                    _xml(
+                        '<error code="404003"><summary>Upload session not found'
+                        "</summary></error>"
+                    ),
+                )
+                return
+            if state.fail_appends_after > 0:
+                state.fail_appends_after -= 1
+            elif state.fail_next_appends > 0:
+                state.fail_next_appends -= 1
+                self._send(500, b"Injected failure")
+                return
+
+            chunk = _multipart_part(body, self.headers["Content-Type"], "tableau_file")
+            session = state.uploads[upload_id]
+            session.size += len(chunk or b"")
+            session.sha256.update(chunk or b"")
+            state.appended_chunks += 1
+            size_mb = session.size // (1024 * 1024)
+
+        self._send(
+            200,
+            _xml(f'<fileUpload uploadSessionId="{upload_id}" fileSize="{size_mb}"/>'),
+        )
+
+    def do_DELETE(self) -> None:
+        path = urlparse(self.path).path
+        state = self.server.state
+
+        match = re.search(r"/datasources/([^/]+)/tags/([^/]+)$", path)
+        with state.lock:
+            datasource = state.datasources.get(match.group(1)) if match else None
+            if datasource is None:
+                self._send(404, _not_found())
+                return
+            datasource.tags.discard(unquote(match.group(2)))
+        self._send(204)
+
+    def _add_tags(self, datasource_id: str, body: bytes) -> None:
+        state = self.server.state
+        labels = re.findall(r'<tag[^>]*label="([^"]*)"', body.decode("utf-8"))
+        with state.lock:
+            datasource = state.datasources.get(datasource_id)
+            if datasource is None:
+                self._send(404, _not_found())
+                return
+            datasource.tags.update(labels)
+            tags = "".join(
+                f"<tag label={quoteattr(tag)}/>" for tag in sorted(datasource.tags)
+            )
+        self._send(200, _xml(f"<tags>{tags}</tags>"))
+
+    def _publish(self, body: bytes, query: Dict[str, List[str]]) -> None:
+        state = self.server.state
+        payload = _multipart_part(body, self.headers["Content-Type"], "request_payload")
+        payload_text = (payload or b"").decode("utf-8", errors="replace")
+        name = re.search(r'<datasource[^>]*name="([^"]*)"', payload_text)
+        project = re.search(r'<project[^>]*id="([^"]*)"', payload_text)
+
+        upload_id = query.get("uploadSessionId", [None])[0]
+        with state.lock:
+            if upload_id is not None:
+                session = state.uploads.pop(upload_id, None)
+                if session is None:
+                    self._send(
+                        404,
+                        _xml(
+                            '<error code="404003"><summary>Upload session not found'
+                            "</summary></error>"
+                        ),
+                    )
+                    return
+            else:
+                content = (
+                    _multipart_part(
+                        body, self.headers["Content-Type"], "tableau_datasource"
+                    )
+                    or b""
+                )
+                session = UploadSession(size=len(content))
+                session.sha256.update(content)
+
+            mode = next(
+                (m for m in ("overwrite", "append") if query.get(m) == ["true"]),
+                "createnew",
+            )
+            datasource = PublishedDatasource(
+                id=str(uuid.uuid4()),
+                name=name.group(1) if name else "",
+                project_id=project.group(1) if project else "",
+                mode=mode,
+                size=session.size,
+                sha256=session.sha256.hexdigest(),
+            )
+
+            # Overwrite and Append update an existing datasource in place,
+            # keeping its id and tags
+            existing = next(
+                (
+                    current
+                    for current in state.datasources.values()
+                    if current.name == datasource.name
+                    and current.project_id == datasource.project_id
+                ),
+                None,
+            )
+            if existing is not None:
+                if mode == "createnew":
+                    self._send(
+                        409,
+                        _xml(
+                            '<error code="409004"><summary>Datasource already '
+                            "exists</summary></error>"
+                        ),
+                    )
+                    return
+                datasource.id = existing.id
+                datasource.tags = existing.tags
+
+            state.datasources[datasource.id] = datasource
+            state.published.append(datasource)
+            response = _datasource_xml(datasource)
+
+        self._send(201, _xml(response))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state: MockState) -> None:
+        super().__init__(address, _Handler)
+        self.state = state
+
+
+class MockTableauServer:
+    """
+    Mock Tableau REST API served from a background thread.
+    Use as a context manager; its url is a valid tab_site_url.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.state = MockState()
+        self._httpd = _Server((host, port), self.state)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockTableauServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="mock-tableau", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockTableauServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Tableau REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    cli_args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    httpd = _Server((cli_args.host, cli_args.port), MockState())
+    logger.info("Mock Tableau server listening on %s:%d", cli_args.host, cli_args.port)
+    httpd.serve_forever()
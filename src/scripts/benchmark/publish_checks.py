@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from tableauhyperapi import TEMPORARY, CreateMode, TableName
+
+from src.scripts.benchmark.mock_tableau_server import MockProject, MockTableauServer
+from src.scripts.benchmark.synthetic_data import synthetic_batches
+from src.scripts.hyper_api.publish_hyper import (
+    DELTA_APPEND,
+    DELTA_UPDATE,
+    PublishRequest,
+    hyper_update_actions,
+    publish_delta,
+    publish_hyper,
+    publish_many,
+)
+from src.utils.hyper_fingerprint import FILE, hyper_fingerprint
+from src.utils.hyper_load import insert_arrow_batches
+from src.utils.incremental import (
+    APPEND,
+    UPSERT,
+    IncrementalConfig,
+    apply_delta,
+    delta_path,
+)
+from src.utils.log_duration import log_duration
+from src.wrapper.config import ConfigWrapper, TabCredentials
+from src.wrapper.hyper_wrapper import HyperEngine
+from src.wrapper.tableau_wrapper import TableauClient
+
+logger = logging.getLogger(__name__)
+
+# Project of the mock site receiving the checked publishes.
+PROJECT_LUID = "00000000-0000-0000-0000-000000000010"
+
+_EXTRACT_TABLE = TableName("Extract", "Extract")
+
+# A check takes the running mock server and a scratch directory, and
+# returns its findings; it raises CheckFailed when the server state is wrong.
+Check = Callable[[MockTableauServer, Path], Dict[str, Any]]
+
+
+class CheckFailed(RuntimeError):
+    """Raised when the mock server does not hold what a check expects."""
+
+
+def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
+    """
+    Check the failure handling of publishing against the local mock server.
+
+    Args:
+        cfg: Configuration wrapper containing environment settings.
+        args: Command-line arguments containing script name.
+    """
+
+    logger.info(f"Starting script: {args.script}")
+
+    # ---------------------------------------------------------------------
+    # Check configuration
+    # The mock server injects failures (rejected chunk appends, throttled
+    # upload sessions) and records what it received, so each check can
+    # compare the server state with the local files.
+    # ---------------------------------------------------------------------
+    work_dir = Path(f"temp/benchmark/{args.script}")
+    output_path = Path("temp/benchmark/publish_checks.json")
+
+    with log_duration(args.script):
+        results = run_publish_checks(work_dir)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    logger.info(f"Publish checks written to {output_path}")
+
+    failed = [name for name, result in results.items() if result.get("error")]
+    if failed:
+        raise RuntimeError(f"Publish checks failed: {failed}")
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def run_publish_checks(work_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Run every publish check, each on a fresh mock server.
+
+    Args:
+        work_dir: Scratch directory, removed once the checks are done.
+
+    Returns:
+        Findings of each check keyed by check name, with an "error" entry
+        for the failed ones.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, check in CHECKS.items():
+        check_dir = work_dir / name
+        shutil.rmtree(check_dir, ignore_errors=True)
+        check_dir.mkdir(parents=True)
+        try:
+            with MockTableauServer() as server:
+                server.state.projects[PROJECT_LUID] = MockProject(
+                    PROJECT_LUID, "Checks"
+                )
+                results[name] = check(server, check_dir)
+            logger.info("%s: passed %s", name, json.dumps(results[name]))
+        except Exception as exc:
+            logger.error("%s: failed: %s", name, exc)
+            results[name] = {"error": str(exc)}
+        finally:
+            shutil.rmtree(check_dir, ignore_errors=True)
+    return results
+
+
+def check_resumed_upload(server: MockTableauServer, work_dir: Path) -> Dict[str, Any]:
+    """An interrupted upload resumes from its last committed chunk.
+
+    Chunk appends are rejected half-way through the first publish, beyond
+    its retries. The second publish of the same file must reuse the upload
+    session, send only the remaining chunks, and leave the server with the
+    exact bytes of the file.
+    """
+    hyper_path = _synthetic_extract(work_dir / "resumed.hyper", rows=200_000)
+    chunk_size = 1024 * 1024
+    total_chunks = -(-hyper_path.stat().st_size // chunk_size)
+    if total_chunks < 3:
+        raise CheckFailed(f"The extract only takes {total_chunks} chunks")
+
+    state = server.state
+    committed = total_chunks // 2
+    with state.lock:
+        state.fail_appends_after = committed
+        # The first attempt and its retry of the next chunk both fail
+        state.fail_next_appends = 2
+
+    with _client(server.url) as tsc:
+        upload = dict(
+            filepath=hyper_path,
+            project_luid=PROJECT_LUID,
+            mode="Overwrite",
+            chunk_size=chunk_size,
+            max_retries=1,
+            retry_backoff=0.01,
+        )
+        try:
+            tsc.publish_datasource_resumable(**upload)
+        except Exception as exc:
+            logger.info("First publish interrupted as expected: %s", exc)
+        else:
+            raise CheckFailed("The injected failures did not interrupt the upload")
+        tsc.publish_datasource_resumable(**upload)
+
+    published = state.published[-1]
+    _expect("upload sessions", state.upload_sessions, 1)
+    _expect("appended chunks", state.appended_chunks, total_chunks)
+    _expect("published bytes", published.size, hyper_path.stat().st_size)
+    _expect("published sha256", published.sha256, _sha256(hyper_path))
+    return {
+        "chunks": total_chunks,
+        "committed_before_failure": committed,
+        "bytes": published.size,
+    }
+
+
+def check_throttled_publishes(
+    server: MockTableauServer, work_dir: Path
+) -> Dict[str, Any]:
+    """Throttled concurrent publishes are retried until they all succeed.
+
+    The server accepts a single open upload session and rejects the others
+    with 429 Too Many Requests; every file must still be published, with
+    its exact bytes.
+    """
+    source = _synthetic_extract(work_dir / "source.hyper", rows=20_000)
+    paths: List[Path] = []
+    for index in range(4):
+        paths.append(work_dir / f"throttled_{index}.hyper")
+        shutil.copyfile(source, paths[-1])
+
+    state = server.state
+    with state.lock:
+        state.max_open_uploads = 1
+
+    with _client(server.url) as tsc:
+        results = publish_many(
+            tsc,
+            [PublishRequest(str(path), PROJECT_LUID) for path in paths],
+            max_workers=len(paths),
+            initial_concurrency=len(paths),
+            max_retries=10,
+            retry_backoff=0.05,
+            skip_unchanged=False,
+        )
+
+    errors = [result.error for result in results if result.error]
+    if errors:
+        raise CheckFailed(f"Throttled publishes failed: {errors}")
+    if state.throttled == 0:
+        raise CheckFailed("The server never throttled the concurrent publishes")
+
+    published = {datasource.name: datasource for datasource in state.published}
+    for path in paths:
+        _expect(f"{path.stem} sha256", published[path.stem].sha256, _sha256(path))
+    return {"publishes": len(paths), "throttled_requests": state.throttled}
+
+
+def check_delta_publishes(server: MockTableauServer, work_dir: Path) -> Dict[str, Any]:
+    """Incremental runs publish only their delta, appended or upserted.
+
+    The first publish sends the whole extract. An appended delta is then
+    published in Append mode, and an upserted one through an "update hyper
+    data" request carrying upsert actions on the key and a request id
+    derived from the delta file. Appending an upserted delta is refused.
+    """
+    hyper_path = _synthetic_extract(work_dir / "hyper_file" / "deltas.hyper", 10_000)
+    delta_file = delta_path(hyper_path)
+    state = server.state
+    findings: Dict[str, Any] = {}
+
+    with _client(server.url) as tsc:
+        publish = dict(hyper_filepath=str(hyper_path), project_luid=PROJECT_LUID)
+
+        # No datasource yet: the whole extract is published
+        publish_delta(tsc, delta_mode=DELTA_APPEND, **publish)
+        _expect("first publish mode", state.published[-1].mode, "overwrite")
+        datasource = state.published[-1]
+
+        # Appended rows are published in Append mode
+        rows = _apply_synthetic_delta(hyper_path, IncrementalConfig("id"), 15_000)
+        _expect("appended delta rows", rows, 5_000)
+        digest = _sha256(delta_file)
+        publish_delta(tsc, delta_mode=DELTA_APPEND, **publish)
+        _expect("append publish mode", state.published[-1].mode, APPEND)
+        _expect("appended delta sha256", state.published[-1].sha256, digest)
+        _expect("append delta file left", delta_file.exists(), False)
+        findings["appended_rows"] = rows
+
+        # Upserted rows go through an "update hyper data" request
+        config = IncrementalConfig("id", mode=UPSERT, key_columns=["id"])
+        rows = _apply_synthetic_delta(hyper_path, config, 18_000)
+        _expect("upserted delta rows", rows, 3_000)
+        try:
+            publish_delta(tsc, delta_mode=DELTA_APPEND, key_columns=["id"], **publish)
+        except ValueError as exc:
+            logger.info("Append of an upserted delta refused as expected: %s", exc)
+        else:
+            raise CheckFailed("An upserted delta was published in Append mode")
+
+        digest = _sha256(delta_file)
+        request_id = f"{datasource.id}-{hyper_fingerprint(delta_file, FILE)}"
+        publish_delta(tsc, delta_mode=DELTA_UPDATE, key_columns=["id"], **publish)
+
+    update = state.data_updates.get(request_id)
+    if update is None:
+        raise CheckFailed(f"No data update with request id {request_id}")
+    _expect("updated datasource", update.datasource_id, datasource.id)
+    _expect(
+        "update actions", update.actions, hyper_update_actions(_EXTRACT_TABLE, ["id"])
+    )
+    _expect("update payload sha256", update.sha256, digest)
+    _expect("update delta file left", delta_file.exists(), False)
+    _expect("publishes", len(state.published), 2)
+    findings["upserted_rows"] = rows
+    findings["request_id"] = request_id
+    return findings
+
+
+def check_fingerprint_skip(server: MockTableauServer, work_dir: Path) -> Dict[str, Any]:
+    """Only overwrites of unchanged content are skipped.
+
+    Overwriting a datasource with the file it already holds is skipped. After
+    an append, the datasource holds more than that file, so overwriting it
+    with the same file again must upload it.
+    """
+    hyper_path = _synthetic_extract(work_dir / "fingerprint.hyper", rows=10_000)
+    appended = _synthetic_extract(work_dir / "appended.hyper", rows=1_000)
+    state = server.state
+    uploads: List[bool] = []
+
+    with _client(server.url) as tsc:
+
+        def publish(path: Path, mode: str) -> None:
+            uploads.append(
+                publish_hyper(
+                    tsc,
+                    hyper_filepath=str(path),
+                    project_luid=PROJECT_LUID,
+                    mode=mode,
+                    chunk_size=1024 * 1024,
+                )
+            )
+
+        publish(hyper_path, "Overwrite")
+        publish(hyper_path, "Overwrite")
+        _expect("unchanged overwrite uploaded", uploads[-1], False)
+
+        # Published under the name of the first file, as an append to it
+        append_path = work_dir / "append" / hyper_path.name
+        append_path.parent.mkdir()
+        shutil.copyfile(appended, append_path)
+        publish(append_path, "Append")
+        tags = state.published[-1].tags
+        _expect("fingerprint tags after append", sorted(tags), [])
+
+        publish(hyper_path, "Overwrite")
+        _expect("overwrite after append uploaded", uploads[-1], True)
+
+    _expect("uploads", uploads, [True, False, True, True])
+    return {"uploads": uploads}
+
+
+# Every check, by name; the test suite runs them as well.
+CHECKS: Dict[str, Check] = {
+    "resumed_upload": check_resumed_upload,
+    "throttled_publishes": check_throttled_publishes,
+    "delta_publishes": check_delta_publishes,
+    "fingerprint_skip": check_fingerprint_skip,
+}
+
+
+def _apply_synthetic_delta(
+    hyper_path: Path, config: IncrementalConfig, rows: int
+) -> int:
+    """Apply the synthetic rows above the extract's largest id, with a delta
+    file, as an incremental run would."""
+    source_table = TableName("delta_source")
+    with HyperEngine().connect(hyper_path) as connection:
+        watermark = connection.execute_scalar_query(
+            f'SELECT MAX("id") FROM {_EXTRACT_TABLE}'
+        )
+        insert_arrow_batches(
+            connection,
+            source_table,
+            synthetic_batches(rows, null_fraction=0.0),
+            persistence=TEMPORARY,
+        )
+        columns = [
+            column.name.unescaped
+            for column in connection.catalog.get_table_definition(source_table).columns
+        ]
+        applied, _ = apply_delta(
+            connection,
+            _EXTRACT_TABLE,
+            str(source_table),
+            columns,
+            config,
+            watermark,
+            delta_file=delta_path(hyper_path),
+        )
+    return applied
+
+
+def _synthetic_extract(hyper_path: Path, rows: int) -> Path:
+    hyper_path.parent.mkdir(parents=True, exist_ok=True)
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_AND_REPLACE
+    ) as connection:
+        insert_arrow_batches(
+            connection, _EXTRACT_TABLE, synthetic_batches(rows, null_fraction=0.0)
+        )
+    return hyper_path
+
+
+def _client(site_url: str) -> TableauClient:
+    return TableauClient(
+        cred=TabCredentials(
+            pat_name="checks",
+            pat_secret="checks",
+            site_id="mock",
+            site_url=site_url,
+            api_version="3.25",
+        )
+    )
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _expect(what: str, actual: Any, expected: Any) -> None:
+    if actual != expected:
+        raise CheckFailed(f"Unexpected {what}: {actual!r}, expected {expected!r}")
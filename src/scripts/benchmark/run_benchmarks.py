@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import platform
+import shutil
+import time
+from contextlib import contextmanager
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import pyarrow.csv as pacsv
+from tableauhyperapi import CreateMode, TableName
+
+from src.scripts.benchmark.mock_tableau_server import MockTableauServer
+from src.scripts.benchmark.synthetic_data import (
+    SYNTHETIC_SCHEMA,
+    SyntheticConnection,
+    synthetic_batches,
+)
+from src.scripts.hyper_api.generate_hyper_with_databricks import (
+    generate_from_databricks,
+)
+from src.scripts.hyper_api.publish_hyper import publish_hyper
+from src.utils.hyper_load import copy_csv
+from src.utils.hyper_schema import infer_csv_schema, table_definition_from_arrow
+from src.utils.log_duration import log_duration
+from src.utils.metrics import MetricsRegistry, peak_rss_bytes
+from src.wrapper.config import ConfigWrapper, TabCredentials
+from src.wrapper.databricks_wrapper import DEFAULT_BATCH_SIZE, DatabricksClient
+from src.wrapper.hyper_wrapper import HyperEngine
+from src.wrapper.tableau_wrapper import TableauClient
+
+logger = logging.getLogger(__name__)
+
+PIPELINES = ("csv", "databricks")
+
+
+def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
+    """
+    Benchmark the extract pipelines end to end on synthetic data.
+
+    Args:
+        cfg: Configuration wrapper containing environment settings.
+        args: Command-line arguments containing script name.
+    """
+
+    logger.info(f"Starting script: {args.script}")
+
+    # ---------------------------------------------------------------------
+    # Benchmark configuration
+    # Every pipeline is run once per dataset size. Large sizes need several
+    # GB of free disk space in the work directory (CSV, Parquet and Hyper
+    # files are deleted after each run).
+    # ---------------------------------------------------------------------
+    row_counts = [1_000_000, 10_000_000, 100_000_000]
+    pipelines = ["csv", "databricks"]
+    work_dir = Path(f"temp/benchmark/{args.script}")
+    output_path = Path("temp/benchmark/results.json")
+
+    # Publishing goes to a local mock of the Tableau REST API, so it
+    # measures the client side of the upload (chunking, HTTP, commit)
+    publish = True
+
+    # Sharded Hyper builds timed against the single-connection load of the
+    # same Parquet shards, e.g. [2, 4, 8, 16] on a many-core build host.
+    # Empty disables the comparison.
+    build_shards: List[int] = []
+
+    # Pipelined run (fetch, Parquet staging and Hyper load overlapping, see
+    # pipeline_depth in generate_hyper_with_databricks) timed against the
+    # sum of the sequential stages. 0 disables the comparison.
+    pipeline_depth = 2
+
+    with log_duration(args.script):
+        results = run_benchmarks(
+            row_counts=row_counts,
+            pipelines=pipelines,
+            work_dir=work_dir,
+            publish=publish,
+            build_shards=build_shards,
+            pipeline_depth=pipeline_depth,
+        )
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    logger.info(f"Benchmark results written to {output_path}")
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def run_benchmarks(
+    row_counts: Sequence[int],
+    pipelines: Sequence[str],
+    work_dir: Path,
+    publish: bool = True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    build_shards: Sequence[int] = (),
+    pipeline_depth: int = 0,
+) -> Dict[str, Any]:
+    """
+    Run every pipeline on every dataset size and collect stage timings.
+
+    Pipelines:
+        - csv: synthetic CSV file -> schema inference -> COPY into Hyper
+        - databricks: generate_from_databricks over a fake Databricks
+          cursor serving Arrow batches -> Parquet shards -> single INSERT
+          over external() into Hyper
+
+    Args:
+        row_counts: Dataset sizes, in rows.
+        pipelines: Pipelines to run ("csv" and/or "databricks").
+        work_dir: Scratch directory for the generated files.
+        publish: Also time publishing the Hyper file to a mock server.
+        batch_size: Rows per Arrow batch / Parquet shard.
+        build_shards: Shard counts of the sharded Hyper builds timed in the
+            databricks pipeline. Each is reported with its speedup over the
+            single-connection load of the databricks pipeline, and over the
+            CSV COPY of the same dataset when the csv pipeline also ran.
+        pipeline_depth: Queue depth of a pipelined run of the databricks
+            pipeline, reported with its speedup over the sequential stages.
+            0 skips it.
+
+    Returns:
+        JSON-serializable report with the environment and one entry per run.
+    """
+    unknown = [p for p in pipelines if p not in PIPELINES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark pipelines: {unknown}")
+
+    runs: List[Dict[str, Any]] = []
+    with MockTableauServer() as mock_server:
+        for rows in row_counts:
+            for pipeline in pipelines:
+                run_dir = work_dir / f"{pipeline}-{rows}"
+                shutil.rmtree(run_dir, ignore_errors=True)
+                run_dir.mkdir(parents=True)
+                try:
+                    if pipeline == "csv":
+                        run = _benchmark_csv(rows, run_dir)
+                    else:
+                        run = _benchmark_databricks(
+                            rows, run_dir, batch_size, build_shards, pipeline_depth
+                        )
+
+                    if publish:
+                        with _stage(run["stages"], "publish"):
+                            _publish(mock_server.url, Path(run.pop("hyper_path")))
+                    else:
+                        run.pop("hyper_path")
+                finally:
+                    shutil.rmtree(run_dir, ignore_errors=True)
+
+                total = sum(run["stages"].values())
+                run["total_seconds"] = round(total, 3)
+                run["rows_per_second"] = round(rows / total) if total else None
+                run["stages"] = {k: round(v, 3) for k, v in run["stages"].items()}
+                run["peak_rss_bytes"] = peak_rss_bytes()
+                logger.info(
+                    "%s / %d rows: %s", pipeline, rows, json.dumps(run["stages"])
+                )
+                runs.append(run)
+
+    _add_csv_speedups(runs)
+
+    return {
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "environment": _environment(),
+        "runs": runs,
+    }
+
+
+@contextmanager
+def _stage(stages: Dict[str, float], name: str) -> Iterator[None]:
+    """Add the duration of the block to a stage timer."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def _benchmark_csv(rows: int, run_dir: Path) -> Dict[str, Any]:
+    csv_path = run_dir / "synthetic.csv"
+    hyper_path = run_dir / "synthetic.hyper"
+    table_name = TableName("Extract", "Extract")
+
+    # Writing the source file is setup, not part of the measured pipeline
+    with pacsv.CSVWriter(csv_path, SYNTHETIC_SCHEMA) as writer:
+        for batch in synthetic_batches(rows):
+            writer.write_table(batch)
+
+    stages: Dict[str, float] = {}
+    with _stage(stages, "source_read"):
+        csv_schema = infer_csv_schema(csv_path)
+
+    with _stage(stages, "hyper_load"):
+        with HyperEngine().connect(
+            hyper_path, create_mode=CreateMode.CREATE_AND_REPLACE
+        ) as connection:
+            connection.catalog.create_schema_if_not_exists(table_name.schema_name)
+            connection.catalog.create_table(
+                table_definition_from_arrow(csv_schema, table_name)
+            )
+            loaded = copy_csv(connection, table_name, csv_path)
+
+    if loaded != rows:
+        raise RuntimeError(f"CSV benchmark loaded {loaded} rows, expected {rows}")
+
+    return {
+        "pipeline": "csv",
+        "rows": rows,
+        "stages": stages,
+        "source_bytes": csv_path.stat().st_size,
+        "hyper_bytes": hyper_path.stat().st_size,
+        "hyper_path": str(hyper_path),
+    }
+
+
+def _benchmark_databricks(
+    rows: int,
+    run_dir: Path,
+    batch_size: int,
+    build_shards: Sequence[int],
+    pipeline_depth: int = 0,
+) -> Dict[str, Any]:
+    # The production generator runs against a connection serving synthetic
+    # Arrow batches; source_read includes generating them
+    hyper_path, stages, source_bytes = _generate(rows, run_dir, "synthetic", batch_size)
+
+    # Sharded builds of the same data, outside the stage totals
+    sharded_builds: List[Dict[str, Any]] = []
+    for shard_count in build_shards:
+        sharded_path, sharded_stages, _ = _generate(
+            rows,
+            run_dir,
+            f"synthetic-{shard_count}-shards",
+            batch_size,
+            build_shards=shard_count,
+        )
+        sharded_path.unlink()
+        seconds = sharded_stages["hyper_load"]
+        sharded_builds.append(
+            {
+                "shards": shard_count,
+                "seconds": round(seconds, 3),
+                "speedup": round(stages["hyper_load"] / seconds, 2),
+            }
+        )
+        logger.info(
+            "Sharded build / %d rows / %d shards: %.2fs (x%.2f)",
+            rows,
+            shard_count,
+            seconds,
+            stages["hyper_load"] / seconds,
+        )
+
+    run = {
+        "pipeline": "databricks",
+        "rows": rows,
+        "stages": stages,
+        "source_bytes": source_bytes,
+        "hyper_bytes": hyper_path.stat().st_size,
+        "hyper_path": str(hyper_path),
+    }
+    if sharded_builds:
+        run["sharded_builds"] = sharded_builds
+    if pipeline_depth:
+        run["pipelined"] = _benchmark_pipelined(
+            rows, run_dir, batch_size, pipeline_depth, sum(stages.values())
+        )
+    return run
+
+
+def _benchmark_pipelined(
+    rows: int,
+    run_dir: Path,
+    batch_size: int,
+    pipeline_depth: int,
+    sequential_seconds: float,
+) -> Dict[str, Any]:
+    """Time the databricks pipeline with its stages overlapping."""
+    pipelined_path, stages, _ = _generate(
+        rows,
+        run_dir,
+        "synthetic-pipelined",
+        batch_size,
+        pipeline_depth=pipeline_depth,
+    )
+    pipelined_path.unlink()
+
+    # The stages overlap, so only the total is meaningful
+    seconds = sum(stages.values())
+    logger.info(
+        "Pipelined run / %d rows / depth %d: %.2fs (x%.2f)",
+        rows,
+        pipeline_depth,
+        seconds,
+        sequential_seconds / seconds,
+    )
+    return {
+        "depth": pipeline_depth,
+        "seconds": round(seconds, 3),
+        "speedup": round(sequential_seconds / seconds, 2),
+    }
+
+
+def _generate(
+    rows: int, run_dir: Path, name: str, batch_size: int, **options: Any
+) -> Tuple[Path, Dict[str, float], int]:
+    """Run generate_from_databricks on synthetic data.
+
+    Returns:
+        The Hyper file, the seconds of each stage (read from the recorded
+        fetch and parquet_write metrics, the rest of the run counting as
+        hyper_load) and the bytes of the staged Parquet shards.
+    """
+    registry = MetricsRegistry()
+    recorded = len(registry.stages())
+    start = time.perf_counter()
+    hyper_path = generate_from_databricks(
+        query="SELECT * FROM synthetic",
+        hyper_filename=name,
+        work_dir=run_dir,
+        batch_size=batch_size,
+        client_factory=lambda: DatabricksClient(connection=SyntheticConnection(rows)),
+        **options,
+    )
+    seconds = time.perf_counter() - start
+    metrics = registry.stages()[recorded:]
+
+    def total(stage: str, field: str = "seconds") -> float:
+        return sum(getattr(m, field) for m in metrics if m.stage == stage)
+
+    stages = {
+        "source_read": total("fetch"),
+        "parquet_staging": total("parquet_write"),
+    }
+    stages["hyper_load"] = max(seconds - sum(stages.values()), 0.0)
+
+    with HyperEngine().connect(hyper_path, create_mode=CreateMode.NONE) as connection:
+        loaded = connection.execute_scalar_query(
+            f"SELECT COUNT(*) FROM {TableName('Extract', 'Extract')}"
+        )
+    if loaded != rows:
+        raise RuntimeError(
+            f"Databricks benchmark {name} loaded {loaded} rows, expected {rows}"
+        )
+    return hyper_path, stages, int(total("parquet_write", "bytes_written"))
+
+
+def _add_csv_speedups(runs: List[Dict[str, Any]]) -> None:
+    """Compare the sharded builds with the CSV COPY of the same dataset."""
+    csv_load = {
+        run["rows"]: run["stages"]["hyper_load"]
+        for run in runs
+        if run["pipeline"] == "csv"
+    }
+    for run in runs:
+        for build in run.get("sharded_builds", []):
+            if run["rows"] in csv_load and build["seconds"]:
+                build["speedup_vs_csv"] = round(
+                    csv_load[run["rows"]] / build["seconds"], 2
+                )
+
+
+def _publish(site_url: str, hyper_path: Path) -> None:
+    cred = TabCredentials(
+        pat_name="benchmark",
+        pat_secret="benchmark",
+        site_id="mock",
+        site_url=site_url,
+        api_version="3.25",
+    )
+    with TableauClient(cred=cred) as tsc:
+        publish_hyper(
+            tsc,
+            hyper_filepath=str(hyper_path),
+            project_luid="benchmark",
+            mode="Overwrite",
+            skip_unchanged=False,
+        )
+
+
+def _environment() -> Dict[str, Any]:
+    def version(package: str) -> str:
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return "unknown"
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pyarrow": version("pyarrow"),
+        "tableauhyperapi": version("tableauhyperapi"),
+        "tableauserverclient": version("tableauserverclient"),
+        "hyper_settings": ConfigWrapper().hyper_settings.__dict__,
+    }
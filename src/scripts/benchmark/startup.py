@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+from src.scripts.registry import available_scripts
+from src.utils.log_duration import log_duration
+from src.wrapper.config import ConfigWrapper
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-script timing the CLI itself (src.main), without any script.
+CLI = "cli"
+
+# Code run in a fresh interpreter: prints the import time, in seconds.
+_IMPORT_TIMER = """
+import sys, time
+start = time.perf_counter()
+if sys.argv[1] == {cli!r}:
+    import src.main
+else:
+    from src.scripts.registry import load_script
+    load_script(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
+    """
+    Measure the startup latency of every CLI command and enforce budgets.
+
+    Args:
+        cfg: Configuration wrapper containing environment settings.
+        args: Command-line arguments containing script name.
+    """
+
+    logger.info(f"Starting script: {args.script}")
+
+    # ---------------------------------------------------------------------
+    # Benchmark configuration
+    # Each command is imported in a fresh interpreter `repeats` times; the
+    # median import time is compared with its budget (seconds). Commands
+    # not listed in budgets get default_budget.
+    # ---------------------------------------------------------------------
+    repeats = 5
+    default_budget = 3.0
+    budgets = {CLI: 0.5}
+    output_path = Path("temp/benchmark/startup.json")
+
+    with log_duration(args.script):
+        results = measure_startup(
+            [CLI, *sorted(available_scripts())],
+            repeats=repeats,
+            budgets=budgets,
+            default_budget=default_budget,
+        )
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    logger.info(f"Startup benchmark written to {output_path}")
+
+    over_budget = [name for name, run in results.items() if not run["within_budget"]]
+    if over_budget:
+        raise RuntimeError(f"Startup latency over budget: {over_budget}")
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def measure_startup(
+    commands: Sequence[str],
+    repeats: int = 5,
+    budgets: Optional[Mapping[str, float]] = None,
+    default_budget: float = 3.0,
+) -> Dict[str, Dict[str, Any]]:
+    """Time the import of each command in fresh interpreters.
+
+    Args:
+        commands: Script names, or "cli" for the CLI module alone.
+        repeats: Number of interpreters started per command.
+        budgets: Import time budgets in seconds, keyed by command.
+        default_budget: Budget of the commands not listed in budgets.
+
+    Returns:
+        Median import and process times (seconds) and budget check, keyed
+        by command.
+    """
+    if repeats < 1:
+        raise ValueError(f"repeats must be positive, got {repeats}")
+    budgets = budgets or {}
+
+    # The child interpreters import src the same way as this process
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+    code = _IMPORT_TIMER.format(cli=CLI)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for command in commands:
+        import_times, process_times = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-c", code, command],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            process_times.append(time.perf_counter() - start)
+            if completed.returncode != 0:
+                raise RuntimeError(
+                    f"Importing {command} failed: {completed.stderr.strip()}"
+                )
+            import_times.append(float(completed.stdout.strip().splitlines()[-1]))
+
+        budget = budgets.get(command, default_budget)
+        import_seconds = statistics.median(import_times)
+        results[command] = {
+            "import_seconds": round(import_seconds, 3),
+            "process_seconds": round(statistics.median(process_times), 3),
+            "budget_seconds": budget,
+            "within_budget": import_seconds <= budget,
+        }
+        logger.info(
+            "%s: import %.3fs (budget %.2fs), process %.3fs",
+            command,
+            import_seconds,
+            budget,
+            results[command]["process_seconds"],
+        )
+
+    return results
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Iterator, Optional
+
+import numpy as np
+import pyarrow as pa
+
+# Column-type mix of a typical fact table: ids, low- and high-cardinality
+# strings, decimals (including the decimal(38, x) Databricks returns for SUM
+# over decimals), floats, timestamps and dates, with nulls.
+SYNTHETIC_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("country", pa.string()),
+        ("customer", pa.string()),
+        ("amount", pa.decimal128(18, 2)),
+        ("amount_total", pa.decimal128(38, 6)),
+        ("quantity", pa.int32()),
+        ("price", pa.float64()),
+        ("created_at", pa.timestamp("us")),
+        ("order_date", pa.date32()),
+    ]
+)
+
+_COUNTRIES = ["FR", "DE", "ES", "IT", "BE", "NL", "PT", "PL", "GB", "US"]
+_EPOCH = dt.datetime(2024, 1, 1)
+
+
+def synthetic_batches(
+    rows: int,
+    batch_size: int = 1_000_000,
+    null_fraction: float = 0.05,
+    seed: int = 0,
+) -> Iterator[pa.Table]:
+    """Generate a reproducible synthetic dataset as Arrow batches.
+
+    Args:
+        rows: Total number of rows.
+        batch_size: Maximum number of rows per batch.
+        null_fraction: Share of nulls in the nullable columns.
+        seed: Random seed, so that runs are comparable.
+
+    Yields:
+        Tables following SYNTHETIC_SCHEMA.
+    """
+    rng = np.random.default_rng(seed)
+    countries = np.array(_COUNTRIES, dtype=object)
+
+    for offset in range(0, rows, batch_size):
+        n = min(batch_size, rows - offset)
+
+        def nulls() -> Optional[np.ndarray]:
+            return rng.random(n) < null_fraction if null_fraction else None
+
+        ids = np.arange(offset, offset + n, dtype=np.int64)
+        cents = rng.integers(0, 10_000_000, n)
+        seconds = rng.integers(0, 365 * 24 * 3600, n)
+
+        yield pa.table(
+            [
+                pa.array(ids),
+                pa.array(countries[rng.integers(0, len(_COUNTRIES), n)], pa.string()),
+                pa.array(
+                    np.char.add("customer-", rng.integers(0, 1_000_000, n).astype(str)),
+                    pa.string(),
+                    mask=nulls(),
+                ),
+                pa.array(cents / 100).cast(pa.decimal128(18, 2)),
+                pa.array(cents * 3 / 100).cast(pa.decimal128(38, 6)),
+                pa.array(rng.integers(1, 100, n, dtype=np.int32), mask=nulls()),
+                pa.array(rng.random(n) * 1000, mask=nulls()),
+                pa.array(
+                    np.datetime64(_EPOCH, "us") + seconds.astype("timedelta64[s]"),
+                    pa.timestamp("us"),
+                    mask=nulls(),
+                ),
+                pa.array(
+                    np.datetime64(_EPOCH.date(), "D")
+                    + (seconds // 86400).astype("timedelta64[D]"),
+                    pa.date32(),
+                ),
+            ],
+            schema=SYNTHETIC_SCHEMA,
+        )
+
+
+class SyntheticCursor:
+    """
+    Stand-in for a databricks-sql-connector cursor.
+    Serves synthetic Arrow data through fetchmany_arrow().
+    """
+
+    def __init__(self, rows: int, seed: int = 0) -> None:
+        self._rows = rows
+        self._seed = seed
+        self._pending: Optional[pa.Table] = None
+        self._batches: Optional[Iterator[pa.Table]] = None
+
+    def __enter__(self) -> "SyntheticCursor":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._batches = None
+
+    def execute(self, query: str) -> None:
+        self._batches = synthetic_batches(self._rows, seed=self._seed)
+        self._pending = None
+
+    def fetchmany_arrow(self, size: int) -> pa.Table:
+        parts = []
+        needed = size
+        while needed > 0:
+            if self._pending is None or self._pending.num_rows == 0:
+                self._pending = next(self._batches, None)
+                if self._pending is None:
+                    break
+            part = self._pending.slice(0, needed)
+            self._pending = self._pending.slice(part.num_rows)
+            parts.append(part)
+            needed -= part.num_rows
+
+        if not parts:
+            return SYNTHETIC_SCHEMA.empty_table()
+        return pa.concat_tables(parts)
+
+
+class SyntheticConnection:
+    """Stand-in for a databricks-sql-connector connection."""
+
+    def __init__(self, rows: int, seed: int = 0) -> None:
+        self._rows = rows
+        self._seed = seed
+
+    def cursor(self, **kwargs) -> SyntheticCursor:
+        return SyntheticCursor(self._rows, seed=self._seed)
+
+    def close(self) -> None:
+        pass
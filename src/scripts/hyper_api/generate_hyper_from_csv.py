@@ -4,18 +4,45 @@ import argparse
 import logging
 import re
 from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
-import pandas as pd
 from tableauhyperapi import (
-    Connection,
+    TEMPORARY,
     CreateMode,
-    HyperProcess,
-    Telemetry,
-    escape_string_literal,
+    TableDefinition,
+    TableName,
 )
 
+from src.utils.aggregates import (
+    Aggregate,
+    build_aggregates,
+    validate_aggregate_names,
+)
+from src.utils.hyper_load import copy_csv
+from src.utils.hyper_schema import (
+    ColumnOverride,
+    SchemaCache,
+    SchemaOverrides,
+    cached_csv_schema,
+    infer_csv_schema,
+    table_definition_from_arrow,
+)
+from src.utils.incremental import (
+    IncrementalConfig,
+    WatermarkStore,
+    apply_delta,
+    read_watermark,
+)
 from src.utils.log_duration import log_duration
+from src.utils.metrics import track_stage
+from src.utils.multi_table import (
+    DEFAULT_SCHEMA,
+    DEFAULT_TABLE,
+    load_tables,
+    table_key,
+)
 from src.wrapper.config import ConfigWrapper
+from src.wrapper.hyper_wrapper import HyperEngine
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +51,6 @@ def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
     """
     Generate a Tableau Hyper file from CSV data.
 
-    Workflow:
-        1. Read source data from a CSV file
-        2. Export data to Parquet format (intermediate format)
-        3. Create or reuse a Hyper file
-        4. Create the schema/table if needed
-        5. Insert Parquet data into the Hyper table
-
     Args:
         cfg: Configuration wrapper containing environment settings.
         args: Command-line arguments containing script name.
@@ -38,96 +58,315 @@ def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
 
     logger.info(f"Starting script: {args.script}")
 
+    # ---------------------------------------------------------------------
+    # Source file configuration
+    # Define the CSV file to be processed, with an absolute or relative path.
+    # ---------------------------------------------------------------------
+    csv_filepath = "sample_data/pokemon.csv"
+    csv_filename = re.search(r"(?<=/)[^/]+(?=\.csv$)", csv_filepath).group()
+    csv_delimiter = ","
+    csv_encoding = "utf-8"
+
+    # Optional explicit Hyper types and nullability, keyed by column name,
+    # e.g. {"Name": "varchar(40)", "#": {"type": "int", "nullable": False}}.
+    # Columns not listed here get the type inferred from the beginning of
+    # the file on the first run, then reused.
+    column_types: Dict[str, ColumnOverride] = {}
+
+    # Optional incremental refresh: only rows above the extract's
+    # high-watermark are applied, appended or upserted on key columns,
+    # e.g. IncrementalConfig("#", mode="upsert", key_columns=["#"]).
+    # None appends the whole file on every run.
+    incremental: Optional[IncrementalConfig] = None
+
+    # Optional multi-table extract: CSV files loaded concurrently into
+    # separate tables of the same .hyper file, named after csv_filepath,
+    # e.g. {"orders": "data/orders.csv", "customers": "data/customers.csv"}.
+    # None loads csv_filepath into Extract.Extract.
+    csv_tables: Optional[Dict[str, str]] = None
+
+    # Settings of a multi-table extract, keyed by table name (column_types,
+    # incremental and aggregates above only apply to a single-table one),
+    # e.g. {"orders": IncrementalConfig("order_id")}. Aggregate names must
+    # be unique across the extract.
+    table_column_types: Dict[str, Dict[str, ColumnOverride]] = {}
+    table_incremental: Dict[str, IncrementalConfig] = {}
+    table_aggregates: Dict[str, List[Aggregate]] = {}
+
+    # Optional pre-aggregated tables built from the loaded table in a single
+    # Hyper scan (GROUP BY GROUPING SETS), as companion .hyper files in
+    # hyper_file/aggregates/ or tables of the extract (companion=False), e.g.
+    # [Aggregate("by_generation", ["Generation", "Type 1"],
+    #            {"pokemons": "COUNT(*)", "avg_total": 'AVG("Total")'})].
+    aggregates: List[Aggregate] = []
+
     with log_duration(args.script):
+        if csv_tables:
+            generate_tables_from_csv(
+                csv_filepaths={t: Path(p) for t, p in csv_tables.items()},
+                hyper_filename=csv_filename,
+                work_dir=Path(f"temp/{csv_filename}/{args.script}"),
+                delimiter=csv_delimiter,
+                encoding=csv_encoding,
+                column_types=table_column_types,
+                incremental=table_incremental,
+                aggregates=table_aggregates,
+            )
+        else:
+            generate_from_csv(
+                csv_filepath=Path(csv_filepath),
+                work_dir=Path(f"temp/{csv_filename}/{args.script}"),
+                delimiter=csv_delimiter,
+                encoding=csv_encoding,
+                column_types=column_types,
+                incremental=incremental,
+                aggregates=aggregates,
+            )
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def generate_from_csv(
+    csv_filepath: Path,
+    work_dir: Path,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    column_types: Optional[SchemaOverrides] = None,
+    incremental: Optional[IncrementalConfig] = None,
+    hyper_filename: Optional[str] = None,
+    table: str = DEFAULT_TABLE,
+    reuse_schema: bool = True,
+    aggregates: Sequence[Aggregate] = (),
+) -> Path:
+    """
+    Generate a Tableau Hyper file from a CSV file.
 
-        # ---------------------------------------------------------------------
-        # Source file configuration
-        # Define the CSV file to be processed. Any pandas-readable format
-        # (CSV, JSON, Excel, etc.) can be used with an absolute or relative path.
-        # ---------------------------------------------------------------------
-        csv_filepath = "sample_data/pokemon.csv"
-        csv_filename = re.search(r"(?<=/)[^/]+(?=\.csv$)", csv_filepath).group()
-
-        # ---------------------------------------------------------------------
-        # Create temporary directories for Parquet files and Hyper file
-        # Directories are created if they do not already exist
-        # ---------------------------------------------------------------------
-        parquet_dir = Path(f"temp/{csv_filename}/{args.script}/parquet_files")
-        parquet_dir.mkdir(parents=True, exist_ok=True)
-
-        hyper_path = Path(
-            f"temp/{csv_filename}/{args.script}/hyper_file/{csv_filename}.hyper"
-        )
-        hyper_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # ---------------------------------------------------------------------
-        # Read source data into a pandas DataFrame
-        # Any pandas-supported format (CSV, JSON, Excel, etc.) can be used
-        # ---------------------------------------------------------------------
-        df = pd.read_csv(csv_filepath, encoding="utf-8")
-
-        # ---------------------------------------------------------------------
-        # Export DataFrame to Parquet format
-        # Parquet is used as intermediate format because it is columnar,
-        # fast to read, and natively supported by Hyper's external() function
-        # ---------------------------------------------------------------------
-        parquet_path = parquet_dir / f"{csv_filename}.parquet"
-        df.to_parquet(parquet_path, index=False)
-
-        # ---------------------------------------------------------------------
-        # Collect all Parquet files to be loaded into the Hyper file
-        # Files are sorted to ensure deterministic loading order
-        # ---------------------------------------------------------------------
-        parquet_files = sorted(parquet_dir.glob("*.parquet"))
-
-        # ---------------------------------------------------------------------
-        # Start Hyper process and open connection to the Hyper file
-        # CREATE_IF_NOT_EXISTS mode reuses the file if it already exists
-        # ---------------------------------------------------------------------
-        with HyperProcess(telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU) as hyper:
-            with Connection(
-                endpoint=hyper.endpoint,
-                database=str(hyper_path),
-                create_mode=CreateMode.CREATE_IF_NOT_EXISTS,
-            ) as connection:
-
-                # -----------------------------------------------------------------
-                # Define schema and table name
-                # Tableau extracts conventionally use Extract.Extract as default
-                # -----------------------------------------------------------------
-                schema_name = "Extract"
-                table_name = "Extract"
-                schema_table = f'"{schema_name}"."{table_name}"'
-
-                # Ensure schema exists (idempotent operation)
-                connection.execute_command(
-                    f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'
+    Workflow:
+        1. Infer the CSV schema from the first block of the file, or reuse
+           the one inferred on a previous run while the header is unchanged
+           (explicit column types can override the inferred ones)
+        2. Create or reuse a Hyper file
+        3. Create the schema/table if needed
+        4. Load the CSV file with Hyper's native CSV reader (COPY)
+           In incremental mode, only rows above the extract's high-watermark
+           are applied (append or keyed upsert) in a single transaction
+        5. Build the optional aggregates from the loaded table in one scan
+
+    Args:
+        csv_filepath: CSV file to load (with a header row).
+        work_dir: Directory holding the generated files of this extract.
+        delimiter: Field delimiter of the CSV file.
+        encoding: Encoding of the CSV file.
+        column_types: Optional Hyper types and nullability keyed by column
+            name, overriding the inferred ones.
+        incremental: Optional incremental refresh settings.
+        hyper_filename: Name of the Hyper file (without suffix), the CSV
+            file name by default.
+        table: Name of the table to load, in the Extract schema. Other
+            tables of the file are left untouched.
+        reuse_schema: Reuse the schema inferred on a previous run, kept in
+            schemas.json next to the Hyper file, so column types stay
+            stable from run to run.
+        aggregates: Optional rollups of the loaded table, rebuilt on every
+            run, as tables of the extract or companion files (see
+            aggregate_path).
+
+    Returns:
+        Path of the generated Hyper file.
+    """
+    extract_name = hyper_filename or csv_filepath.stem
+    column_types = column_types or {}
+
+    # ---------------------------------------------------------------------
+    # Create temporary directory for the Hyper file
+    # Directories are created if they do not already exist
+    # ---------------------------------------------------------------------
+    hyper_path = work_dir / "hyper_file" / f"{extract_name}.hyper"
+    hyper_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Watermarks of each table are kept apart
+    extract_key = table_key(extract_name, table)
+    watermark_store = WatermarkStore(hyper_path.parent / "watermarks.json")
+
+    # ---------------------------------------------------------------------
+    # Resolve the table schema
+    # Only the first block of the CSV is parsed, so this is cheap even for
+    # multi-GB files; the schema is then cached per table and reused while
+    # the CSV header is unchanged
+    # ---------------------------------------------------------------------
+    with track_stage("schema_inference", extract=extract_key):
+        if reuse_schema:
+            csv_schema = cached_csv_schema(
+                csv_filepath,
+                extract_key,
+                SchemaCache(hyper_path.parent / "schemas.json"),
+                delimiter=delimiter,
+                encoding=encoding,
+            )
+        else:
+            csv_schema = infer_csv_schema(
+                csv_filepath, delimiter=delimiter, encoding=encoding
+            )
+
+    # ---------------------------------------------------------------------
+    # Open a connection to the Hyper file on the shared Hyper engine
+    # The engine starts one Hyper process per run, reused by every script
+    # CREATE_IF_NOT_EXISTS mode reuses the file if it already exists
+    # ---------------------------------------------------------------------
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_IF_NOT_EXISTS
+    ) as connection:
+
+        # -----------------------------------------------------------------
+        # Define schema and table name
+        # Tableau extracts conventionally use Extract.Extract as default
+        # -----------------------------------------------------------------
+        schema_name = DEFAULT_SCHEMA
+        table_name = TableName(schema_name, table)
+
+        # -----------------------------------------------------------------
+        # Resolve the high-watermark of the existing extract
+        # Without one (first run, or full mode), every CSV row is loaded
+        # -----------------------------------------------------------------
+        watermark = None
+        if incremental:
+            watermark = read_watermark(
+                connection,
+                table_name,
+                incremental.watermark_column,
+                store=watermark_store,
+                extract=extract_key,
+            )
+            logger.info(f"Current watermark: {watermark!r}")
+
+        if watermark is not None:
+            # -------------------------------------------------------------
+            # Incremental refresh
+            # The CSV is loaded into a temporary staging table, then only
+            # rows above the watermark are applied to the extract (append
+            # or keyed upsert) in a single transaction
+            # -------------------------------------------------------------
+            stage_table = TableName("csv_stage")
+            connection.catalog.create_table(
+                TableDefinition(
+                    table_name=stage_table,
+                    columns=table_definition_from_arrow(
+                        csv_schema, stage_table, overrides=column_types
+                    ).columns,
+                    persistence=TEMPORARY,
                 )
+            )
+            copy_csv(
+                connection,
+                stage_table,
+                csv_filepath,
+                delimiter=delimiter,
+                encoding=encoding,
+            )
+            _, new_watermark = apply_delta(
+                connection,
+                table_name,
+                str(stage_table),
+                csv_schema.names,
+                incremental,
+                watermark,
+            )
+            watermark_store.set(extract_key, new_watermark)
 
-                # -----------------------------------------------------------------
-                # Load Parquet data into the Hyper file
-                # - If table exists: Append data (INSERT)
-                # - If table does not exist: Create it from the first Parquet file
-                # -----------------------------------------------------------------
-                for p in parquet_files:
-
-                    parquet_name = p.name
-                    logger.info("Starting parquet ingestion: %s", parquet_name)
-                    p_sql = escape_string_literal(str(p.resolve()))
-
-                    try:
-                        connection.execute_command(
-                            f"INSERT INTO {schema_table} "
-                            f"(SELECT * FROM external({p_sql}, FORMAT => 'parquet'))"
-                        )
-
-                    except Exception:
-                        connection.execute_command(
-                            f"CREATE TABLE {schema_table} AS "
-                            f"(SELECT * FROM external({p_sql}, FORMAT => 'parquet'))"
-                        )
-                        logger.info(
-                            "Parquet file used to create Hyper table: %s", parquet_name
-                        )
+        else:
+            # Ensure schema and table exist (idempotent operations)
+            connection.catalog.create_schema_if_not_exists(schema_name)
+            connection.catalog.create_table_if_not_exists(
+                table_definition_from_arrow(
+                    csv_schema, table_name, overrides=column_types
+                )
+            )
 
-    logger.info(f"Script finished: {args.script}")
+            # -------------------------------------------------------------
+            # Load the CSV file into the Hyper table
+            # Hyper parses the file itself; rows are appended to the table
+            # -------------------------------------------------------------
+            copy_csv(
+                connection,
+                table_name,
+                csv_filepath,
+                delimiter=delimiter,
+                encoding=encoding,
+            )
+            if incremental:
+                watermark_store.set(
+                    extract_key,
+                    read_watermark(
+                        connection, table_name, incremental.watermark_column
+                    ),
+                )
+
+        # -----------------------------------------------------------------
+        # Build the aggregates from the loaded table
+        # All grains come from a single GROUPING SETS scan of the table
+        # -----------------------------------------------------------------
+        build_aggregates(connection, table_name, aggregates, hyper_path)
+
+    return hyper_path
+
+
+def generate_tables_from_csv(
+    csv_filepaths: Dict[str, Path],
+    hyper_filename: str,
+    work_dir: Path,
+    max_workers: int = 4,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    column_types: Optional[Dict[str, SchemaOverrides]] = None,
+    incremental: Optional[Dict[str, IncrementalConfig]] = None,
+    aggregates: Optional[Dict[str, Sequence[Aggregate]]] = None,
+) -> Path:
+    """
+    Generate a multi-table Tableau Hyper file from several CSV files.
+
+    Each file is loaded into its own table of the Extract schema,
+    concurrently, on the shared Hyper engine.
+
+    Args:
+        csv_filepaths: CSV file of each table, keyed by table name.
+        hyper_filename: Name of the Hyper file (without suffix).
+        work_dir: Directory holding the generated files of this extract.
+        max_workers: Number of files loaded concurrently.
+        delimiter: Field delimiter of the CSV files.
+        encoding: Encoding of the CSV files.
+        column_types: Optional column overrides keyed by table, then column
+            name.
+        incremental: Optional incremental refresh settings, keyed by table
+            name. Tables not listed are fully reloaded.
+        aggregates: Optional aggregates keyed by table name, with names
+            unique across the extract.
+
+    Returns:
+        Path of the generated Hyper file.
+    """
+    column_types = column_types or {}
+    incremental = incremental or {}
+    aggregates = aggregates or {}
+    validate_aggregate_names(aggregates, list(csv_filepaths))
+    unknown = sorted((set(column_types) | set(incremental)) - set(csv_filepaths))
+    if unknown:
+        raise ValueError(f"Settings given for unknown tables: {unknown}")
+
+    hyper_path = work_dir / "hyper_file" / f"{hyper_filename}.hyper"
+    load_tables(
+        hyper_path,
+        list(csv_filepaths),
+        lambda table: generate_from_csv(
+            csv_filepath=csv_filepaths[table],
+            work_dir=work_dir,
+            delimiter=delimiter,
+            encoding=encoding,
+            column_types=column_types.get(table),
+            incremental=incremental.get(table),
+            hyper_filename=hyper_filename,
+            table=table,
+            aggregates=aggregates.get(table, ()),
+        ),
+        max_workers=max_workers,
+    )
+    return hyper_path
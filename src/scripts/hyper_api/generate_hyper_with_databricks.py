@@ -3,36 +3,80 @@ from __future__ import annotations
 import argparse
 import logging
 import re
+from contextlib import closing
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
 
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tableauhyperapi import (
+    TEMPORARY,
     Connection,
     CreateMode,
-    HyperProcess,
-    Telemetry,
-    escape_string_literal,
+    TableName,
 )
 
+from src.utils.aggregates import (
+    Aggregate,
+    build_aggregates,
+    validate_aggregate_names,
+)
+from src.utils.databricks_extract import (
+    extract_partitions_to_parquet,
+    extract_to_parquet,
+    iter_parquet_shards,
+)
+from src.utils.hyper_load import (
+    external_parquet_sql,
+    insert_arrow_batches,
+    load_parquet_files_sharded,
+    load_parquet_stream,
+)
+from src.utils.hyper_schema import ColumnOverride, SchemaOverrides
+from src.utils.incremental import (
+    IncrementalConfig,
+    WatermarkStore,
+    apply_delta,
+    delta_path,
+    export_delta,
+    full_publish_marker,
+    read_watermark,
+)
 from src.utils.log_duration import log_duration
+from src.utils.multi_table import (
+    DEFAULT_SCHEMA,
+    DEFAULT_TABLE,
+    load_tables,
+    table_key,
+)
+from src.utils.partitioning import Partition, filter_query, sql_literal
+from src.utils.pipeline import prefetch
+from src.utils.query_cache import (
+    DEFAULT_CACHE_MAX_BYTES,
+    QueryCache,
+    resolve_cache_key,
+)
+from src.utils.staging import StagingWorkspace
+from src.utils.transforms import Transform, compile_transform
 from src.wrapper.config import ConfigWrapper
-from src.wrapper.databricks_wrapper import DatabricksClient
+from src.wrapper.databricks_wrapper import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DatabricksClient,
+)
+from src.wrapper.hyper_wrapper import HyperEngine
 
 logger = logging.getLogger(__name__)
 
+STAGING_PARQUET = "parquet"
+STAGING_ARROW = "arrow"
+STAGING_MODES = (STAGING_PARQUET, STAGING_ARROW)
+
 
 def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
     """
     Generate a Tableau Hyper file from Databricks data.
 
-    Workflow:
-        1. Execute query on Databricks to fetch data
-        2. Convert results to pandas DataFrame with proper types
-        3. Export data to Parquet format (intermediate format)
-        4. Create or reuse a Hyper file
-        5. Create the schema/table if needed
-        6. Insert Parquet data into the Hyper table
-
     Args:
         cfg: Configuration wrapper containing environment settings.
         args: Command-line arguments containing script name.
@@ -48,95 +92,671 @@ def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
 
     hyper_filename = "your_table"
 
+    # Optional multi-table extract: named queries loaded concurrently into
+    # separate tables of the same .hyper file (e.g. a fact table and its
+    # dimensions, instead of one pre-joined table), e.g.
+    # {"orders": "SELECT * FROM sales.orders",
+    #  "customers": "SELECT * FROM sales.customers"}.
+    # When set, query is ignored. None loads query into Extract.Extract.
+    tables: Optional[Dict[str, str]] = None
+
+    # Rows fetched per Arrow batch, and memory budget (bytes) for one batch
+    batch_size = 100_000
+    max_batch_bytes = 256 * 1024 * 1024
+
+    # Optional partitioning: split the query into slices extracted
+    # concurrently, e.g. range_partitions("order_date", date(2024, 1, 1),
+    # date(2025, 1, 1), timedelta(days=30)), list_partitions("country",
+    # ["FR", "DE"]) or hash_partitions("customer_id", 8). None disables it.
+    partitions: Optional[List[Partition]] = None
+    max_workers = 4
+    max_retries = 2
+
+    # Optional incremental refresh: only rows above the extract's
+    # high-watermark are fetched, then appended or upserted on key columns,
+    # e.g. IncrementalConfig("updated_at", mode="upsert", key_columns=["id"]).
+    # None re-fetches the full query and appends it on every run.
+    incremental: Optional[IncrementalConfig] = None
+
+    # With incremental refreshes, also write the applied rows to
+    # hyper_file/delta/<name>.hyper, so that publish_hyper can send only the
+    # change set (publish_delta) instead of the full extract
+    write_delta = False
+
+    # Query result cache: results are kept as Parquet shards keyed by the
+    # normalized query and the Delta version of its source tables, so a
+    # rerun on unchanged data skips the warehouse. Source tables are
+    # detected from the query unless listed in cache_tables.
+    # Set use_cache to False to always query the warehouse.
+    use_cache = True
+    cache_dir = Path("temp/query_cache")
+    cache_max_bytes = 20 * 1024 * 1024 * 1024
+    cache_tables: Optional[List[str]] = None
+
+    # Staging of the fetched batches before the Hyper load:
+    # - "parquet": Parquet shards on disk, loaded with one INSERT (supports
+    #   partitions and the query cache)
+    # - "arrow": batches handed to Hyper as Arrow streams through shared
+    #   memory, without any file on disk (for small-disk runners)
+    staging = STAGING_PARQUET
+
+    # With Arrow staging, batches are spooled in /dev/shm; when it is missing
+    # or too small they go to the temp directory on disk, with a warning.
+    # Set to False to fail instead, e.g. on runners without disk space.
+    allow_disk_spool = True
+
+    # Optional Hyper column types and nullability, keyed by column name,
+    # overriding those mapped from the Arrow types, e.g.
+    # {"amount": "decimal(12,2)", "country": "varchar(2)",
+    #  "id": {"type": "bigint", "nullable": False}}.
+    column_types: Dict[str, ColumnOverride] = {}
+
+    # Number of Hyper files built in parallel from the Parquet shards, then
+    # merged into the extract. Pays off on many-core hosts; measure it with
+    # the run_benchmarks script. 1 loads all shards on a single connection.
+    build_shards = 1
+
+    # Pipelined run: the fetch, the staging of each batch and the Hyper load
+    # run concurrently, linked by queues holding at most pipeline_depth
+    # items, so a run takes about as long as its slowest stage. Each queued
+    # batch holds up to max_batch_bytes of memory. 0 runs the stages one
+    # after another.
+    pipeline_depth = 2
+
+    # Optional transform run by Hyper while it loads the Parquet shards
+    # (filters, renames, casts, derived columns, deduplication), instead of
+    # reshaping the data in Python, e.g.
+    # Transform(filter="amount > 0", rename={"cust_id": "customer_id"},
+    #           derive={"order_year": "EXTRACT(YEAR FROM order_date)"},
+    #           casts={"amount": "decimal(12,2)"},
+    #           dedup_on=["order_id"], dedup_order="updated_at DESC").
+    transform: Optional[Transform] = None
+
+    # Optional pre-aggregated tables built from the loaded table in a single
+    # Hyper scan (GROUP BY GROUPING SETS), for dashboards that only need
+    # rollups. Companion aggregates are written to their own .hyper file in
+    # hyper_file/aggregates/, published like the detail extract, e.g.
+    # [Aggregate("daily", {"day": "CAST(order_date AS DATE)", "country": "country"},
+    #            {"revenue": "SUM(amount)", "orders": "COUNT(*)"}),
+    #  Aggregate("by_country", ["country"], {"revenue": "SUM(amount)"},
+    #            companion=False)].
+    aggregates: List[Aggregate] = []
+
+    # Settings of a multi-table extract, keyed by table name (incremental,
+    # column_types, transform and aggregates above only apply to a
+    # single-table one), e.g. {"orders": IncrementalConfig("updated_at")}.
+    # Aggregate names must be unique across the extract.
+    table_incremental: Dict[str, IncrementalConfig] = {}
+    table_column_types: Dict[str, Dict[str, ColumnOverride]] = {}
+    table_transforms: Dict[str, Transform] = {}
+    table_aggregates: Dict[str, List[Aggregate]] = {}
+
+    options = dict(
+        batch_size=batch_size,
+        max_batch_bytes=max_batch_bytes,
+        max_retries=max_retries,
+        cache_dir=cache_dir if use_cache else None,
+        cache_max_bytes=cache_max_bytes,
+        cache_tables=cache_tables,
+        staging=staging,
+        allow_disk_spool=allow_disk_spool,
+        build_shards=build_shards,
+        pipeline_depth=pipeline_depth,
+    )
+    work_dir = Path(f"temp/{hyper_filename}/{args.script}")
+
     with log_duration(args.script):
+        if tables:
+            generate_tables_from_databricks(
+                queries=tables,
+                hyper_filename=hyper_filename,
+                work_dir=work_dir,
+                max_workers=max_workers,
+                incremental=table_incremental,
+                column_types=table_column_types,
+                transforms=table_transforms,
+                aggregates=table_aggregates,
+                **options,
+            )
+        else:
+            generate_from_databricks(
+                query=query,
+                hyper_filename=hyper_filename,
+                work_dir=work_dir,
+                partitions=partitions,
+                max_workers=max_workers,
+                incremental=incremental,
+                column_types=column_types,
+                write_delta=write_delta,
+                transform=transform,
+                aggregates=aggregates,
+                **options,
+            )
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def generate_from_databricks(
+    query: str,
+    hyper_filename: str,
+    work_dir: Path,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    partitions: Optional[List[Partition]] = None,
+    max_workers: int = 4,
+    max_retries: int = 2,
+    incremental: Optional[IncrementalConfig] = None,
+    cache_dir: Optional[Path] = None,
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    cache_tables: Optional[Sequence[str]] = None,
+    staging: str = STAGING_PARQUET,
+    allow_disk_spool: bool = True,
+    table: str = DEFAULT_TABLE,
+    build_shards: int = 1,
+    column_types: Optional[SchemaOverrides] = None,
+    write_delta: bool = False,
+    transform: Optional[Transform] = None,
+    pipeline_depth: int = 0,
+    aggregates: Sequence[Aggregate] = (),
+    client_factory: Callable[[], DatabricksClient] = DatabricksClient,
+) -> Path:
+    """
+    Generate a Tableau Hyper file from the result of a Databricks query.
+
+    Workflow:
+        1. Read the high-watermark of the existing extract (incremental mode)
+        2. Look the query up in the result cache; on a hit, the cached
+           Parquet shards are loaded and the warehouse is not queried
+        3. Otherwise execute query on Databricks (optionally split into
+           partitions extracted concurrently), stream results as Arrow
+           batches and write each batch as its own Parquet shard
+        4. Create or reuse a Hyper file
+        5. Create the schema/table from the Parquet schema if needed
+        6. Insert all Parquet shards into the Hyper table in one statement
+           (or build several Hyper files in parallel and merge them), or
+           apply them as a delta above the watermark (incremental mode),
+           reshaped on the way by the optional transform
+        With pipeline_depth, steps 3 to 6 overlap: batches are fetched by a
+        background thread, staged by another and loaded by the caller as
+        soon as each shard is written.
+        7. Build the optional aggregates from the loaded table in one scan
+
+    Args:
+        query: SQL query to extract.
+        hyper_filename: Name of the extract (Hyper file name without suffix).
+        work_dir: Directory holding the generated files of this extract.
+        batch_size: Rows fetched per Arrow batch.
+        max_batch_bytes: Memory budget (in bytes) for one Arrow batch.
+        partitions: Optional partitions extracted concurrently.
+        max_workers: Number of partitions extracted concurrently.
+        max_retries: Retries per failed partition.
+        incremental: Optional incremental refresh settings.
+        cache_dir: Directory of the query result cache. None bypasses the
+            cache.
+        cache_max_bytes: Size limit of the cache, enforced by evicting the
+            least recently used results.
+        cache_tables: Source tables whose Delta versions key the cache,
+            detected from the query when not given.
+        staging: "parquet" to stage batches as Parquet shards, or "arrow" to
+            stream them into Hyper without intermediate files (partitions
+            and the query cache are not available in this mode).
+        allow_disk_spool: With Arrow staging, spool batches to the temp
+            directory on disk when shared memory is missing or too small.
+            When False, the run fails instead.
+        table: Name of the table to load, in the Extract schema. Other
+            tables of the file are left untouched.
+        build_shards: Number of Hyper files built in parallel from the
+            Parquet shards and merged into the table (full loads only).
+        column_types: Optional Hyper types and nullability keyed by column
+            name, overriding those mapped from Arrow when the table is
+            created.
+        write_delta: Also write the rows applied by an incremental run to
+            a delta file (see delta_path), published by publish_delta
+            instead of the full extract. Runs that load the whole query
+            leave no delta file.
+        transform: Optional transform compiled into the SQL that loads the
+            Parquet shards, so Hyper reshapes the rows while ingesting them
+            (Parquet staging only). Column types and incremental key
+            columns then refer to the transformed columns.
+        pipeline_depth: Number of items queued between the fetch, staging
+            and load stages, which then run concurrently. Applies to full
+            loads fetched with a single query; cache hits, partitions,
+            sharded builds, deduplicating transforms and incremental deltas
+            are loaded once staged. 0 runs the stages one after another.
+        aggregates: Optional rollups of the loaded table, rebuilt on every
+            run, as tables of the extract or companion files (see
+            aggregate_path).
+        client_factory: Callable returning a new Databricks client, e.g.
+            one over a stand-in connection serving synthetic data.
+
+    Returns:
+        Path of the generated Hyper file.
+    """
+
+    # ---------------------------------------------------------------------
+    # Create the directory of the Hyper file
+    # Intermediate files are staged in a per-run workspace (see below)
+    # ---------------------------------------------------------------------
+    if staging not in STAGING_MODES:
+        raise ValueError(f"Unsupported staging mode: {staging}")
+    if staging == STAGING_ARROW and partitions:
+        raise ValueError("Partitioned extraction requires Parquet staging")
+    if write_delta and (not incremental or table != DEFAULT_TABLE):
+        raise ValueError(
+            "Delta files require incremental settings and a single-table extract"
+        )
+    if pipeline_depth < 0:
+        raise ValueError(f"pipeline_depth must not be negative, got {pipeline_depth}")
+    if transform is not None:
+        if staging == STAGING_ARROW:
+            raise ValueError("Transforms require Parquet staging")
+        if incremental and (
+            incremental.watermark_column in transform.rename
+            or incremental.watermark_column in transform.drop
+            or incremental.watermark_column in transform.derive
+        ):
+            raise ValueError(
+                "The transform must keep the watermark column "
+                f"{incremental.watermark_column!r} unchanged"
+            )
+    if staging == STAGING_ARROW and cache_dir is not None:
+        logger.warning("The query cache requires Parquet staging, bypassing it")
+        cache_dir = None
+
+    hyper_path = work_dir / "hyper_file" / f"{hyper_filename}.hyper"
+    hyper_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Watermarks and Parquet shards of each table are kept apart
+    extract_key = table_key(hyper_filename, table)
+
+    watermark_store = WatermarkStore(hyper_path.parent / "watermarks.json")
+
+    # publish_delta removes the delta file once published. A delta still
+    # there was never published, so the server misses its rows: the next
+    # publish has to send the whole extract, which the marker requests
+    # (publish_delta clears it), and no delta is written until then
+    delta_file = delta_path(hyper_path) if write_delta else None
+    if delta_file is not None:
+        marker = full_publish_marker(hyper_path)
+        if delta_file.exists():
+            logger.warning(
+                f"Delta {delta_file} was not published, "
+                "the next publish will send the full extract"
+            )
+            marker.touch()
+            delta_file.unlink()
+        if marker.exists():
+            delta_file = None
+
+    # ---------------------------------------------------------------------
+    # Open a per-run staging workspace and a connection to the Hyper file
+    # Staged Parquet and Hyper shards live in a directory of their own
+    # (under staging_root when set, e.g. a tmpfs), removed after a
+    # successful load and kept for debugging when the run fails.
+    # The engine starts one Hyper process per run, reused by every script
+    # CREATE_IF_NOT_EXISTS mode reuses the file if it already exists
+    # ---------------------------------------------------------------------
+    with (
+        StagingWorkspace(extract_key, work_dir / "staging") as workspace,
+        HyperEngine().connect(
+            hyper_path, create_mode=CreateMode.CREATE_IF_NOT_EXISTS
+        ) as connection,
+    ):
+
+        # -----------------------------------------------------------------
+        # Define schema and table name
+        # Tableau extracts conventionally use Extract.Extract as default
+        # -----------------------------------------------------------------
+        table_name = TableName(DEFAULT_SCHEMA, table)
+
+        # -----------------------------------------------------------------
+        # Resolve the high-watermark of the existing extract
+        # Without one (first run, or full mode), the whole query is fetched
+        # -----------------------------------------------------------------
+        watermark = None
+        if incremental:
+            watermark = read_watermark(
+                connection,
+                table_name,
+                incremental.watermark_column,
+                store=watermark_store,
+                extract=extract_key,
+            )
+            logger.info(f"Current watermark: {watermark!r}")
+
+        source_query = query
+        if watermark is not None:
+            source_query = filter_query(
+                query,
+                f"{incremental.watermark_column} > {sql_literal(watermark)}",
+            )
+
+        # Only runs applying a delta above a watermark write a delta file;
+        # full loads have to be published in full
+        run_delta_file = delta_file if watermark is not None else None
 
-        # ---------------------------------------------------------------------
-        # Fetch data from Databricks
-        # Data is retrieved as DataFrame with proper types via Apache Arrow
-        # ---------------------------------------------------------------------
-        client = DatabricksClient()
-        df = client.execute_query(query)
-        client.close()
-
-        # Convert object columns to string dtype for better type handling
-        for col in df.select_dtypes(include=["object"]).columns:
-            df[col] = df[col].astype("string")
-
-        logger.info(f"Fetched {len(df)} rows from Databricks")
-        print(df.info())
-
-        # ---------------------------------------------------------------------
-        # Create temporary directories for Parquet files and Hyper file
-        # Directories are created if they do not already exist
-        # ---------------------------------------------------------------------
-        parquet_dir = Path(f"temp/{hyper_filename}/{args.script}/parquet_files")
-        parquet_dir.mkdir(parents=True, exist_ok=True)
-
-        hyper_path = Path(
-            f"temp/{hyper_filename}/{args.script}/hyper_file/{hyper_filename}.hyper"
+        # -----------------------------------------------------------------
+        # Arrow staging: stream the batches straight into Hyper
+        # -----------------------------------------------------------------
+        if staging == STAGING_ARROW:
+            client = client_factory()
+            try:
+                batches = client.fetch_arrow_batches(
+                    source_query,
+                    batch_size=batch_size,
+                    max_batch_bytes=max_batch_bytes,
+                )
+                # With a pipeline, the next batches are fetched while one
+                # is being loaded
+                if pipeline_depth:
+                    batches = prefetch(batches, pipeline_depth, name="databricks-fetch")
+                with closing(batches):
+                    new_watermark = _stream_into_hyper(
+                        connection,
+                        table_name,
+                        batches,
+                        incremental,
+                        watermark,
+                        column_types,
+                        run_delta_file,
+                        allow_disk_spool,
+                    )
+            finally:
+                client.close()
+            if incremental and new_watermark is not None:
+                watermark_store.set(extract_key, new_watermark)
+            if run_delta_file is not None and not run_delta_file.exists():
+                export_delta(connection, table_name, run_delta_file)
+            build_aggregates(connection, table_name, aggregates, hyper_path)
+            return hyper_path
+
+        # -----------------------------------------------------------------
+        # Look the query up in the result cache
+        # The key covers the Delta version of every source table, so a hit
+        # is guaranteed to match what the warehouse would return
+        # -----------------------------------------------------------------
+        cache = cache_key = parquet_files = None
+        if cache_dir is not None:
+            cache = QueryCache(Path(cache_dir), max_bytes=cache_max_bytes)
+            client = client_factory()
+            try:
+                cache_key = resolve_cache_key(client, source_query, cache_tables)
+            finally:
+                client.close()
+            if cache_key is not None:
+                parquet_files = cache.get(cache_key)
+
+        # -----------------------------------------------------------------
+        # Stream data from Databricks into Parquet shards
+        # Results are fetched as Arrow batches (types are preserved by
+        # Arrow) and each batch is written as its own Parquet shard, so
+        # the full result set is never materialized in memory.
+        # With partitions, each slice runs concurrently on its own
+        # connection and is retried on its own if it fails.
+        # -----------------------------------------------------------------
+        parquet_dir = workspace.subdir("parquet_files")
+        cache_hit = parquet_files is not None
+        # Deduplication needs all the shards at once, partitions and sharded
+        # builds produce them concurrently already
+        pipelined = (
+            bool(pipeline_depth)
+            and not cache_hit
+            and watermark is None
+            and not partitions
+            and build_shards <= 1
+            and not (transform is not None and transform.dedup_on)
         )
-        hyper_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # ---------------------------------------------------------------------
-        # Export DataFrame to Parquet format
-        # Parquet is used as intermediate format because it is columnar,
-        # fast to read, and natively supported by Hyper's external() function
-        # ---------------------------------------------------------------------
-        parquet_path = parquet_dir / f"{hyper_filename}.parquet"
-        df.to_parquet(parquet_path, index=False)
-
-        # ---------------------------------------------------------------------
-        # Collect all Parquet files to be loaded into the Hyper file
-        # Files are sorted to ensure deterministic loading order
-        # ---------------------------------------------------------------------
-        parquet_files = sorted(parquet_dir.glob("*.parquet"))
-
-        # ---------------------------------------------------------------------
-        # Start Hyper process and open connection to the Hyper file
-        # CREATE_IF_NOT_EXISTS mode reuses the file if it already exists
-        # ---------------------------------------------------------------------
-        with HyperProcess(telemetry=Telemetry.SEND_USAGE_DATA_TO_TABLEAU) as hyper:
-            with Connection(
-                endpoint=hyper.endpoint,
-                database=str(hyper_path),
-                create_mode=CreateMode.CREATE_IF_NOT_EXISTS,
-            ) as connection:
-
-                # -----------------------------------------------------------------
-                # Define schema and table name
-                # Tableau extracts conventionally use Extract.Extract as default
-                # -----------------------------------------------------------------
-                schema_name = "Extract"
-                table_name = "Extract"
-                schema_table = f'"{schema_name}"."{table_name}"'
-
-                # Ensure schema exists (idempotent operation)
-                connection.execute_command(
-                    f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'
+        if cache_hit:
+            logger.info("Using cached query result, skipping Databricks")
+        elif pipelined:
+            # Fetch thread -> staging thread -> load on this connection,
+            # through bounded queues: a full queue blocks the stage feeding
+            # it, so no stage runs more than pipeline_depth items ahead
+            client = client_factory()
+            try:
+                shards = prefetch(
+                    iter_parquet_shards(
+                        client,
+                        source_query,
+                        parquet_dir,
+                        prefix=extract_key,
+                        batch_size=batch_size,
+                        max_batch_bytes=max_batch_bytes,
+                        min_free_bytes=workspace.min_free_bytes,
+                        prefetch_batches=pipeline_depth,
+                    ),
+                    pipeline_depth,
+                    name="parquet-stage",
+                )
+                with closing(shards):
+                    _, parquet_files = load_parquet_stream(
+                        connection,
+                        table_name,
+                        shards,
+                        overrides=column_types,
+                        transform=transform,
+                    )
+            finally:
+                client.close()
+        elif partitions:
+            parquet_files = extract_partitions_to_parquet(
+                source_query,
+                partitions,
+                parquet_dir,
+                prefix=extract_key,
+                max_workers=max_workers,
+                max_retries=max_retries,
+                batch_size=batch_size,
+                max_batch_bytes=max_batch_bytes,
+                client_factory=client_factory,
+                min_free_bytes=workspace.min_free_bytes,
+            )
+        else:
+            client = client_factory()
+            try:
+                parquet_files = extract_to_parquet(
+                    client,
+                    source_query,
+                    parquet_dir,
+                    prefix=extract_key,
+                    batch_size=batch_size,
+                    max_batch_bytes=max_batch_bytes,
+                    min_free_bytes=workspace.min_free_bytes,
+                )
+            finally:
+                client.close()
+
+        if cache_key is not None and not cache_hit:
+            parquet_files = cache.put(cache_key, parquet_files, query=source_query)
+
+        # Shards are returned in partition then batch order, which keeps
+        # the Hyper loading order deterministic
+        logger.info(f"Fetched {len(parquet_files)} Parquet shards from Databricks")
+
+        # -----------------------------------------------------------------
+        # Load Parquet data into the Hyper file
+        # - Incremental refresh of an existing table: apply the delta
+        #   (append or keyed upsert) in a single transaction
+        # - Otherwise: create the table from the Parquet schema if needed
+        #   and append all shards with a single INSERT over external(), or
+        #   build_shards Hyper files in parallel merged with one INSERT
+        #   (pipelined runs have already loaded the shards)
+        # -----------------------------------------------------------------
+        if incremental and parquet_files and watermark is not None:
+            source_sql = external_parquet_sql(parquet_files)
+            columns = pq.read_schema(parquet_files[0]).names
+            if transform is not None:
+                compiled = compile_transform(transform, source_sql, columns)
+                source_sql = f"({compiled.sql}) AS transformed"
+                columns = compiled.columns
+            _, new_watermark = apply_delta(
+                connection,
+                table_name,
+                source_sql,
+                columns,
+                incremental,
+                watermark,
+                delta_file=run_delta_file,
+            )
+            watermark_store.set(extract_key, new_watermark)
+        else:
+            if build_shards > 1:
+                # The Hyper shards hold a copy of the data until the merge
+                workspace.ensure_free_space(
+                    sum(path.stat().st_size for path in parquet_files)
+                )
+            if not pipelined:
+                load_parquet_files_sharded(
+                    connection,
+                    table_name,
+                    parquet_files,
+                    shard_count=build_shards,
+                    shard_dir=workspace.path / "hyper_shards",
+                    overrides=column_types,
+                    transform=transform,
                 )
+            if incremental and parquet_files:
+                watermark_store.set(
+                    extract_key,
+                    read_watermark(
+                        connection, table_name, incremental.watermark_column
+                    ),
+                )
+
+        # Incremental runs without new rows publish an empty delta
+        if run_delta_file is not None and not run_delta_file.exists():
+            export_delta(connection, table_name, run_delta_file)
+
+        # -----------------------------------------------------------------
+        # Build the aggregates from the loaded table
+        # All grains come from a single GROUPING SETS scan of the table
+        # -----------------------------------------------------------------
+        build_aggregates(connection, table_name, aggregates, hyper_path)
+
+    return hyper_path
+
+
+def generate_tables_from_databricks(
+    queries: Dict[str, str],
+    hyper_filename: str,
+    work_dir: Path,
+    max_workers: int = 4,
+    incremental: Optional[Dict[str, IncrementalConfig]] = None,
+    column_types: Optional[Dict[str, SchemaOverrides]] = None,
+    transforms: Optional[Dict[str, Transform]] = None,
+    aggregates: Optional[Dict[str, Sequence[Aggregate]]] = None,
+    **options: Any,
+) -> Path:
+    """
+    Generate a multi-table Tableau Hyper file from several Databricks queries.
+
+    Each query is extracted and loaded into its own table of the Extract
+    schema, concurrently, on the shared Hyper engine. Storing a fact table
+    and its dimensions separately keeps the extract much smaller than a
+    single pre-joined table.
+
+    Args:
+        queries: SQL query of each table, keyed by table name.
+        hyper_filename: Name of the extract (Hyper file name without suffix).
+        work_dir: Directory holding the generated files of this extract.
+        max_workers: Number of tables extracted and loaded concurrently.
+        incremental: Optional incremental refresh settings, keyed by table
+            name. Tables not listed are fully reloaded.
+        column_types: Optional column overrides keyed by table, then
+            column name.
+        transforms: Optional transforms keyed by table name.
+        aggregates: Optional aggregates keyed by table name, with names
+            unique across the extract.
+        **options: Other generate_from_databricks arguments, applied to
+            every table (batch_size, cache_dir, staging, ...).
+
+    Returns:
+        Path of the generated Hyper file.
+    """
+    incremental = incremental or {}
+    column_types = column_types or {}
+    transforms = transforms or {}
+    aggregates = aggregates or {}
+    validate_aggregate_names(aggregates, list(queries))
+    unknown = sorted(
+        (set(incremental) | set(column_types) | set(transforms)) - set(queries)
+    )
+    if unknown:
+        raise ValueError(f"Settings given for unknown tables: {unknown}")
+
+    hyper_path = work_dir / "hyper_file" / f"{hyper_filename}.hyper"
+    load_tables(
+        hyper_path,
+        list(queries),
+        lambda table: generate_from_databricks(
+            query=queries[table],
+            hyper_filename=hyper_filename,
+            work_dir=work_dir,
+            incremental=incremental.get(table),
+            table=table,
+            column_types=column_types.get(table),
+            transform=transforms.get(table),
+            aggregates=aggregates.get(table, ()),
+            **options,
+        ),
+        max_workers=max_workers,
+    )
+    return hyper_path
+
+
+def _stream_into_hyper(
+    connection: Connection,
+    table_name: TableName,
+    batches: Iterator[pa.Table],
+    incremental: Optional[IncrementalConfig],
+    watermark: Optional[Any],
+    column_types: Optional[SchemaOverrides] = None,
+    delta_file: Optional[Path] = None,
+    allow_disk_spool: bool = True,
+) -> Optional[Any]:
+    """Load Arrow batches into the extract without intermediate files.
+
+    Returns:
+        The new watermark in incremental mode, otherwise None.
+    """
+    if watermark is None:
+        insert_arrow_batches(
+            connection,
+            table_name,
+            batches,
+            column_types,
+            allow_disk_spool=allow_disk_spool,
+        )
+        if incremental and connection.catalog.has_table(table_name):
+            return read_watermark(connection, table_name, incremental.watermark_column)
+        return None
+
+    # Incremental refresh: stage the delta in a temporary table, then apply
+    # it (append or keyed upsert) in a single transaction
+    stage_table = TableName("arrow_stage")
+    insert_arrow_batches(
+        connection,
+        stage_table,
+        batches,
+        column_types,
+        persistence=TEMPORARY,
+        allow_disk_spool=allow_disk_spool,
+    )
+    if not connection.catalog.has_table(stage_table):
+        logger.info("No new rows above the watermark")
+        return watermark
 
-                # -----------------------------------------------------------------
-                # Load Parquet data into the Hyper file
-                # - If table exists: Append data (INSERT)
-                # - If table does not exist: Create it from the first Parquet file
-                # -----------------------------------------------------------------
-                for p in parquet_files:
-
-                    parquet_name = p.name
-                    logger.info("Starting parquet ingestion: %s", parquet_name)
-                    p_sql = escape_string_literal(str(p.resolve()))
-
-                    try:
-                        connection.execute_command(
-                            f"INSERT INTO {schema_table} "
-                            f"(SELECT * FROM external({p_sql}, FORMAT => 'parquet'))"
-                        )
-
-                    except Exception:
-                        connection.execute_command(
-                            f"CREATE TABLE {schema_table} AS "
-                            f"(SELECT * FROM external({p_sql}, FORMAT => 'parquet'))"
-                        )
-                        logger.info(
-                            "Parquet file used to create Hyper table: %s", parquet_name
-                        )
+    columns = [
+        column.name.unescaped
+        for column in connection.catalog.get_table_definition(stage_table).columns
+    ]
+    _, new_watermark = apply_delta(
+        connection,
+        table_name,
+        str(stage_table),
+        columns,
+        incremental,
+        watermark,
+        delta_file=delta_file,
+    )
+    return new_watermark
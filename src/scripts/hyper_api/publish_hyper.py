@@ -1,14 +1,56 @@
 from __future__ import annotations
 
 import argparse
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
+from tableauhyperapi import CreateMode, TableName
+
+from src.utils.hyper_fingerprint import CONTENT, FILE, hyper_fingerprint
+from src.utils.incremental import delta_path, full_publish_marker
 from src.utils.log_duration import log_duration
+from src.utils.luid_index import LuidIndex
+from src.utils.metrics import track_stage
+from src.utils.multi_table import DEFAULT_SCHEMA, DEFAULT_TABLE
+from src.utils.throttle import AdaptiveLimiter, backoff_delay
 from src.wrapper.config import ConfigWrapper
-from src.wrapper.tableau_wrapper import TableauClient
+from src.wrapper.tableau_wrapper import (
+    DEFAULT_CHUNK_SIZE,
+    MAX_RETRY_BACKOFF,
+    TableauClient,
+    is_throttling_error,
+)
+from src.wrapper.hyper_wrapper import HyperEngine
 
 logger = logging.getLogger(__name__)
 
+# Delta publishing modes: publish the delta file in Append mode, or apply it
+# through the "update hyper data" REST actions.
+DELTA_APPEND = "append"
+DELTA_UPDATE = "update"
+DELTA_MODES = (DELTA_APPEND, DELTA_UPDATE)
+
+
+@dataclass(frozen=True)
+class PublishRequest:
+    hyper_filepath: str
+    # Project LUID, or path from the top level (e.g. "Sales/Extracts")
+    project: str
+    mode: str = "Overwrite"
+
+
+@dataclass(frozen=True)
+class PublishResult:
+    hyper_filepath: str
+    uploaded: bool = False
+    seconds: float = 0.0
+    error: Optional[str] = None
+
 
 def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
     """
@@ -35,22 +77,450 @@ def main(cfg: ConfigWrapper, args: argparse.Namespace) -> None:
     # Path to the Hyper file to publish
     hyper_filepath = "$REPLACE_WITH_YOUR_HYPER_PATH"
 
-    # Target Tableau project LUID where the datasource will be published
-    project_luid = "$REPLACE_WITH_YOUR_PROJECT_LUID"
+    # Target Tableau project where the datasource will be published: its
+    # LUID, or its path from the top level (e.g. "Sales/Extracts"), resolved
+    # through a name-to-LUID index cached in temp/luid_index.json
+    project = "$REPLACE_WITH_YOUR_PROJECT_LUID_OR_PATH"
 
     # Publishing mode: CreateNew, Append, or Overwrite
     mode = "CreateNew"
 
+    # Resumable upload: the file is sent in chunks through an upload session
+    # that is resumed from the last committed chunk if the run fails
+    resumable = True
+    chunk_size = 50 * 1024 * 1024
+
+    # Skip Overwrite publishes when the datasource already holds the same
+    # content (fingerprint stored as a datasource tag)
+    skip_unchanged = True
+
+    # Optional delta publishing of incremental extracts generated with
+    # write_delta: only the rows of the last run are sent, either
+    # - "append": published in Append mode, or
+    # - "update": applied with the REST "update hyper data" actions, as an
+    #   upsert on key_columns (or plain inserts without key columns).
+    # Without a delta file (first run, full reload), the whole file is
+    # published in Overwrite mode. None always publishes the whole file.
+    delta_mode: Optional[str] = None
+    key_columns: List[str] = []
+
+    # Optional batch: several files published concurrently over the same
+    # session, e.g. [PublishRequest("temp/a.hyper", "Sales/Extracts"),
+    # PublishRequest("temp/b.hyper", "Sales/Extracts", mode="CreateNew")].
+    # Companion aggregate files written by the generators are published
+    # the same way, e.g. PublishRequest(str(aggregate_path(
+    # Path("temp/a.hyper"), "daily")), "Sales/Extracts").
+    # When set, hyper_filepath, project and mode are ignored. Concurrency
+    # starts at initial_concurrency and adapts up to max_workers: it is
+    # halved when the server throttles (429/503) and raised back after
+    # successes; throttled publishes are retried with jittered backoff.
+    publish_list: List[PublishRequest] = []
+    max_workers = 8
+    initial_concurrency = 2
+    report_path = Path("temp/publish_report.json")
+
     # ---------------------------------------------------------------------
     # Publish the datasource to Tableau
     # ---------------------------------------------------------------------
     with log_duration(args.script):
         with TableauClient() as tsc:
-            tsc.publish_datasources(
+            if delta_mode and not publish_list:
+                publish_delta(
+                    tsc,
+                    hyper_filepath=hyper_filepath,
+                    project_luid=LuidIndex(tsc).project_luid(project),
+                    delta_mode=delta_mode,
+                    key_columns=key_columns,
+                    resumable=resumable,
+                    chunk_size=chunk_size,
+                )
+            elif not publish_list:
+                publish_hyper(
+                    tsc,
+                    hyper_filepath=hyper_filepath,
+                    project_luid=LuidIndex(tsc).project_luid(project),
+                    mode=mode,
+                    resumable=resumable,
+                    chunk_size=chunk_size,
+                    skip_unchanged=skip_unchanged,
+                )
+            else:
+                results = publish_many(
+                    tsc,
+                    publish_list,
+                    max_workers=max_workers,
+                    initial_concurrency=initial_concurrency,
+                    resumable=resumable,
+                    chunk_size=chunk_size,
+                    skip_unchanged=skip_unchanged,
+                )
+                report_path.parent.mkdir(parents=True, exist_ok=True)
+                report_path.write_text(
+                    json.dumps([result.__dict__ for result in results], indent=2),
+                    encoding="utf-8",
+                )
+                logger.info(f"Publish report written to {report_path}")
+
+                failed = [r.hyper_filepath for r in results if r.error is not None]
+                if failed:
+                    raise RuntimeError(
+                        f"{len(failed)} of {len(results)} publishes failed: {failed}"
+                    )
+
+    logger.info(f"Script finished: {args.script}")
+
+
+def publish_hyper(
+    tsc: TableauClient,
+    hyper_filepath: str,
+    project_luid: str,
+    mode: str,
+    resumable: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    skip_unchanged: bool = True,
+    fingerprint_method: str = CONTENT,
+) -> bool:
+    """
+    Publish one Hyper file with a signed-in Tableau client.
+
+    In Overwrite mode, a fingerprint of the Hyper content is stored as a tag
+    on the datasource; when the datasource already holds the same content,
+    the upload is skipped. Any other publish to an existing datasource
+    removes the tag, as the datasource then holds content it does not
+    describe.
+
+    Args:
+        tsc: Signed-in Tableau client.
+        hyper_filepath: Path to the Hyper file to publish.
+        project_luid: Target Tableau project LUID.
+        mode: Publishing mode (CreateNew, Append or Overwrite).
+        resumable: Upload through a resumable, chunked upload session.
+        chunk_size: Size of each uploaded chunk, in bytes.
+        skip_unchanged: Skip Overwrite publishes of unchanged content.
+        fingerprint_method: "content" (schema, row count and row checksums
+            computed by Hyper) or "file" (hash of the file bytes).
+
+    Returns:
+        True if the file was uploaded, False if the publish was skipped.
+    """
+    name = Path(hyper_filepath).stem
+
+    # Appending identical content still adds rows, so only overwrites
+    # can be skipped
+    fingerprint = None
+    existing = tsc.find_datasource(name, project_luid)
+    if skip_unchanged and mode.lower() == "overwrite":
+        with track_stage("fingerprint", datasource=name):
+            fingerprint = hyper_fingerprint(
+                Path(hyper_filepath), method=fingerprint_method
+            )
+
+        if existing is not None and (
+            tsc.datasource_fingerprint(existing) == fingerprint
+        ):
+            with track_stage("publish", datasource=name) as stage:
+                stage.skip()
+            logger.info(f"Skipping publish of {name}: content unchanged")
+            return False
+
+    with track_stage("publish", datasource=name) as stage:
+        if resumable:
+            published = tsc.publish_datasource_resumable(
+                filepath=hyper_filepath,
+                project_luid=project_luid,
+                mode=mode,
+                chunk_size=chunk_size,
+            )
+        else:
+            published = tsc.publish_datasources(
                 server=tsc.server,
                 filepath=hyper_filepath,
                 project_luid=project_luid,
                 mode=mode,
             )
+        stage.add(bytes_read=Path(hyper_filepath).stat().st_size)
 
-    logger.info(f"Script finished: {args.script}")
+    if fingerprint is not None:
+        # An overwrite keeps the datasource (and its tags) of the lookup
+        tsc.set_datasource_fingerprint(existing or published, fingerprint)
+    elif existing is not None:
+        # Only the fingerprint of an overwrite describes the whole content:
+        # after an append, publishing the same file again must not be skipped
+        tsc.clear_datasource_fingerprint(existing)
+
+    return True
+
+
+def publish_delta(
+    tsc: TableauClient,
+    hyper_filepath: str,
+    project_luid: str,
+    delta_mode: str = DELTA_APPEND,
+    key_columns: Sequence[str] = (),
+    resumable: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> bool:
+    """
+    Publish only the rows changed by the last incremental run of an extract.
+
+    The delta file written next to the extract (see delta_path) holds the
+    rows applied by the last run. Its size, and the server-side work, scale
+    with the change set instead of the full table. The delta file is
+    removed once published, so that it is never applied twice. The whole
+    extract is published in Overwrite mode instead when there is no delta,
+    when the datasource does not exist yet, or when an earlier delta was
+    never published (see full_publish_marker).
+
+    Args:
+        tsc: Signed-in Tableau client.
+        hyper_filepath: Path to the full Hyper file of the extract.
+        project_luid: Target Tableau project LUID.
+        delta_mode: "append" to publish the delta in Append mode, or
+            "update" to apply it with "update hyper data" actions.
+        key_columns: Columns identifying a row, to upsert on in "update"
+            mode. Without key columns, the rows are inserted. Deltas of
+            upsert extracts need them, and cannot be appended.
+        resumable: Upload through a resumable, chunked upload session.
+        chunk_size: Size of each uploaded chunk, in bytes.
+
+    Returns:
+        True if data was uploaded, False if the delta was empty.
+
+    Raises:
+        ValueError: If the delta mode is unknown, or if key columns are
+            given in "append" mode (appending the new versions of existing
+            rows would duplicate them).
+    """
+    if delta_mode not in DELTA_MODES:
+        raise ValueError(f"Unsupported delta mode: {delta_mode}")
+    if delta_mode == DELTA_APPEND and key_columns:
+        raise ValueError(
+            "Upserted deltas cannot be appended, use the 'update' delta mode"
+        )
+
+    name = Path(hyper_filepath).stem
+    delta_file = delta_path(Path(hyper_filepath))
+    marker = full_publish_marker(Path(hyper_filepath))
+    existing = tsc.find_datasource(name, project_luid)
+    if existing is None or marker.exists() or not delta_file.exists():
+        logger.info(f"No delta to apply to {name}, publishing the full extract")
+        uploaded = publish_hyper(
+            tsc,
+            hyper_filepath=hyper_filepath,
+            project_luid=project_luid,
+            mode="Overwrite",
+            resumable=resumable,
+            chunk_size=chunk_size,
+        )
+        # The full extract includes the rows of any pending delta
+        delta_file.unlink(missing_ok=True)
+        marker.unlink(missing_ok=True)
+        return uploaded
+
+    table_name = TableName(DEFAULT_SCHEMA, DEFAULT_TABLE)
+    with HyperEngine().connect(delta_file, create_mode=CreateMode.NONE) as connection:
+        rows = connection.execute_scalar_query(f"SELECT COUNT(*) FROM {table_name}")
+
+    with track_stage("publish", datasource=name, mode=delta_mode) as stage:
+        if rows == 0:
+            stage.skip()
+            logger.info(f"Skipping publish of {name}: no changed rows")
+            delta_file.unlink()
+            return False
+
+        if delta_mode == DELTA_APPEND and resumable:
+            tsc.publish_datasource_resumable(
+                filepath=delta_file,
+                project_luid=project_luid,
+                mode="Append",
+                chunk_size=chunk_size,
+            )
+        elif delta_mode == DELTA_APPEND:
+            tsc.publish_datasources(
+                server=tsc.server,
+                filepath=str(delta_file),
+                project_luid=project_luid,
+                mode="Append",
+            )
+        else:
+            # The same delta file always gets the same request id, so the
+            # server applies it once even if this call is retried
+            tsc.update_hyper_data(
+                existing.id,
+                payload=delta_file,
+                actions=hyper_update_actions(table_name, key_columns),
+                request_id=f"{existing.id}-{hyper_fingerprint(delta_file, FILE)}",
+                chunk_size=chunk_size,
+            )
+        stage.add(rows=rows, bytes_read=delta_file.stat().st_size)
+
+    # The fingerprint described the content before the delta
+    tsc.clear_datasource_fingerprint(existing)
+    delta_file.unlink()
+    logger.info(f"Published {rows} changed rows of {name} ({delta_mode})")
+    return True
+
+
+def hyper_update_actions(
+    table_name: TableName, key_columns: Sequence[str] = ()
+) -> List[Dict[str, Any]]:
+    """Build the "update hyper data" actions applying a delta table.
+
+    The delta table has the same schema and name in the payload file as
+    the target table in the datasource.
+
+    Args:
+        table_name: Table updated by the delta.
+        key_columns: Columns identifying a row. Rows are upserted on them,
+            or inserted when no key column is given.
+
+    Returns:
+        Action batch of the update request.
+    """
+    tables = {
+        "target-schema": table_name.schema_name.name.unescaped,
+        "target-table": table_name.name.unescaped,
+        "source-schema": table_name.schema_name.name.unescaped,
+        "source-table": table_name.name.unescaped,
+    }
+    if not key_columns:
+        return [{"action": "insert", **tables}]
+
+    conditions = [
+        {"op": "eq", "target-col": key, "source-col": key} for key in key_columns
+    ]
+    condition = (
+        conditions[0] if len(conditions) == 1 else {"op": "and", "args": conditions}
+    )
+    return [{"action": "upsert", **tables, "condition": condition}]
+
+
+def publish_many(
+    tsc: TableauClient,
+    requests: Sequence[PublishRequest],
+    max_workers: int = 8,
+    initial_concurrency: int = 2,
+    max_retries: int = 5,
+    retry_backoff: float = 2.0,
+    **options: Any,
+) -> List[PublishResult]:
+    """
+    Publish several Hyper files concurrently over one signed-in session.
+
+    The number of publishes running at the same time adapts to the server:
+    it starts at initial_concurrency, grows by one after each window of
+    successful publishes up to max_workers, and is halved whenever the
+    server throttles a request (HTTP 429 or 503). Throttled publishes are
+    retried after an exponential backoff with full jitter; resumable
+    uploads resume from their last committed chunk.
+
+    Args:
+        tsc: Signed-in Tableau client.
+        requests: Files to publish, with their target project and mode.
+        max_workers: Maximum number of concurrent publishes.
+        initial_concurrency: Number of concurrent publishes to start with.
+        max_retries: Retries per file after a throttled request.
+        retry_backoff: Upper bound (seconds) of the first jittered delay,
+            doubled after each further throttled attempt.
+        **options: Other publish_hyper arguments (resumable, chunk_size,
+            skip_unchanged, ...).
+
+    Returns:
+        One result per request, in request order, with its latency. Failed
+        publishes are reported with their error instead of raising.
+    """
+    limiter = AdaptiveLimiter(
+        initial=min(initial_concurrency, max_workers), maximum=max_workers
+    )
+    luid_index = LuidIndex(tsc)
+
+    def publish(request: PublishRequest) -> PublishResult:
+        start = time.perf_counter()
+        try:
+            uploaded = publish_with_backoff(
+                tsc,
+                limiter,
+                hyper_filepath=request.hyper_filepath,
+                project_luid=luid_index.project_luid(request.project),
+                mode=request.mode,
+                max_retries=max_retries,
+                retry_backoff=retry_backoff,
+                **options,
+            )
+        except Exception as exc:
+            logger.error("Publish of %s failed: %s", request.hyper_filepath, exc)
+            return PublishResult(
+                hyper_filepath=request.hyper_filepath,
+                seconds=round(time.perf_counter() - start, 3),
+                error=str(exc).strip(),
+            )
+        return PublishResult(
+            hyper_filepath=request.hyper_filepath,
+            uploaded=uploaded,
+            seconds=round(time.perf_counter() - start, 3),
+        )
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="tableau-publish"
+    ) as pool:
+        results = list(pool.map(publish, requests))
+
+    for result in results:
+        logger.info(
+            "%s: %s in %.2fs",
+            Path(result.hyper_filepath).name,
+            "failed" if result.error else "uploaded" if result.uploaded else "skipped",
+            result.seconds,
+        )
+    return results
+
+
+def publish_with_backoff(
+    tsc: TableauClient,
+    limiter: AdaptiveLimiter,
+    max_retries: int = 5,
+    retry_backoff: float = 2.0,
+    publish_fn: Callable[..., bool] = publish_hyper,
+    **publish_args: Any,
+) -> bool:
+    """Run a publish within a concurrency limiter, retrying throttling.
+
+    A throttled attempt (HTTP 429 or 503) lowers the limiter and is retried
+    after a jittered exponential backoff; other errors are raised at once.
+
+    Args:
+        tsc: Signed-in Tableau client.
+        limiter: Limiter shared by the concurrent publishes.
+        max_retries: Retries after a throttled attempt.
+        retry_backoff: Upper bound (seconds) of the first jittered delay.
+        publish_fn: Publish function (publish_hyper or publish_delta).
+        **publish_args: Arguments of publish_fn.
+
+    Returns:
+        True if the file was uploaded, False if the publish was skipped.
+    """
+    attempt = 0
+    while True:
+        try:
+            with limiter.slot():
+                uploaded = publish_fn(tsc, **publish_args)
+        except Exception as exc:
+            if not is_throttling_error(exc):
+                raise
+            limiter.on_throttle()
+            if attempt == max_retries:
+                raise
+
+            delay = backoff_delay(attempt, retry_backoff, MAX_RETRY_BACKOFF)
+            logger.warning(
+                "Publish of %s throttled (attempt %d/%d), retrying in %.1fs",
+                publish_args["hyper_filepath"],
+                attempt + 1,
+                max_retries + 1,
+                delay,
+            )
+            time.sleep(delay)
+            attempt += 1
+        else:
+            limiter.on_success()
+            return uploaded
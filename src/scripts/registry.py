@@ -0,0 +1,88 @@
+"""Registry of the scripts runnable from the CLI.
+
+Scripts are referenced as "module:function" strings and imported only when
+selected, so the CLI does not pay for the heavy dependencies (pyarrow,
+tableauhyperapi, databricks-sql-connector, ...) of the scripts it does not
+run.
+
+Besides the built-in scripts, installed packages can add scripts through the
+"tableau.scripts" entry point group, e.g. with Poetry:
+
+    [tool.poetry.plugins."tableau.scripts"]
+    refresh_sales = "sales_jobs.refresh:main"
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import importlib
+import logging
+from importlib import metadata
+from typing import Callable, Dict
+
+from src.wrapper.config import ConfigWrapper
+
+logger = logging.getLogger(__name__)
+
+ScriptFn = Callable[[ConfigWrapper, argparse.Namespace], None]
+
+ENTRY_POINT_GROUP = "tableau.scripts"
+
+BUILTIN_SCRIPTS: Dict[str, str] = {
+    "generate_hyper_from_csv": "src.scripts.hyper_api.generate_hyper_from_csv:main",
+    "generate_hyper_with_databricks": (
+        "src.scripts.hyper_api.generate_hyper_with_databricks:main"
+    ),
+    "publish_hyper": "src.scripts.hyper_api.publish_hyper:main",
+    "run_manifest": "src.scripts.batch.run_manifest:main",
+    "run_benchmarks": "src.scripts.benchmark.run_benchmarks:main",
+    "benchmark_startup": "src.scripts.benchmark.startup:main",
+    "check_publish": "src.scripts.benchmark.publish_checks:main",
+}
+
+
+def available_scripts() -> Dict[str, str]:
+    """List the runnable scripts without importing them.
+
+    Returns:
+        "module:function" target of each script, keyed by script name.
+        Built-in scripts cannot be replaced by entry points.
+    """
+    return dict(_discover_scripts())
+
+
+@functools.lru_cache(maxsize=None)
+def _discover_scripts() -> Dict[str, str]:
+    scripts = dict(BUILTIN_SCRIPTS)
+    for entry_point in metadata.entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in scripts:
+            logger.warning(
+                "Ignoring entry point %s (%s): a script with this name exists",
+                entry_point.name,
+                entry_point.value,
+            )
+            continue
+        scripts[entry_point.name] = entry_point.value
+    return scripts
+
+
+def load_script(name: str) -> ScriptFn:
+    """Import a script and return its main function.
+
+    Args:
+        name: Script name, as listed by available_scripts().
+
+    Returns:
+        Script main function, called with the config and CLI arguments.
+
+    Raises:
+        ValueError: If no script has this name.
+    """
+    scripts = available_scripts()
+    if name not in scripts:
+        raise ValueError(f"Unknown script: {name}")
+
+    module_name, _, attribute = scripts[name].partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or "main")
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Mapping, Sequence, Union
+
+from tableauhyperapi import Connection, Name, SchemaName, TableName, TypeTag
+
+from src.utils.hyper_schema import MAX_NUMERIC_PRECISION
+from src.utils.metrics import track_stage
+from src.utils.multi_table import DEFAULT_SCHEMA, DEFAULT_TABLE
+
+logger = logging.getLogger(__name__)
+
+# Companion files are written next to the extract, in this subdirectory
+AGGREGATE_DIR = "aggregates"
+
+# Temporary table holding every grain, and its GROUPING() bitmask column
+_SCAN_TABLE = TableName("aggregate_scan")
+_GROUPING_COLUMN = Name("__grouping")
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """Rollup of the detail table at a coarser grain.
+
+    Attributes:
+        name: Name of the aggregate: table name in the Extract schema, or
+            suffix of the companion file name (see aggregate_path).
+        group_by: Columns of the grain: detail column names, or SQL
+            expressions over the detail columns keyed by output column,
+            e.g. {"order_month": "DATE_TRUNC('month', order_date)"}.
+            Empty computes grand totals.
+        measures: SQL aggregate expressions keyed by output column, e.g.
+            {"revenue": "SUM(amount)", "orders": "COUNT(*)"}.
+        companion: Write the aggregate as the Extract.Extract table of its
+            own .hyper file, publishable as a separate datasource, instead
+            of a table of the extract.
+    """
+
+    name: str
+    group_by: Union[Sequence[str], Mapping[str, str]] = field(default_factory=tuple)
+    measures: Mapping[str, str] = field(default_factory=dict)
+    companion: bool = True
+
+    def __post_init__(self) -> None:
+        if not self.measures:
+            raise ValueError(f"Aggregate {self.name} needs at least one measure")
+        overlap = sorted(set(self.dimensions) & set(self.measures))
+        if overlap:
+            raise ValueError(
+                f"Aggregate {self.name} uses names as dimensions and measures: "
+                f"{overlap}"
+            )
+
+    @property
+    def dimensions(self) -> Dict[str, str]:
+        """SQL expression of each grain column, keyed by output column."""
+        if isinstance(self.group_by, Mapping):
+            return dict(self.group_by)
+        return {column: str(Name(column)) for column in self.group_by}
+
+
+def aggregate_path(hyper_path: Path, name: str) -> Path:
+    """Path of the companion file of an aggregate.
+
+    Example:
+        temp/sales/hyper_file/sales.hyper, "daily"
+        -> temp/sales/hyper_file/aggregates/sales_daily.hyper
+    """
+    return hyper_path.parent / AGGREGATE_DIR / f"{hyper_path.stem}_{name}.hyper"
+
+
+def validate_aggregate_names(
+    aggregates: Mapping[str, Sequence[Aggregate]], tables: Sequence[str]
+) -> None:
+    """Check the aggregates of a multi-table extract, keyed by table.
+
+    Raises:
+        ValueError: If aggregates are given for unknown tables, or if two
+            aggregates (or an aggregate and a table) share a name.
+    """
+    unknown = sorted(set(aggregates) - set(tables))
+    if unknown:
+        raise ValueError(f"Aggregates given for unknown tables: {unknown}")
+    names = [a.name for table in aggregates.values() for a in table]
+    clashes = sorted({n for n in names if names.count(n) > 1 or n in tables})
+    if clashes:
+        raise ValueError(f"Aggregate names must be unique: {clashes}")
+
+
+def build_aggregates(
+    connection: Connection,
+    table_name: TableName,
+    aggregates: Sequence[Aggregate],
+    hyper_path: Path,
+) -> Dict[str, int]:
+    """Build aggregate tables from a loaded table in a single scan.
+
+    Every grain is computed by one GROUP BY GROUPING SETS query over the
+    table, into a temporary table where GROUPING() tells the grains apart.
+    Each aggregate then copies its (small) grain from there into a table of
+    the extract, or into its companion file. Aggregates are rebuilt from
+    the whole table on every run, including incremental ones. Measures
+    wider than the 18-digit numerics of an extract are stored as DOUBLE
+    PRECISION; cast them in the expression to keep exact decimals.
+
+    Args:
+        connection: Open connection to the extract database.
+        table_name: Loaded detail table.
+        aggregates: Aggregates to build.
+        hyper_path: Path of the extract, next to which companion files are
+            written.
+
+    Returns:
+        Number of rows of each aggregate, keyed by aggregate name.
+
+    Raises:
+        ValueError: If aggregates share a name or clash with the detail
+            table.
+    """
+    if not aggregates:
+        return {}
+    names = [aggregate.name for aggregate in aggregates]
+    clashes = sorted({n for n in names if names.count(n) > 1 or n == table_name.name})
+    if clashes:
+        raise ValueError(f"Aggregate names must be unique: {clashes}")
+    if not connection.catalog.has_table(table_name):
+        logger.warning("No table %s to aggregate", table_name)
+        return {}
+
+    # Every distinct expression is computed once by the single scan, into
+    # a column of its own (__d0, ... for dimensions, __m0, ... for measures).
+    # Dimensions are computed below the GROUP BY, so that GROUPING() tells
+    # apart columns even when their expressions are equivalent
+    dimensions: List[str] = []
+    measures: List[str] = []
+    for aggregate in aggregates:
+        dimensions.extend(
+            e for e in aggregate.dimensions.values() if e not in dimensions
+        )
+        measures.extend(e for e in aggregate.measures.values() if e not in measures)
+
+    grouping_sets: List[List[str]] = []
+    for aggregate in aggregates:
+        grain = [d for d in dimensions if d in aggregate.dimensions.values()]
+        if grain not in grouping_sets:
+            grouping_sets.append(grain)
+
+    dimension_columns = {e: str(Name(f"__d{i}")) for i, e in enumerate(dimensions)}
+    measure_columns = {e: str(Name(f"__m{i}")) for i, e in enumerate(measures)}
+    detail_sql = ", ".join(
+        ["*"] + [f"{e} AS {column}" for e, column in dimension_columns.items()]
+    )
+    select_sql = ", ".join(
+        [*dimension_columns.values()]
+        + [f"{e} AS {column}" for e, column in measure_columns.items()]
+    )
+    grouping_sql = (
+        f"GROUPING({', '.join(dimension_columns.values())})" if dimensions else "0"
+    )
+    sets_sql = ", ".join(
+        f"({', '.join(dimension_columns[d] for d in grain)})" for grain in grouping_sets
+    )
+
+    rows: Dict[str, int] = {}
+    with track_stage("hyper_aggregate", table=str(table_name)) as stage:
+        connection.execute_command(
+            f"CREATE TEMPORARY TABLE {_SCAN_TABLE} AS "
+            f"SELECT {select_sql}, {grouping_sql} AS {_GROUPING_COLUMN} "
+            f"FROM (SELECT {detail_sql} FROM {table_name}) AS detail "
+            f"GROUP BY GROUPING SETS ({sets_sql})"
+        )
+        try:
+            stored = _stored_columns(connection)
+            for aggregate in aggregates:
+                # GROUPING() sets the bit of each dimension left out of the
+                # grain, the first dimension being the most significant
+                grain = aggregate.dimensions.values()
+                mask = sum(
+                    1 << (len(dimensions) - 1 - index)
+                    for index, dimension in enumerate(dimensions)
+                    if dimension not in grain
+                )
+                columns_sql = ", ".join(
+                    [
+                        f"{stored[dimension_columns[e]]} AS {Name(column)}"
+                        for column, e in aggregate.dimensions.items()
+                    ]
+                    + [
+                        f"{stored[measure_columns[e]]} AS {Name(column)}"
+                        for column, e in aggregate.measures.items()
+                    ]
+                )
+                grain_sql = (
+                    f"SELECT {columns_sql} FROM {_SCAN_TABLE} "
+                    f"WHERE {_GROUPING_COLUMN} = {mask}"
+                )
+                if aggregate.companion:
+                    rows[aggregate.name] = _write_companion(
+                        connection,
+                        grain_sql,
+                        aggregate_path(hyper_path, aggregate.name),
+                    )
+                else:
+                    target = TableName(table_name.schema_name, aggregate.name)
+                    connection.execute_command(f"DROP TABLE IF EXISTS {target}")
+                    connection.execute_command(f"CREATE TABLE {target} AS {grain_sql}")
+                    rows[aggregate.name] = connection.execute_scalar_query(
+                        f"SELECT COUNT(*) FROM {target}"
+                    )
+                logger.info(
+                    "Built aggregate %s (%d rows)", aggregate.name, rows[aggregate.name]
+                )
+        finally:
+            connection.execute_command(f"DROP TABLE IF EXISTS {_SCAN_TABLE}")
+        stage.add(rows=sum(rows.values()))
+
+    return rows
+
+
+def _stored_columns(connection: Connection) -> Dict[str, str]:
+    """Select expression of each scan column (keyed by quoted name), as
+    stored in an extract.
+
+    Extract databases hold numerics of at most 18 digits: wider results
+    (e.g. AVG of integers) are stored as DOUBLE PRECISION.
+    """
+    with connection.execute_query(f"SELECT * FROM {_SCAN_TABLE} LIMIT 0") as result:
+        columns = list(result.schema.columns)
+
+    stored: Dict[str, str] = {}
+    for column in columns:
+        expression = str(column.name)
+        if (
+            column.type.tag == TypeTag.NUMERIC
+            and column.type.precision > MAX_NUMERIC_PRECISION
+        ):
+            expression = f"CAST({expression} AS DOUBLE PRECISION)"
+        stored[str(column.name)] = expression
+    return stored
+
+
+def _write_companion(connection: Connection, grain_sql: str, path: Path) -> int:
+    """Write the rows of a query to the Extract.Extract table of a new file."""
+    alias = "aggregate_export"
+    target = TableName(SchemaName(alias, DEFAULT_SCHEMA), DEFAULT_TABLE)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    connection.catalog.create_database(path)
+    connection.catalog.attach_database(path, alias=alias)
+    try:
+        connection.catalog.create_schema_if_not_exists(target.schema_name)
+        connection.execute_command(f"CREATE TABLE {target} AS {grain_sql}")
+        return connection.execute_scalar_query(f"SELECT COUNT(*) FROM {target}")
+    finally:
+        connection.catalog.detach_database(alias)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.utils.metrics import Stage
+from src.utils.partitioning import Partition, partition_query
+from src.utils.pipeline import prefetch
+from src.utils.staging import ensure_free_space
+from src.wrapper.databricks_wrapper import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DatabricksClient,
+    is_transient_error,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def extract_to_parquet(
+    client: DatabricksClient,
+    query: str,
+    parquet_dir: Path,
+    prefix: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    min_free_bytes: int = 0,
+) -> List[Path]:
+    """Stream a query result into Parquet shards, one shard per Arrow batch.
+
+    Args:
+        client: Open Databricks client.
+        query: SQL query to execute.
+        parquet_dir: Directory where shards are written.
+        prefix: File name prefix of the shards.
+        batch_size: Maximum number of rows per shard.
+        max_batch_bytes: Memory budget (in bytes) for a single batch.
+        min_free_bytes: Free space to leave on the file system of
+            parquet_dir; the extraction fails before a shard would eat
+            into it (the in-memory batch size bounds the shard size).
+
+    Returns:
+        Paths of the written shards, in fetch order.
+    """
+    return list(
+        iter_parquet_shards(
+            client,
+            query,
+            parquet_dir,
+            prefix,
+            batch_size=batch_size,
+            max_batch_bytes=max_batch_bytes,
+            min_free_bytes=min_free_bytes,
+        )
+    )
+
+
+def iter_parquet_shards(
+    client: DatabricksClient,
+    query: str,
+    parquet_dir: Path,
+    prefix: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    min_free_bytes: int = 0,
+    prefetch_batches: int = 0,
+) -> Iterator[Path]:
+    """Stream a query result into Parquet shards, yielding each as written.
+
+    Unlike extract_to_parquet, the caller can load a shard while the next
+    ones are being fetched and written.
+
+    Args:
+        client: Open Databricks client.
+        query: SQL query to execute.
+        parquet_dir: Directory where shards are written.
+        prefix: File name prefix of the shards.
+        batch_size: Maximum number of rows per shard.
+        max_batch_bytes: Memory budget (in bytes) for a single batch.
+        min_free_bytes: Free space to leave on the file system of
+            parquet_dir (see extract_to_parquet).
+        prefetch_batches: Number of batches fetched ahead by a background
+            thread while a shard is being written. 0 fetches each batch
+            once the previous shard is written.
+
+    Yields:
+        Paths of the written shards, in fetch order.
+    """
+    fetch = Stage("fetch", extract=prefix)
+    parquet_write = Stage("parquet_write", extract=prefix)
+    batches = _timed_batches(
+        client.fetch_arrow_batches(
+            query, batch_size=batch_size, max_batch_bytes=max_batch_bytes
+        ),
+        fetch,
+    )
+    if prefetch_batches:
+        batches = prefetch(batches, prefetch_batches, name="databricks-fetch")
+
+    shard_count = 0
+    try:
+        for batch in batches:
+            with parquet_write.timed():
+                ensure_free_space(parquet_dir, batch.nbytes, min_free_bytes)
+                shard_count += 1
+                shard_path = parquet_dir / f"{prefix}-{shard_count:05d}.parquet"
+                pq.write_table(batch, shard_path)
+            parquet_write.add(
+                rows=batch.num_rows, bytes_written=shard_path.stat().st_size
+            )
+            yield shard_path
+    finally:
+        batches.close()
+        fetch.record()
+        parquet_write.record()
+
+
+def _timed_batches(batches: Iterator[pa.Table], fetch: Stage) -> Iterator[pa.Table]:
+    """Time the fetch of each batch, in the thread consuming the batches."""
+    while True:
+        with fetch.timed():
+            batch = next(batches, None)
+        if batch is None:
+            return
+        fetch.add(rows=batch.num_rows, bytes_read=batch.nbytes)
+        yield batch
+
+
+def extract_partitions_to_parquet(
+    query: str,
+    partitions: Sequence[Partition],
+    parquet_dir: Path,
+    prefix: str,
+    max_workers: int = 4,
+    max_retries: int = 2,
+    retry_backoff: float = 5.0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    client_factory: Callable[[], DatabricksClient] = DatabricksClient,
+    min_free_bytes: int = 0,
+) -> List[Path]:
+    """Extract a query partition by partition, concurrently.
+
+    Each partition runs on its own worker thread with its own Databricks
+    connection (connections are not shared between threads) and writes its
+    own Parquet shards. A partition failing on a transient error (see
+    is_transient_error) is retried on its own, with exponential backoff,
+    after removing the shards it had already written. Other errors fail
+    the partition at once.
+
+    Args:
+        query: Source SELECT statement.
+        partitions: Partitions covering the rows to extract.
+        parquet_dir: Directory where shards are written.
+        prefix: File name prefix of the shards.
+        max_workers: Number of partitions extracted concurrently.
+        max_retries: Number of retries per partition after the first
+            attempt, on transient errors.
+        retry_backoff: Delay (seconds) before the first retry, doubled after
+            each further failure.
+        batch_size: Maximum number of rows per shard.
+        max_batch_bytes: Memory budget (in bytes) for a single batch.
+        client_factory: Callable returning a new Databricks client.
+        min_free_bytes: Free space to leave on the file system of
+            parquet_dir (see extract_to_parquet).
+
+    Returns:
+        Paths of all shards, ordered by partition then by batch, so that the
+        Hyper load order does not depend on thread scheduling.
+
+    Raises:
+        RuntimeError: If at least one partition still fails after retries.
+    """
+
+    def run_partition(partition: Partition) -> List[Path]:
+        partition_prefix = f"{prefix}-{partition.name}"
+        attempt = 0
+        while True:
+            try:
+                client = client_factory()
+                try:
+                    return extract_to_parquet(
+                        client,
+                        partition_query(query, partition),
+                        parquet_dir,
+                        partition_prefix,
+                        batch_size=batch_size,
+                        max_batch_bytes=max_batch_bytes,
+                        min_free_bytes=min_free_bytes,
+                    )
+                finally:
+                    client.close()
+            except Exception as exc:
+                # Drop partial output so a retry starts from a clean slate
+                for stale in parquet_dir.glob(f"{partition_prefix}-*.parquet"):
+                    stale.unlink()
+
+                # Errors of the query or configuration would fail again
+                if attempt >= max_retries or not is_transient_error(exc):
+                    raise
+
+                delay = retry_backoff * 2**attempt
+                attempt += 1
+                logger.warning(
+                    "Partition %s failed (attempt %d/%d), retrying in %.1fs",
+                    partition.name,
+                    attempt,
+                    max_retries + 1,
+                    delay,
+                    exc_info=True,
+                )
+                time.sleep(delay)
+
+    shards_by_partition: Dict[str, List[Path]] = {}
+    failures: Dict[str, BaseException] = {}
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="databricks-extract"
+    ) as pool:
+        futures = {pool.submit(run_partition, p): p for p in partitions}
+        for future in as_completed(futures):
+            partition = futures[future]
+            try:
+                shards_by_partition[partition.name] = future.result()
+                logger.info(
+                    "Partition %s extracted into %d shards",
+                    partition.name,
+                    len(shards_by_partition[partition.name]),
+                )
+            except Exception as exc:
+                logger.error("Partition %s failed: %s", partition.name, exc)
+                failures[partition.name] = exc
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(partitions)} partitions failed: "
+            f"{sorted(failures)}"
+        ) from next(iter(failures.values()))
+
+    return [shard for p in partitions for shard in shards_by_partition[p.name]]
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict
+
+from tableauhyperapi import Connection, CreateMode, TableDefinition
+
+from src.wrapper.hyper_wrapper import HyperEngine
+
+logger = logging.getLogger(__name__)
+
+CONTENT = "content"
+FILE = "file"
+
+# Hex digits kept from the SHA-256 digest (128 bits), short enough for a tag.
+FINGERPRINT_LENGTH = 32
+
+# Bytes read at a time when hashing a whole file.
+_FILE_HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def hyper_fingerprint(hyper_path: Path, method: str = CONTENT) -> str:
+    """Compute a fingerprint of a Hyper file.
+
+    Methods:
+        - content: schema, row count and an order-independent checksum of
+          the rows of every table, computed by Hyper. Two builds of the same
+          data get the same fingerprint even though their files differ.
+        - file: SHA-256 of the file bytes, streamed. Cheaper, but only
+          matches when the very same file is published again.
+
+    Args:
+        hyper_path: Path to the .hyper file.
+        method: "content" or "file".
+
+    Returns:
+        Hex digest identifying the content.
+    """
+    if method == FILE:
+        digest = hashlib.sha256()
+        with open(hyper_path, "rb") as f:
+            while block := f.read(_FILE_HASH_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+    if method != CONTENT:
+        raise ValueError(f"Unsupported fingerprint method: {method}")
+
+    tables: Dict[str, Any] = {}
+    with HyperEngine().connect(hyper_path, create_mode=CreateMode.NONE) as connection:
+        for schema_name in connection.catalog.get_schema_names():
+            for table_name in connection.catalog.get_table_names(schema_name):
+                definition = connection.catalog.get_table_definition(table_name)
+                tables[str(table_name)] = _table_fingerprint(connection, definition)
+
+    payload = json.dumps(tables, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def _table_fingerprint(
+    connection: Connection, definition: TableDefinition
+) -> Dict[str, Any]:
+    # Each row is rendered as text (with separator and null markers that
+    # cannot appear in values), hashed with md5, and the first 64 bits of
+    # the hashes are summed as two 32-bit halves, so row order is ignored.
+    row_sql = " || chr(31) || ".join(
+        f"COALESCE(CAST({column.name} AS TEXT), chr(30))"
+        for column in definition.columns
+    )
+    row_count, checksum_high, checksum_low = connection.execute_list_query(
+        f"SELECT COUNT(*), SUM({_hex_to_bigint_sql('h', 1)}), "
+        f"SUM({_hex_to_bigint_sql('h', 9)}) "
+        f"FROM (SELECT md5({row_sql}) AS h FROM {definition.table_name}) AS r"
+    )[0]
+
+    return {
+        "columns": [
+            [str(c.name), str(c.type), str(c.nullability)] for c in definition.columns
+        ],
+        "rows": row_count,
+        "checksum": [checksum_high or 0, checksum_low or 0],
+    }
+
+
+def _hex_to_bigint_sql(expression: str, start: int) -> str:
+    """SQL converting 8 hex digits of a string, from position start, to BIGINT."""
+    return " + ".join(
+        f"CAST(strpos('0123456789abcdef', substr({expression}, {start + i}, 1)) - 1 "
+        f"AS BIGINT) * {16 ** (7 - i)}"
+        for i in range(8)
+    )
@@ -0,0 +1,590 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tableauhyperapi import (
+    PERMANENT,
+    Connection,
+    CreateMode,
+    Name,
+    Persistence,
+    TableDefinition,
+    TableName,
+    escape_string_literal,
+)
+
+from src.utils.hyper_schema import (
+    SchemaOverrides,
+    arrow_to_sql_type,
+    sql_type_name,
+    table_definition_from_arrow,
+)
+from src.utils.metrics import Stage, track_stage
+from src.utils.transforms import (
+    Transform,
+    compile_transform,
+    transformed_table_definition,
+)
+from src.wrapper.hyper_wrapper import HyperEngine
+
+logger = logging.getLogger(__name__)
+
+# Memory-backed filesystem used to hand Arrow batches over to Hyper.
+SHARED_MEMORY_DIR = Path("/dev/shm")
+
+
+def copy_csv(
+    connection: Connection,
+    table_name: TableName,
+    csv_path: Path,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    header: bool = True,
+) -> int:
+    """Load a CSV file into an existing Hyper table with Hyper's CSV reader.
+
+    The file is parsed by the Hyper process itself, so no data goes through
+    Python and memory usage is independent of the file size.
+
+    Args:
+        connection: Open connection to the target Hyper database.
+        table_name: Existing table whose columns match the CSV columns.
+        csv_path: Path to the CSV file.
+        delimiter: Field delimiter.
+        encoding: File encoding.
+        header: Whether the first line of the file is a header row.
+
+    Returns:
+        Number of rows loaded.
+    """
+    logger.info("Starting CSV ingestion: %s", Path(csv_path).name)
+
+    with track_stage("hyper_insert", table=str(table_name)) as stage:
+        row_count = connection.execute_command(
+            f"COPY {table_name} FROM "
+            f"{escape_string_literal(str(Path(csv_path).resolve()))} "
+            f"WITH (FORMAT csv, HEADER {str(header).lower()}, "
+            f"DELIMITER {escape_string_literal(delimiter)}, "
+            f"ENCODING {escape_string_literal(encoding)})"
+        )
+        stage.add(rows=row_count, bytes_read=Path(csv_path).stat().st_size)
+
+    logger.info("Loaded %d rows from %s", row_count, Path(csv_path).name)
+    return row_count
+
+
+def external_parquet_sql(parquet_files: Sequence[Path]) -> str:
+    """Build an external() table function call reading several Parquet files.
+
+    Args:
+        parquet_files: Parquet files sharing the same schema.
+
+    Returns:
+        SQL fragment usable in a FROM clause.
+    """
+    files_sql = ", ".join(
+        escape_string_literal(str(Path(p).resolve())) for p in parquet_files
+    )
+    return f"external(ARRAY[{files_sql}], FORMAT => 'parquet')"
+
+
+def load_parquet_files(
+    connection: Connection,
+    table_name: TableName,
+    parquet_files: Sequence[Path],
+    overrides: Optional[SchemaOverrides] = None,
+    transform: Optional[Transform] = None,
+) -> int:
+    """Load Parquet shards into a Hyper table with a single statement.
+
+    The table is created once, if it does not exist yet, from the schema of
+    the first shard. All shards are then read by one INSERT over an
+    external() array, which lets Hyper parallelize the scan internally.
+    Columns are matched by name, so a shard that does not fit the existing
+    table fails with Hyper's own error instead of being silently misloaded.
+    A transform is compiled into the SELECT, so Hyper filters and reshapes
+    the rows in the same pass; the table then gets the transformed columns.
+
+    Args:
+        connection: Open connection to the target Hyper database.
+        table_name: Fully qualified target table name.
+        parquet_files: Parquet shards sharing the same schema.
+        overrides: Optional per-column type and nullability overrides,
+            used when the table has to be created.
+        transform: Optional transform applied to the rows while loading.
+
+    Returns:
+        Number of rows loaded.
+    """
+    if not parquet_files:
+        logger.warning("No Parquet files to load into %s", table_name)
+        return 0
+
+    parquet_schema = pq.read_schema(parquet_files[0])
+    _create_table_if_missing(
+        connection, table_name, parquet_schema, overrides, transform, parquet_files[0]
+    )
+
+    source_sql = external_parquet_sql(parquet_files)
+    if transform is None:
+        columns = parquet_schema.names
+        select_sql = f"SELECT {_columns_sql(columns)} FROM {source_sql}"
+    else:
+        compiled = compile_transform(transform, source_sql, parquet_schema.names)
+        columns, select_sql = compiled.columns, compiled.sql
+
+    logger.info(
+        "Starting parquet ingestion: %d files into %s", len(parquet_files), table_name
+    )
+    with track_stage("hyper_insert", table=str(table_name)) as stage:
+        row_count = connection.execute_command(
+            f"INSERT INTO {table_name} ({_columns_sql(columns)}) {select_sql}"
+        )
+        stage.add(
+            rows=row_count,
+            bytes_read=sum(Path(path).stat().st_size for path in parquet_files),
+        )
+
+    logger.info("Loaded %d rows into %s", row_count, table_name)
+    return row_count
+
+
+def load_parquet_stream(
+    connection: Connection,
+    table_name: TableName,
+    parquet_files: Iterable[Path],
+    overrides: Optional[SchemaOverrides] = None,
+    transform: Optional[Transform] = None,
+) -> Tuple[int, List[Path]]:
+    """Load Parquet shards into a Hyper table as they are produced.
+
+    Each shard is inserted as soon as parquet_files yields it, so the load
+    overlaps with whatever produces the shards (e.g. a fetch running in a
+    background thread, see prefetch). The table is created from the first
+    shard if it does not exist yet, then all shards are inserted in a
+    single transaction, so a failed run leaves the table unchanged.
+
+    Args:
+        connection: Open connection to the target Hyper database.
+        table_name: Fully qualified target table name.
+        parquet_files: Parquet shards sharing the same schema.
+        overrides: Optional per-column type and nullability overrides,
+            used when the table has to be created.
+        transform: Optional transform applied to each shard while loading.
+            Deduplication needs all the rows at once and is not supported.
+
+    Returns:
+        Tuple of (rows loaded, shards loaded).
+    """
+    if transform is not None and transform.dedup_on:
+        raise ValueError("Deduplicating transforms cannot load shards one by one")
+
+    loaded: List[Path] = []
+    row_count = 0
+    in_transaction = False
+
+    # Only the inserts are timed: waiting for the next shard is not load time
+    stage = Stage("hyper_insert", table=str(table_name))
+    try:
+        for parquet_file in parquet_files:
+            parquet_schema = pq.read_schema(parquet_file)
+            if not loaded:
+                # The table is created before the transaction (Hyper does
+                # not mix DDL and DML)
+                _create_table_if_missing(
+                    connection,
+                    table_name,
+                    parquet_schema,
+                    overrides,
+                    transform,
+                    parquet_file,
+                )
+                connection.execute_command("BEGIN TRANSACTION")
+                in_transaction = True
+
+            source_sql = external_parquet_sql([parquet_file])
+            if transform is None:
+                columns = parquet_schema.names
+                select_sql = f"SELECT {_columns_sql(columns)} FROM {source_sql}"
+            else:
+                compiled = compile_transform(
+                    transform, source_sql, parquet_schema.names
+                )
+                columns, select_sql = compiled.columns, compiled.sql
+
+            with stage.timed():
+                row_count += connection.execute_command(
+                    f"INSERT INTO {table_name} ({_columns_sql(columns)}) {select_sql}"
+                )
+            stage.add(bytes_read=Path(parquet_file).stat().st_size)
+            loaded.append(parquet_file)
+
+        if in_transaction:
+            with stage.timed():
+                connection.execute_command("COMMIT")
+            in_transaction = False
+    except BaseException:
+        stage.failed = True
+        if in_transaction:
+            connection.execute_command("ROLLBACK")
+        raise
+    finally:
+        stage.add(rows=row_count)
+        stage.record()
+
+    if not loaded:
+        logger.warning("No Parquet files to load into %s", table_name)
+    else:
+        logger.info(
+            "Loaded %d rows from %d Parquet files into %s",
+            row_count,
+            len(loaded),
+            table_name,
+        )
+    return row_count, loaded
+
+
+def load_parquet_files_sharded(
+    connection: Connection,
+    table_name: TableName,
+    parquet_files: Sequence[Path],
+    shard_count: int,
+    shard_dir: Path,
+    overrides: Optional[SchemaOverrides] = None,
+    transform: Optional[Transform] = None,
+) -> int:
+    """Load Parquet shards by building several Hyper files in parallel.
+
+    The shards are split into shard_count contiguous groups, each loaded
+    into its own temporary .hyper file on its own connection and thread.
+    The shard files are then attached to the target database and merged
+    with a single INSERT ... SELECT, and deleted. This keeps more cores busy
+    than one INSERT on one connection when there are many Parquet shards.
+    Shards hold the raw rows; a transform is applied by the merge, so that
+    filters and deduplication see all the rows at once.
+
+    Args:
+        connection: Open connection to the target Hyper database.
+        table_name: Fully qualified target table name.
+        parquet_files: Parquet shards sharing the same schema.
+        shard_count: Number of Hyper files built in parallel. With 1 (or a
+            single Parquet shard), this is load_parquet_files.
+        shard_dir: Directory for the temporary shard .hyper files.
+        overrides: Optional per-column type and nullability overrides,
+            used when the table has to be created.
+        transform: Optional transform applied to the rows while merging.
+
+    Returns:
+        Number of rows loaded.
+    """
+    if shard_count < 1:
+        raise ValueError(f"shard_count must be positive, got {shard_count}")
+    shard_count = min(shard_count, len(parquet_files))
+    if shard_count <= 1:
+        return load_parquet_files(
+            connection, table_name, parquet_files, overrides, transform
+        )
+
+    parquet_schema = pq.read_schema(parquet_files[0])
+    _create_table_if_missing(
+        connection, table_name, parquet_schema, overrides, transform, parquet_files[0]
+    )
+
+    # Contiguous groups keep the rows in shard order after the merge
+    group_size, remainder = divmod(len(parquet_files), shard_count)
+    groups: List[Sequence[Path]] = []
+    start = 0
+    for index in range(shard_count):
+        end = start + group_size + (1 if index < remainder else 0)
+        groups.append(parquet_files[start:end])
+        start = end
+
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shard_paths = [
+        shard_dir / f"shard-{uuid.uuid4().hex}.hyper" for _ in range(shard_count)
+    ]
+
+    def build_shard(shard_path: Path, group: Sequence[Path]) -> int:
+        with HyperEngine().connect(
+            shard_path, create_mode=CreateMode.CREATE_AND_REPLACE
+        ) as shard_connection:
+            # Without a transform, shards already have the target types
+            return load_parquet_files(
+                shard_connection,
+                table_name,
+                group,
+                overrides if transform is None else None,
+            )
+
+    logger.info(
+        "Building %d Hyper shards from %d Parquet files",
+        shard_count,
+        len(parquet_files),
+    )
+    aliases: List[str] = []
+    try:
+        with ThreadPoolExecutor(
+            max_workers=shard_count, thread_name_prefix="hyper-shard"
+        ) as pool:
+            list(pool.map(build_shard, shard_paths, groups))
+
+        # Once other databases are attached, the target has to be qualified
+        # with the name of its own database
+        target = table_name
+        if target.database_name is None:
+            target = TableName(
+                connection.execute_scalar_query("SELECT current_database()"),
+                table_name.schema_name,
+                table_name.name,
+            )
+
+        source_columns_sql = _columns_sql(parquet_schema.names)
+        with track_stage("hyper_merge", table=str(table_name)) as stage:
+            for index, shard_path in enumerate(shard_paths):
+                alias = f"shard_{index}"
+                connection.catalog.attach_database(shard_path, alias=alias)
+                aliases.append(alias)
+
+            union_sql = " UNION ALL ".join(
+                f"SELECT {source_columns_sql} FROM "
+                f"{TableName(alias, table_name.schema_name, table_name.name)}"
+                for alias in aliases
+            )
+            if transform is None:
+                columns, select_sql = parquet_schema.names, union_sql
+            else:
+                compiled = compile_transform(
+                    transform, f"({union_sql}) AS source", parquet_schema.names
+                )
+                columns, select_sql = compiled.columns, compiled.sql
+            row_count = connection.execute_command(
+                f"INSERT INTO {target} ({_columns_sql(columns)}) {select_sql}"
+            )
+            stage.add(
+                rows=row_count,
+                bytes_read=sum(path.stat().st_size for path in shard_paths),
+            )
+    finally:
+        for alias in aliases:
+            connection.catalog.detach_database(alias)
+        for shard_path in shard_paths:
+            shard_path.unlink(missing_ok=True)
+
+    logger.info(
+        "Merged %d Hyper shards (%d rows) into %s", shard_count, row_count, table_name
+    )
+    return row_count
+
+
+def _create_table_if_missing(
+    connection: Connection,
+    table_name: TableName,
+    schema: pa.Schema,
+    overrides: Optional[SchemaOverrides] = None,
+    transform: Optional[Transform] = None,
+    parquet_file: Optional[Path] = None,
+) -> None:
+    connection.catalog.create_schema_if_not_exists(table_name.schema_name)
+    if connection.catalog.has_table(table_name):
+        return
+
+    if transform is None:
+        definition = table_definition_from_arrow(schema, table_name, overrides)
+    else:
+        # The output types are the ones Hyper gives the transformed SELECT
+        compiled = compile_transform(
+            transform, external_parquet_sql([parquet_file]), schema.names
+        )
+        definition = transformed_table_definition(
+            connection, compiled, table_name, schema, overrides
+        )
+    connection.catalog.create_table(definition)
+    logger.info("Created Hyper table %s", table_name)
+
+
+def _columns_sql(columns: Sequence[str]) -> str:
+    return ", ".join(str(Name(column)) for column in columns)
+
+
+def spool_dir_for(
+    nbytes: int, spool_dir: Optional[Path] = None, allow_disk: bool = True
+) -> Path:
+    """Pick the directory where an Arrow batch is handed over to Hyper.
+
+    Shared memory (/dev/shm) is preferred, so batches never touch the disk;
+    the system temp directory is used, with a warning, when it is missing
+    or too small.
+
+    Args:
+        nbytes: Size of the batch to spool.
+        spool_dir: Explicit directory, used as is when given.
+        allow_disk: Fall back to the system temp directory. When False,
+            batches are only spooled in shared memory.
+
+    Returns:
+        The spool directory.
+
+    Raises:
+        RuntimeError: If shared memory cannot hold the batch and the
+            fallback is not allowed.
+    """
+    if spool_dir is not None:
+        return Path(spool_dir)
+    if SHARED_MEMORY_DIR.is_dir() and os.access(SHARED_MEMORY_DIR, os.W_OK):
+        # Keep headroom: the IPC stream is slightly larger than the batch
+        if shutil.disk_usage(SHARED_MEMORY_DIR).free > 2 * nbytes:
+            return SHARED_MEMORY_DIR
+
+    if not allow_disk:
+        raise RuntimeError(
+            f"Shared memory ({SHARED_MEMORY_DIR}) is missing or cannot hold a "
+            f"{nbytes}-byte Arrow batch, and spooling to disk is not allowed"
+        )
+    fallback = Path(tempfile.gettempdir())
+    logger.warning(
+        "Shared memory (%s) is missing or cannot hold a %d-byte Arrow batch, "
+        "spooling batches to %s on disk",
+        SHARED_MEMORY_DIR,
+        nbytes,
+        fallback,
+    )
+    return fallback
+
+
+def insert_arrow_batches(
+    connection: Connection,
+    table_name: TableName,
+    batches: Iterable[pa.Table],
+    overrides: Optional[SchemaOverrides] = None,
+    persistence: Persistence = PERMANENT,
+    spool_dir: Optional[Path] = None,
+    allow_disk_spool: bool = True,
+) -> int:
+    """Load Arrow batches into a Hyper table without staging Parquet files.
+
+    Hyper reads Arrow IPC streams with COPY but cannot read from a pipe, so
+    each batch is written as an IPC stream to a spool file (in shared memory
+    when available), copied into the table and deleted before the next
+    batch is written. Only one batch is spooled at a time and no data is
+    encoded to Parquet. All batches are loaded in a single transaction.
+    COPY requires the table types to match the Arrow types exactly; when
+    they differ (e.g. overridden types), batches are inserted through
+    external() instead, which casts them.
+
+    Args:
+        connection: Open connection to the target Hyper database.
+        table_name: Fully qualified target table name.
+        batches: Arrow tables sharing the same schema.
+        overrides: Optional per-column type and nullability overrides,
+            used when the table has to be created.
+        persistence: Persistence of the table if it has to be created.
+        spool_dir: Optional directory for the spool file.
+        allow_disk_spool: Spool to the system temp directory when shared
+            memory is missing or too small (see spool_dir_for).
+
+    Returns:
+        Number of rows loaded.
+    """
+    row_count = 0
+    spool_path: Optional[Path] = None
+    in_transaction = False
+
+    with track_stage("hyper_insert", table=str(table_name)) as stage:
+        try:
+            for batch in batches:
+                if spool_path is None:
+                    # The table is created from the first batch, before the
+                    # transaction (Hyper does not mix DDL and DML)
+                    if table_name.schema_name is not None:
+                        connection.catalog.create_schema_if_not_exists(
+                            table_name.schema_name
+                        )
+                    if not connection.catalog.has_table(table_name):
+                        definition = table_definition_from_arrow(
+                            batch.schema, table_name, overrides
+                        )
+                        connection.catalog.create_table(
+                            TableDefinition(
+                                table_name=table_name,
+                                columns=definition.columns,
+                                persistence=persistence,
+                            )
+                        )
+                        logger.info("Created Hyper table %s", table_name)
+
+                    needs_cast = _needs_cast(connection, table_name, batch.schema)
+                    spool_path = spool_dir_for(
+                        batch.nbytes, spool_dir, allow_disk=allow_disk_spool
+                    ) / (f"hyper-ingest-{uuid.uuid4().hex}.arrows")
+                    connection.execute_command("BEGIN TRANSACTION")
+                    in_transaction = True
+
+                with pa.OSFile(str(spool_path), "wb") as sink:
+                    with pa.ipc.new_stream(sink, batch.schema) as writer:
+                        writer.write_table(batch)
+
+                row_count += connection.execute_command(
+                    _arrow_load_sql(table_name, batch.schema, spool_path, needs_cast)
+                )
+                stage.add(rows=batch.num_rows, bytes_read=batch.nbytes)
+                spool_path.unlink()
+
+            if in_transaction:
+                connection.execute_command("COMMIT")
+                in_transaction = False
+        except BaseException:
+            if in_transaction:
+                connection.execute_command("ROLLBACK")
+            raise
+        finally:
+            if spool_path is not None:
+                spool_path.unlink(missing_ok=True)
+
+    logger.info("Loaded %d rows into %s from Arrow batches", row_count, table_name)
+    return row_count
+
+
+def _needs_cast(
+    connection: Connection, table_name: TableName, schema: pa.Schema
+) -> bool:
+    """Whether Arrow columns differ in type from the table columns."""
+    table_types = {
+        column.name.unescaped: column.type
+        for column in connection.catalog.get_table_definition(table_name).columns
+    }
+    return any(
+        table_types.get(field.name) != arrow_to_sql_type(field.type) for field in schema
+    )
+
+
+def _arrow_load_sql(
+    table_name: TableName, schema: pa.Schema, path: Path, needs_cast: bool
+) -> str:
+    columns_sql = ", ".join(str(Name(name)) for name in schema.names)
+    path_sql = escape_string_literal(str(path))
+    if not needs_cast:
+        return (
+            f"COPY {table_name} ({columns_sql}) FROM {path_sql} "
+            "WITH (FORMAT arrowstream)"
+        )
+
+    # Arrow streams carry no schema Hyper can infer: it is described
+    # explicitly, and the INSERT casts to the table types
+    descriptor_sql = ", ".join(
+        f"{Name(field.name)} {sql_type_name(arrow_to_sql_type(field.type))}"
+        for field in schema
+    )
+    return (
+        f"INSERT INTO {table_name} ({columns_sql}) SELECT {columns_sql} "
+        f"FROM external({path_sql}, COLUMNS => DESCRIPTOR({descriptor_sql}), "
+        "FORMAT => 'arrowstream')"
+    )
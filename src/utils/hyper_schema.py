@@ -0,0 +1,419 @@
+from __future__ import annotations
+
+import base64
+import csv
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from tableauhyperapi import (
+    NOT_NULLABLE,
+    NULLABLE,
+    SqlType,
+    TableDefinition,
+    TableName,
+    TypeTag,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes read from a CSV file to infer its schema.
+DEFAULT_INFERENCE_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Widest numeric an extract file stores (64-bit). Hyper rejects wider ones,
+# such as the decimal(38, x) Databricks returns for SUM over decimals.
+MAX_NUMERIC_PRECISION = 18
+
+# Databricks SQL type names (and aliases) without parameters.
+_DATABRICKS_TYPES = {
+    "boolean": SqlType.bool,
+    "tinyint": SqlType.small_int,
+    "byte": SqlType.small_int,
+    "smallint": SqlType.small_int,
+    "short": SqlType.small_int,
+    "int": SqlType.int,
+    "integer": SqlType.int,
+    "bigint": SqlType.big_int,
+    "long": SqlType.big_int,
+    "float": SqlType.float,
+    "real": SqlType.float,
+    "double": SqlType.double,
+    "string": SqlType.text,
+    "binary": SqlType.bytes,
+    "date": SqlType.date,
+    # Databricks TIMESTAMP (an alias of TIMESTAMP_LTZ) is an instant: it is
+    # stored in UTC and only displayed in the session time zone, which is
+    # what Hyper's TIMESTAMP WITH TIME ZONE holds. Plain TIMESTAMP would
+    # drop the instant and keep a wall-clock time of unknown zone.
+    "timestamp": SqlType.timestamp_tz,
+    "timestamp_ltz": SqlType.timestamp_tz,
+    "timestamp_ntz": SqlType.timestamp,
+    "void": SqlType.text,
+}
+
+# Hyper SQL names of the types without parameters.
+_SQL_TYPE_NAMES = {
+    TypeTag.BOOL: "BOOL",
+    TypeTag.BIG_INT: "BIGINT",
+    TypeTag.SMALL_INT: "SMALLINT",
+    TypeTag.INT: "INT",
+    TypeTag.FLOAT: "REAL",
+    TypeTag.DOUBLE: "DOUBLE PRECISION",
+    TypeTag.BYTES: "BYTEA",
+    TypeTag.TEXT: "TEXT",
+    TypeTag.JSON: "JSON",
+    TypeTag.DATE: "DATE",
+    TypeTag.INTERVAL: "INTERVAL",
+    TypeTag.TIME: "TIME",
+    TypeTag.TIMESTAMP: "TIMESTAMP",
+    TypeTag.TIMESTAMP_TZ: "TIMESTAMPTZ",
+    TypeTag.TABGEOGRAPHY: "TABGEOGRAPHY",
+}
+
+_PARAMETRIZED_TYPE = re.compile(r"^(\w+)\s*\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\)$")
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """Override of one column of a Hyper table definition.
+
+    Attributes:
+        sql_type: Hyper type, or Databricks type name such as
+            "decimal(18,2)". None keeps the type mapped from Arrow.
+        nullable: Nullability of the column. None keeps the nullability of
+            the Arrow field.
+    """
+
+    sql_type: Optional[Union[SqlType, str]] = None
+    nullable: Optional[bool] = None
+
+
+# Per-column override: a Hyper type, a Databricks type name, a ColumnSpec,
+# or a mapping with "type" and/or "nullable" keys (as read from TOML).
+ColumnOverride = Union[SqlType, str, ColumnSpec, Mapping[str, Any]]
+SchemaOverrides = Mapping[str, ColumnOverride]
+
+
+def arrow_to_sql_type(arrow_type: pa.DataType) -> SqlType:
+    """Map an Arrow data type to the closest Hyper SQL type.
+
+    Args:
+        arrow_type: Arrow data type to convert.
+
+    Returns:
+        Hyper SqlType able to hold every value of the Arrow type. Numerics
+        may be wider than an extract can store (see storable_sql_type).
+
+    Raises:
+        ValueError: If the Arrow type has no Hyper equivalent.
+    """
+    if pa.types.is_dictionary(arrow_type):
+        return arrow_to_sql_type(arrow_type.value_type)
+    if pa.types.is_boolean(arrow_type):
+        return SqlType.bool()
+    if pa.types.is_int8(arrow_type) or pa.types.is_int16(arrow_type):
+        return SqlType.small_int()
+    if pa.types.is_uint8(arrow_type):
+        return SqlType.small_int()
+    if pa.types.is_int32(arrow_type) or pa.types.is_uint16(arrow_type):
+        return SqlType.int()
+    if pa.types.is_int64(arrow_type) or pa.types.is_uint32(arrow_type):
+        return SqlType.big_int()
+    if pa.types.is_uint64(arrow_type):
+        return SqlType.numeric(20, 0)
+    if pa.types.is_float16(arrow_type) or pa.types.is_float32(arrow_type):
+        return SqlType.float()
+    if pa.types.is_float64(arrow_type):
+        return SqlType.double()
+    if pa.types.is_decimal(arrow_type):
+        return SqlType.numeric(arrow_type.precision, arrow_type.scale)
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return SqlType.text()
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return SqlType.bytes()
+    if pa.types.is_date(arrow_type):
+        return SqlType.date()
+    if pa.types.is_timestamp(arrow_type):
+        if arrow_type.tz is not None:
+            return SqlType.timestamp_tz()
+        return SqlType.timestamp()
+    if pa.types.is_time(arrow_type):
+        return SqlType.time()
+    if pa.types.is_null(arrow_type):
+        # Columns that are empty in the inspected sample default to text
+        return SqlType.text()
+
+    raise ValueError(f"Unsupported Arrow type for Hyper: {arrow_type}")
+
+
+def storable_sql_type(sql_type: SqlType, column: str) -> SqlType:
+    """Return the type in which an extract file stores a column.
+
+    Numerics wider than MAX_NUMERIC_PRECISION digits (e.g. from Arrow
+    uint64 or decimal128(38, 6)) are stored as DOUBLE PRECISION, with a
+    warning; override the column with a narrower decimal type to keep
+    exact values. Other types are returned unchanged.
+
+    Args:
+        sql_type: Type of the column values.
+        column: Column name, for the warning.
+
+    Returns:
+        Hyper SqlType an extract file can store.
+    """
+    if sql_type.tag == TypeTag.NUMERIC and sql_type.precision > MAX_NUMERIC_PRECISION:
+        logger.warning(
+            "Column %s: %s is wider than an extract can store, "
+            "storing it as DOUBLE PRECISION",
+            column,
+            sql_type_name(sql_type),
+        )
+        return SqlType.double()
+    return sql_type
+
+
+def sql_type_name(sql_type: SqlType) -> str:
+    """Render a Hyper SqlType as it is written in Hyper SQL.
+
+    Args:
+        sql_type: Hyper type.
+
+    Returns:
+        SQL type name, e.g. "BIGINT" or "NUMERIC(18, 2)".
+    """
+    tag = sql_type.tag
+    if tag == TypeTag.NUMERIC:
+        return f"NUMERIC({sql_type.precision}, {sql_type.scale})"
+    if tag == TypeTag.VARCHAR:
+        return f"VARCHAR({sql_type.max_length})"
+    if tag == TypeTag.CHAR:
+        return f"CHAR({sql_type.max_length})"
+    if tag in _SQL_TYPE_NAMES:
+        return _SQL_TYPE_NAMES[tag]
+
+    raise ValueError(f"Unsupported Hyper type: {sql_type}")
+
+
+def databricks_to_sql_type(type_name: str) -> SqlType:
+    """Map a Databricks SQL type name to the matching Hyper SQL type.
+
+    Args:
+        type_name: Type as written in Databricks DDL or DESCRIBE output,
+            e.g. "bigint", "decimal(18,2)" or "varchar(20)".
+
+    Returns:
+        Hyper SqlType.
+
+    Raises:
+        ValueError: If the type has no Hyper equivalent (arrays, maps,
+            structs, intervals).
+    """
+    name = type_name.strip().lower()
+    if name in _DATABRICKS_TYPES:
+        return _DATABRICKS_TYPES[name]()
+    if name in ("decimal", "dec", "numeric"):
+        # Databricks default precision and scale
+        return SqlType.numeric(10, 0)
+
+    match = _PARAMETRIZED_TYPE.match(name)
+    if match:
+        base, first, second = match.groups()
+        if base in ("decimal", "dec", "numeric"):
+            return SqlType.numeric(int(first), int(second or 0))
+        if base == "varchar" and second is None:
+            return SqlType.varchar(int(first))
+        if base == "char" and second is None:
+            return SqlType.char(int(first))
+
+    raise ValueError(f"Unsupported Databricks type for Hyper: {type_name}")
+
+
+def column_spec(override: Optional[ColumnOverride]) -> ColumnSpec:
+    """Normalize a per-column override into a ColumnSpec."""
+    if override is None:
+        return ColumnSpec()
+    if isinstance(override, ColumnSpec):
+        return override
+    if isinstance(override, (SqlType, str)):
+        return ColumnSpec(sql_type=override)
+    if isinstance(override, Mapping):
+        unknown = set(override) - {"type", "nullable"}
+        if unknown:
+            raise ValueError(f"Unknown column override keys: {sorted(unknown)}")
+        return ColumnSpec(
+            sql_type=override.get("type"), nullable=override.get("nullable")
+        )
+
+    raise ValueError(f"Unsupported column override: {override!r}")
+
+
+def table_definition_from_arrow(
+    schema: pa.Schema,
+    table_name: TableName,
+    overrides: Optional[SchemaOverrides] = None,
+) -> TableDefinition:
+    """Build a Hyper TableDefinition from an Arrow schema.
+
+    Types are mapped from Arrow (see arrow_to_sql_type) and columns are
+    NOT NULL when their Arrow field is not nullable, unless overridden.
+    Numerics too wide for an extract are stored as DOUBLE PRECISION (see
+    storable_sql_type).
+
+    Args:
+        schema: Arrow schema describing the source columns, in order.
+        table_name: Fully qualified Hyper table name.
+        overrides: Optional per-column overrides keyed by column name: a
+            SqlType, a Databricks type name, or a ColumnSpec also setting
+            the nullability.
+
+    Returns:
+        TableDefinition with one column per Arrow field.
+    """
+    overrides = overrides or {}
+
+    unknown = set(overrides) - set(schema.names)
+    if unknown:
+        raise ValueError(f"Schema overrides for unknown columns: {sorted(unknown)}")
+
+    columns = []
+    for field in schema:
+        spec = column_spec(overrides.get(field.name))
+        if spec.sql_type is None:
+            sql_type = arrow_to_sql_type(field.type)
+        elif isinstance(spec.sql_type, str):
+            sql_type = databricks_to_sql_type(spec.sql_type)
+        else:
+            sql_type = spec.sql_type
+        sql_type = storable_sql_type(sql_type, field.name)
+        nullable = field.nullable if spec.nullable is None else spec.nullable
+        columns.append(
+            TableDefinition.Column(
+                field.name, sql_type, NULLABLE if nullable else NOT_NULLABLE
+            )
+        )
+    return TableDefinition(table_name=table_name, columns=columns)
+
+
+def infer_csv_schema(
+    csv_path: Path,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    block_size: int = DEFAULT_INFERENCE_BLOCK_SIZE,
+) -> pa.Schema:
+    """Infer the schema of a CSV file from its first block only.
+
+    The file is opened with pyarrow's streaming CSV reader, which only parses
+    the first block to determine column types, so memory usage does not
+    depend on the file size.
+
+    Args:
+        csv_path: Path to the CSV file (with a header row).
+        delimiter: Field delimiter.
+        encoding: File encoding.
+        block_size: Number of bytes inspected to infer column types.
+
+    Returns:
+        Arrow schema of the CSV file.
+    """
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=block_size, encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+    )
+    try:
+        schema = reader.schema
+    finally:
+        reader.close()
+
+    logger.debug("Inferred CSV schema for %s: %s", csv_path, schema)
+    return schema
+
+
+class SchemaCache:
+    """
+    Arrow schemas inferred for each source, persisted as a JSON file.
+
+    Reusing the schema inferred on the first run skips inference and keeps
+    column types stable from one run to the next: a column that happens to
+    be empty in the inspected block would otherwise fall back to text.
+
+    Only CSV sources are inferred, so only they are cached (see
+    cached_csv_schema). Databricks results carry the column types declared
+    by the warehouse in their Arrow schema, which are mapped as is.
+    """
+
+    # Tables of a multi-table extract share one file
+    _lock = threading.Lock()
+
+    def __init__(self, path: Path) -> None:
+        self._path = Path(path)
+
+    def _read(self) -> Dict[str, str]:
+        if not self._path.exists():
+            return {}
+        return json.loads(self._path.read_text(encoding="utf-8"))
+
+    def get(self, source: str) -> Optional[pa.Schema]:
+        encoded = self._read().get(source)
+        if encoded is None:
+            return None
+        return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(encoded)))
+
+    def set(self, source: str, schema: pa.Schema) -> None:
+        with self._lock:
+            data = self._read()
+            data[source] = base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            tmp_path.replace(self._path)
+
+
+def read_csv_header(
+    csv_path: Path, delimiter: str = ",", encoding: str = "utf-8"
+) -> List[str]:
+    """Read the column names from the header row of a CSV file."""
+    with open(csv_path, newline="", encoding=encoding) as f:
+        return next(csv.reader(f, delimiter=delimiter), [])
+
+
+def cached_csv_schema(
+    csv_path: Path,
+    source: str,
+    cache: SchemaCache,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+) -> pa.Schema:
+    """Return the cached schema of a CSV source, inferring it if needed.
+
+    The cached schema is only reused while the header of the file lists
+    the same columns; otherwise the schema is inferred again and replaces
+    the cached one.
+
+    Args:
+        csv_path: Path to the CSV file (with a header row).
+        source: Key of the source in the cache, e.g. the extract name.
+        cache: Schema cache.
+        delimiter: Field delimiter.
+        encoding: File encoding.
+
+    Returns:
+        Arrow schema of the CSV file.
+    """
+    schema = cache.get(source)
+    if schema is not None:
+        if schema.names == read_csv_header(csv_path, delimiter, encoding):
+            logger.debug("Reusing cached schema for %s", source)
+            return schema
+        logger.info("Columns of %s changed, inferring its schema again", source)
+
+    schema = infer_csv_schema(csv_path, delimiter=delimiter, encoding=encoding)
+    cache.set(source, schema)
+    return schema
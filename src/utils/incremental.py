@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from tableauhyperapi import (
+    Connection,
+    Name,
+    SchemaName,
+    TableDefinition,
+    TableName,
+    escape_string_literal,
+)
+from tableauhyperapi import Date as HyperDate
+from tableauhyperapi import Timestamp as HyperTimestamp
+
+from src.utils.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+APPEND = "append"
+UPSERT = "upsert"
+
+# Delta files are written next to the extract, in this subdirectory and under
+# the same file name, so that they publish to the same datasource name.
+DELTA_DIR = "delta"
+
+
+@dataclass(frozen=True)
+class IncrementalConfig:
+    """How an extract is refreshed incrementally.
+
+    Attributes:
+        watermark_column: Monotonic column (timestamp or id) identifying new
+            or changed rows.
+        mode: "append" to insert new rows, or "upsert" to replace existing
+            rows sharing the same key (DELETE + INSERT).
+        key_columns: Columns identifying a row, required for "upsert".
+    """
+
+    watermark_column: str
+    mode: str = APPEND
+    key_columns: Sequence[str] = field(default_factory=tuple)
+
+    def __post_init__(self) -> None:
+        if self.mode not in (APPEND, UPSERT):
+            raise ValueError(f"Unsupported incremental mode: {self.mode}")
+        if self.mode == UPSERT and not self.key_columns:
+            raise ValueError("Upsert mode requires at least one key column")
+
+
+class WatermarkStore:
+    """
+    High-watermarks of the extracts, persisted as a JSON file.
+    Values are keyed by extract name.
+    """
+
+    # Tables of a multi-table extract share one file and update it from
+    # several threads
+    _lock = threading.Lock()
+
+    def __init__(self, path: Path) -> None:
+        self._path = Path(path)
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        if not self._path.exists():
+            return {}
+        return json.loads(self._path.read_text(encoding="utf-8"))
+
+    def get(self, extract: str) -> Optional[Any]:
+        entry = self._read().get(extract)
+        return _decode_value(entry) if entry else None
+
+    def set(self, extract: str, value: Any) -> None:
+        with self._lock:
+            data = self._read()
+            data[extract] = _encode_value(value)
+
+            # Write atomically so an interrupted run never leaves a corrupt file
+            tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            tmp_path.replace(self._path)
+
+
+def _encode_value(value: Any) -> Dict[str, str]:
+    if isinstance(value, bool):
+        raise ValueError("Boolean columns cannot be used as watermarks")
+    if isinstance(value, int):
+        return {"type": "int", "value": str(value)}
+    if isinstance(value, float):
+        return {"type": "float", "value": repr(value)}
+    if isinstance(value, Decimal):
+        return {"type": "decimal", "value": str(value)}
+    if isinstance(value, dt.datetime):
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, dt.date):
+        return {"type": "date", "value": value.isoformat()}
+    if isinstance(value, str):
+        return {"type": "str", "value": value}
+
+    raise ValueError(f"Unsupported watermark type: {type(value).__name__}")
+
+
+def _decode_value(entry: Dict[str, str]) -> Any:
+    decoders = {
+        "int": int,
+        "float": float,
+        "decimal": Decimal,
+        "datetime": dt.datetime.fromisoformat,
+        "date": dt.date.fromisoformat,
+        "str": str,
+    }
+    return decoders[entry["type"]](entry["value"])
+
+
+def _to_python(value: Any) -> Any:
+    """Convert Hyper API date/time values to their standard library type."""
+    if isinstance(value, HyperTimestamp):
+        return value.to_datetime()
+    if isinstance(value, HyperDate):
+        return value.to_date()
+    return value
+
+
+def hyper_literal(value: Any) -> str:
+    """Render a watermark value as a Hyper SQL literal.
+
+    Args:
+        value: int, float, Decimal, str, date or datetime value.
+
+    Returns:
+        SQL literal string.
+    """
+    if isinstance(value, bool):
+        raise ValueError("Boolean columns cannot be used as watermarks")
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, dt.datetime):
+        type_name = "TIMESTAMPTZ" if value.tzinfo else "TIMESTAMP"
+        return f"{type_name} {escape_string_literal(value.isoformat(sep=' '))}"
+    if isinstance(value, dt.date):
+        return f"DATE {escape_string_literal(value.isoformat())}"
+    if isinstance(value, str):
+        return escape_string_literal(value)
+
+    raise ValueError(f"Unsupported watermark type: {type(value).__name__}")
+
+
+def delta_path(hyper_path: Path) -> Path:
+    """Path of the delta file holding the rows of the last incremental run."""
+    return hyper_path.parent / DELTA_DIR / hyper_path.name
+
+
+def full_publish_marker(hyper_path: Path) -> Path:
+    """Path of the marker left when a delta of the extract was never published.
+
+    While it exists, the next publish has to send the whole extract, since
+    the published datasource misses the rows of the unpublished delta.
+    """
+    return delta_path(hyper_path).with_suffix(".full")
+
+
+def export_delta(
+    connection: Connection,
+    table_name: TableName,
+    path: Path,
+    source_table: Optional[TableName] = None,
+    columns: Sequence[str] = (),
+) -> int:
+    """Write delta rows to a separate Hyper file, in a copy of the table.
+
+    The file holds a table with the name and definition of the extract
+    table, so that it can be published in Append mode or sent as the
+    payload of a Tableau "update hyper data" request.
+
+    Args:
+        connection: Open connection to the extract database.
+        table_name: Extract table, whose definition is copied.
+        path: Path of the delta file, replaced if it exists.
+        source_table: Table (e.g. a temporary one) holding the delta rows.
+            None writes an empty table, for runs without new rows.
+        columns: Columns to copy from source_table.
+
+    Returns:
+        Number of rows written.
+    """
+    definition = connection.catalog.get_table_definition(table_name)
+    alias = "delta_export"
+    schema = SchemaName(
+        alias,
+        table_name.schema_name.name if table_name.schema_name else "public",
+    )
+    target = TableName(schema, table_name.name)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    connection.catalog.create_database(path)
+    connection.catalog.attach_database(path, alias=alias)
+    try:
+        connection.catalog.create_schema_if_not_exists(schema)
+        connection.catalog.create_table(TableDefinition(target, definition.columns))
+        rows = 0
+        if source_table is not None:
+            columns_sql = ", ".join(str(Name(column)) for column in columns)
+            rows = connection.execute_command(
+                f"INSERT INTO {target} ({columns_sql}) "
+                f"SELECT {columns_sql} FROM {source_table}"
+            )
+    finally:
+        connection.catalog.detach_database(alias)
+
+    logger.info("Wrote %d delta rows to %s", rows, path)
+    return rows
+
+
+def read_watermark(
+    connection: Connection,
+    table_name: TableName,
+    watermark_column: str,
+    store: Optional[WatermarkStore] = None,
+    extract: Optional[str] = None,
+) -> Optional[Any]:
+    """Return the high-watermark of an existing extract.
+
+    The stored watermark is used when present. If the store has no entry
+    (e.g. first incremental run on an existing file), it is recomputed from
+    the table with MAX(). If the table does not exist, None is returned and
+    the caller should perform a full load.
+
+    Args:
+        connection: Open connection to the Hyper database.
+        table_name: Extract table.
+        watermark_column: Column holding the watermark.
+        store: Optional persisted watermark store.
+        extract: Key of the extract in the store.
+
+    Returns:
+        The watermark value, or None when no data has been loaded yet.
+    """
+    if not connection.catalog.has_table(table_name):
+        return None
+
+    if store is not None and extract is not None:
+        stored = store.get(extract)
+        if stored is not None:
+            return stored
+
+    return _to_python(
+        connection.execute_scalar_query(
+            f"SELECT MAX({Name(watermark_column)}) FROM {table_name}"
+        )
+    )
+
+
+def apply_delta(
+    connection: Connection,
+    table_name: TableName,
+    source_sql: str,
+    columns: Sequence[str],
+    config: IncrementalConfig,
+    watermark: Optional[Any],
+    delta_file: Optional[Path] = None,
+) -> Tuple[int, Optional[Any]]:
+    """Apply the rows of a source newer than the watermark to a table.
+
+    Rows above the watermark are staged in a temporary table, then appended
+    (or upserted on the key columns with DELETE + INSERT) inside a single
+    Hyper transaction, so readers never see a partially applied delta.
+
+    Args:
+        connection: Open connection to the Hyper database.
+        table_name: Existing target table.
+        source_sql: FROM-clause fragment reading the source rows (a table
+            name or an external() call).
+        columns: Source columns to load, matched by name.
+        config: Incremental refresh settings.
+        watermark: Current watermark, or None to take every source row.
+        delta_file: Optional path of a Hyper file receiving a copy of the
+            applied rows (see export_delta), for delta publishing.
+
+    Returns:
+        Tuple of (rows applied, new watermark).
+    """
+    delta_table = TableName("incremental_delta")
+    watermark_sql = Name(config.watermark_column)
+    columns_sql = ", ".join(str(Name(column)) for column in columns)
+    where_sql = (
+        f"WHERE {watermark_sql} > {hyper_literal(watermark)}"
+        if watermark is not None
+        else ""
+    )
+
+    with track_stage("hyper_insert", table=str(table_name), mode=config.mode) as stage:
+        connection.execute_command("BEGIN TRANSACTION")
+        try:
+            connection.execute_command(
+                f"CREATE TEMPORARY TABLE {delta_table} AS "
+                f"SELECT {columns_sql} FROM {source_sql} {where_sql}"
+            )
+
+            if config.mode == UPSERT:
+                key_match_sql = " AND ".join(
+                    f"d.{Name(key)} IS NOT DISTINCT FROM t.{Name(key)}"
+                    for key in config.key_columns
+                )
+                deleted = connection.execute_command(
+                    f"DELETE FROM {table_name} AS t WHERE EXISTS "
+                    f"(SELECT 1 FROM {delta_table} AS d WHERE {key_match_sql})"
+                )
+                logger.info("Deleted %d rows replaced by the delta", deleted)
+
+            applied = connection.execute_command(
+                f"INSERT INTO {table_name} ({columns_sql}) "
+                f"SELECT {columns_sql} FROM {delta_table}"
+            )
+            new_watermark = _to_python(
+                connection.execute_scalar_query(
+                    f"SELECT MAX({watermark_sql}) FROM {delta_table}"
+                )
+            )
+            connection.execute_command("COMMIT")
+            stage.add(rows=applied)
+        except Exception:
+            connection.execute_command("ROLLBACK")
+            raise
+
+    if delta_file is not None:
+        export_delta(connection, table_name, delta_file, delta_table, columns)
+
+    # Hyper does not allow DDL after DML in the same transaction
+    connection.execute_command(f"DROP TABLE IF EXISTS {delta_table}")
+
+    logger.info("Applied %d delta rows to %s (%s)", applied, table_name, config.mode)
+    return applied, new_watermark if new_watermark is not None else watermark
@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 import logging
-import time
 from contextlib import contextmanager
+from typing import Iterator
+
+from src.utils.metrics import Stage
 
 logger = logging.getLogger(__name__)
 
 
 @contextmanager
-def log_duration(label: str):
-    start = time.time()
+def log_duration(label: str) -> Iterator[Stage]:
+    """Time a block as a stage named after the label and log its duration."""
+    stage = Stage(label)
     try:
-        yield
+        with stage.timed():
+            yield stage
     finally:
-        elapsed = time.time() - start
-        logger.info("%s took %.2fs", label, elapsed)
+        stage.record()
+        logger.info("%s took %.2fs", label, stage.seconds)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.wrapper.tableau_wrapper import TableauClient
+
+logger = logging.getLogger(__name__)
+
+# Default location and lifetime (seconds) of the persisted index.
+DEFAULT_INDEX_PATH = Path("temp/luid_index.json")
+DEFAULT_INDEX_TTL = 3600.0
+
+_LUID_PATTERN = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+
+
+def is_luid(value: str) -> bool:
+    """Whether a string is a LUID rather than a name or path."""
+    return bool(_LUID_PATTERN.match(value))
+
+
+class LuidIndex:
+    """
+    Name-to-LUID index of the projects and datasources of a site.
+
+    Projects are addressed by their path from the top level ("Sales/Extracts")
+    and datasources by their project path plus name
+    ("Sales/Extracts/orders"). The index is built from full listings,
+    persisted as a JSON file and rebuilt once it is older than its TTL, or
+    when a name is not found (it may have been created since).
+    """
+
+    def __init__(
+        self,
+        tsc: TableauClient,
+        path: Path = DEFAULT_INDEX_PATH,
+        ttl: float = DEFAULT_INDEX_TTL,
+    ) -> None:
+        self._tsc = tsc
+        self._path = Path(path)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+
+    def project_luid(self, project: str) -> str:
+        """Resolve a project path, or return a LUID unchanged.
+
+        Args:
+            project: Project LUID, or path such as "Sales/Extracts".
+
+        Returns:
+            The project LUID.
+        """
+        if is_luid(project):
+            return project
+        return self._lookup("projects", project.strip("/"))
+
+    def datasource_luid(self, datasource: str) -> str:
+        """Resolve a datasource path ("Sales/Extracts/orders") to its LUID."""
+        if is_luid(datasource):
+            return datasource
+        return self._lookup("datasources", datasource.strip("/"))
+
+    def refresh(self) -> None:
+        """Rebuild the index from the server and persist it."""
+        with self._lock:
+            self._data = self._build()
+            self._save(self._data)
+
+    def _lookup(self, kind: str, path: str) -> str:
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+
+            refreshed = False
+            if self._data is None or self._expired(self._data):
+                self._data = self._build()
+                self._save(self._data)
+                refreshed = True
+
+            luid = self._data[kind].get(path)
+            if luid is None and not refreshed:
+                # Created since the index was built
+                self._data = self._build()
+                self._save(self._data)
+                luid = self._data[kind].get(path)
+
+        if luid is None:
+            raise ValueError(f"No {kind[:-1]} found at path: {path}")
+        return luid
+
+    def _expired(self, data: Dict[str, Any]) -> bool:
+        return (
+            data.get("site") != self._site_key()
+            or time.time() - data.get("built_at", 0) > self._ttl
+        )
+
+    def _site_key(self) -> str:
+        server = self._tsc.server
+        return f"{server.server_address}#{server.site_id}"
+
+    def _build(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        server = self._tsc.server
+        projects = self._tsc.list_all(server.projects.get)
+        datasources = self._tsc.list_all(server.datasources.get)
+
+        by_id = {project.id: project for project in projects}
+
+        def project_path(project_id: str) -> str:
+            names = []
+            seen = set()
+            while project_id in by_id and project_id not in seen:
+                seen.add(project_id)
+                names.append(by_id[project_id].name)
+                project_id = by_id[project_id].parent_id
+            return "/".join(reversed(names))
+
+        project_paths = {project.id: project_path(project.id) for project in projects}
+        data = {
+            "site": self._site_key(),
+            "built_at": time.time(),
+            "projects": {path: luid for luid, path in project_paths.items()},
+            "datasources": {
+                f"{project_paths.get(item.project_id, '')}/{item.name}": item.id
+                for item in datasources
+            },
+        }
+        logger.info(
+            "Indexed %d projects and %d datasources in %.2fs",
+            len(projects),
+            len(datasources),
+            time.perf_counter() - started,
+        )
+        return data
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self._path.exists():
+            return None
+        return json.loads(self._path.read_text(encoding="utf-8"))
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        tmp_path.replace(self._path)
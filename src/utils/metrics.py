@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.wrapper.config import ConfigWrapper, Singleton
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "tableau_pipeline"
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of the process so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass(frozen=True)
+class StageMetrics:
+    """Measurements of one execution of a pipeline stage."""
+
+    stage: str
+    seconds: float
+    rows: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    peak_rss_bytes: Optional[int] = None
+    failed: bool = False
+    skipped: bool = False
+    labels: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        return self.rows / self.seconds if self.rows and self.seconds else None
+
+
+class Stage:
+    """
+    Accumulates the time and volumes of a pipeline stage.
+    Time is measured with a monotonic clock; a stage can be timed in
+    several slices (e.g. interleaved fetch and write loops) and is
+    recorded once.
+    """
+
+    def __init__(self, name: str, **labels: str) -> None:
+        self.name = name
+        self.labels = labels
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.failed = False
+        self.skipped = False
+
+    def add(self, rows: int = 0, bytes_read: int = 0, bytes_written: int = 0) -> None:
+        self.rows += rows
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def skip(self) -> None:
+        """Mark the stage as skipped (e.g. nothing changed since the last run)."""
+        self.skipped = True
+
+    @contextmanager
+    def timed(self) -> Iterator["Stage"]:
+        start = time.perf_counter()
+        try:
+            yield self
+        except BaseException:
+            self.failed = True
+            raise
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def record(self) -> StageMetrics:
+        metrics = StageMetrics(
+            stage=self.name,
+            seconds=self.seconds,
+            rows=self.rows,
+            bytes_read=self.bytes_read,
+            bytes_written=self.bytes_written,
+            peak_rss_bytes=peak_rss_bytes(),
+            failed=self.failed,
+            skipped=self.skipped,
+            labels=dict(self.labels),
+        )
+        MetricsRegistry().add(metrics)
+        return metrics
+
+
+@contextmanager
+def track_stage(name: str, **labels: str) -> Iterator[Stage]:
+    """Time a block as one pipeline stage and record it.
+
+    Example:
+        with track_stage("hyper_insert", table="Extract") as stage:
+            stage.add(rows=connection.execute_command(sql))
+
+    Args:
+        name: Stage name (fetch, parquet_write, hyper_insert, publish, ...).
+        **labels: Extra dimensions of the stage (extract, table, ...).
+
+    Yields:
+        The Stage, to which rows and bytes can be added.
+    """
+    stage = Stage(name, **labels)
+    try:
+        with stage.timed():
+            yield stage
+    finally:
+        stage.record()
+
+
+class MetricsRegistry(metaclass=Singleton):
+    """
+    Process-wide collection of the recorded stages.
+    Each stage is logged as a JSON line when recorded; the run totals can
+    be exported to a Prometheus textfile (node_exporter textfile collector).
+    """
+
+    def __init__(self) -> None:
+        self._settings = ConfigWrapper().metrics_settings
+        self._stages: List[StageMetrics] = []
+        self._lock = threading.Lock()
+
+    def add(self, metrics: StageMetrics) -> None:
+        with self._lock:
+            self._stages.append(metrics)
+
+        if self._settings.json_logs:
+            record = {"event": "stage_metrics", **asdict(metrics)}
+            record["rows_per_second"] = metrics.rows_per_second
+            logger.info(json.dumps(record, default=str))
+
+    def stages(self) -> List[StageMetrics]:
+        with self._lock:
+            return list(self._stages)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def export(self, job: str) -> Optional[Path]:
+        """Write the run totals to the configured Prometheus textfile.
+
+        Args:
+            job: Name of the run, exported as the "job" label.
+
+        Returns:
+            Path of the written file, or None when no textfile is configured.
+        """
+        if not self._settings.prometheus_textfile:
+            return None
+
+        path = Path(self._settings.prometheus_textfile)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically so the collector never reads a partial file
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.prometheus_text(job), encoding="utf-8")
+        tmp_path.replace(path)
+        return path
+
+    def prometheus_text(self, job: str) -> str:
+        """Render the stages in the Prometheus text exposition format.
+
+        Stages recorded several times with the same labels (e.g. one fetch
+        per partition) are summed; peak RSS keeps the maximum.
+        """
+        totals: Dict[Tuple[Tuple[str, str], ...], Dict[str, float]] = {}
+        for metrics in self.stages():
+            key = tuple(
+                sorted({"job": job, "stage": metrics.stage, **metrics.labels}.items())
+            )
+            total = totals.setdefault(
+                key,
+                {
+                    "seconds": 0.0,
+                    "rows": 0,
+                    "bytes_read": 0,
+                    "bytes_written": 0,
+                    "peak_rss_bytes": 0,
+                    "failures": 0,
+                    "skips": 0,
+                },
+            )
+            total["seconds"] += metrics.seconds
+            total["rows"] += metrics.rows
+            total["bytes_read"] += metrics.bytes_read
+            total["bytes_written"] += metrics.bytes_written
+            total["peak_rss_bytes"] = max(
+                total["peak_rss_bytes"], metrics.peak_rss_bytes or 0
+            )
+            total["failures"] += int(metrics.failed)
+            total["skips"] += int(metrics.skipped)
+
+        descriptions = {
+            "seconds": "Time spent in the stage.",
+            "rows": "Rows processed by the stage.",
+            "bytes_read": "Bytes read by the stage.",
+            "bytes_written": "Bytes written by the stage.",
+            "peak_rss_bytes": "Peak resident memory of the process after the stage.",
+            "failures": "Failed executions of the stage.",
+            "skips": "Executions of the stage skipped as unnecessary.",
+        }
+        lines: List[str] = []
+        for metric, description in descriptions.items():
+            name = f"{METRIC_PREFIX}_stage_{metric}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, total in totals.items():
+                labels_text = ",".join(
+                    f'{label}="{_escape_label(value)}"' for label, value in key
+                )
+                lines.append(f"{name}{{{labels_text}}} {total[metric]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
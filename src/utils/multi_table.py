@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Sequence, TypeVar
+
+from tableauhyperapi import CreateMode
+
+from src.wrapper.hyper_wrapper import HyperEngine
+
+logger = logging.getLogger(__name__)
+
+# Tableau extracts conventionally use Extract.Extract for single-table
+# extracts; multi-table extracts add their tables to the same schema.
+DEFAULT_SCHEMA = "Extract"
+DEFAULT_TABLE = "Extract"
+
+T = TypeVar("T")
+
+
+def table_key(extract: str, table: str) -> str:
+    """Key identifying one table of an extract (watermarks, shard names).
+
+    The default table keeps the bare extract name, so single-table extracts
+    are unaffected by multi-table support.
+    """
+    return extract if table == DEFAULT_TABLE else f"{extract}.{table}"
+
+
+def load_tables(
+    hyper_path: Path,
+    tables: Sequence[str],
+    load_table: Callable[[str], T],
+    max_workers: int = 4,
+) -> Dict[str, T]:
+    """Load several tables into one Hyper file concurrently.
+
+    The file and the Extract schema are created up front, then each table
+    is loaded by load_table(table) on its own thread. Loaders open their
+    own connection on the shared Hyper engine, which runs the inserts into
+    the different tables in parallel.
+
+    Args:
+        hyper_path: Path of the Hyper file.
+        tables: Names of the tables to load.
+        load_table: Callable loading one table, given its name.
+        max_workers: Maximum number of tables loaded at the same time.
+
+    Returns:
+        Result of load_table, keyed by table name.
+
+    Raises:
+        ValueError: If no table or a duplicate table name is given.
+        RuntimeError: If at least one table failed to load.
+    """
+    if not tables:
+        raise ValueError("At least one table is required")
+    duplicates = sorted({t for t in tables if list(tables).count(t) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate table names: {duplicates}")
+
+    results: Dict[str, T] = {}
+    failures: Dict[str, BaseException] = {}
+
+    # The file and schema are created before starting the loaders, and this
+    # connection stays open until they are done: Hyper rejects connections
+    # to a database that is being attached or detached by another one
+    hyper_path.parent.mkdir(parents=True, exist_ok=True)
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_IF_NOT_EXISTS
+    ) as connection:
+        connection.catalog.create_schema_if_not_exists(DEFAULT_SCHEMA)
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hyper-table"
+        ) as pool:
+            futures = {pool.submit(load_table, table): table for table in tables}
+            for future in as_completed(futures):
+                table = futures[future]
+                try:
+                    results[table] = future.result()
+                    logger.info("Table %s loaded into %s", table, hyper_path.name)
+                except Exception as exc:
+                    logger.error("Table %s failed: %s", table, exc)
+                    failures[table] = exc
+
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} of {len(tables)} tables failed: {sorted(failures)}"
+        ) from next(iter(failures.values()))
+
+    return results
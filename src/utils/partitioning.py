@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, List, Sequence, Union
+
+RangeValue = Union[int, float, Decimal, dt.date, dt.datetime]
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One slice of a partitioned query.
+
+    Attributes:
+        name: Stable, sortable identifier (used in shard file names).
+        predicate: SQL boolean expression selecting the rows of the slice.
+    """
+
+    name: str
+    predicate: str
+
+
+def sql_literal(value: Any) -> str:
+    """Render a Python value as a Databricks SQL literal.
+
+    Args:
+        value: int, float, Decimal, str, bool, date or datetime value.
+
+    Returns:
+        SQL literal string.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, dt.datetime):
+        return f"TIMESTAMP'{value.isoformat(sep=' ')}'"
+    if isinstance(value, dt.date):
+        return f"DATE'{value.isoformat()}'"
+    if isinstance(value, str):
+        escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+        return f"'{escaped}'"
+
+    raise ValueError(f"Unsupported SQL literal type: {type(value).__name__}")
+
+
+def range_partitions(
+    column: str,
+    start: RangeValue,
+    end: RangeValue,
+    step: Union[RangeValue, dt.timedelta],
+    include_nulls: bool = True,
+) -> List[Partition]:
+    """Split a column into contiguous half-open ranges [lower, upper).
+
+    The bounds run from start to end by step: [start, start + step),
+    [start + step, start + 2 * step), ..., the last one ending at end. The
+    first range is then left unbounded below and the last one unbounded
+    above, so rows outside [start, end) are extracted too, with the first
+    or last slice. A single range matches every non-NULL value.
+
+    Args:
+        column: Column (or SQL expression) to partition on.
+        start: First bound; the first range holds the values below
+            start + step (or below end, when it is closer).
+        end: Last bound; the last range holds the values from the bound
+            before end upwards. The range before end may be narrower than
+            step.
+        step: Distance between consecutive bounds (a timedelta for
+            date/timestamp columns).
+        include_nulls: Add a partition for rows where the column is NULL,
+            so that no row is lost by the split.
+
+    Returns:
+        Partitions in ascending order of their range.
+    """
+    if not start < end:
+        raise ValueError(f"Empty partition range: start={start!r}, end={end!r}")
+    if not start + step > start:
+        raise ValueError(f"Partition step must be positive, got {step!r}")
+
+    bounds = [start]
+    while bounds[-1] < end:
+        bounds.append(min(bounds[-1] + step, end))
+
+    partitions: List[Partition] = []
+    for index, (lower, upper) in enumerate(zip(bounds, bounds[1:])):
+        conditions = []
+        if index > 0:
+            conditions.append(f"{column} >= {sql_literal(lower)}")
+        if index < len(bounds) - 2:
+            conditions.append(f"{column} < {sql_literal(upper)}")
+        partitions.append(
+            Partition(
+                name=f"p{len(partitions):05d}",
+                predicate=" AND ".join(conditions) or f"{column} IS NOT NULL",
+            )
+        )
+
+    if include_nulls:
+        partitions.append(
+            Partition(name=f"p{len(partitions):05d}", predicate=f"{column} IS NULL")
+        )
+
+    return partitions
+
+
+def list_partitions(column: str, values: Sequence[Any]) -> List[Partition]:
+    """Create one partition per value of a column (e.g. one per date).
+
+    Rows whose value is not listed are not extracted.
+
+    Args:
+        column: Column (or SQL expression) to partition on.
+        values: Values to extract, one partition each.
+
+    Returns:
+        Partitions in the order of values.
+    """
+    if not values:
+        raise ValueError("At least one partition value is required")
+
+    return [
+        Partition(
+            name=f"p{index:05d}",
+            predicate=(
+                f"{column} IS NULL"
+                if value is None
+                else f"{column} = {sql_literal(value)}"
+            ),
+        )
+        for index, value in enumerate(values)
+    ]
+
+
+def hash_partitions(column: str, buckets: int) -> List[Partition]:
+    """Split rows into buckets on the hash of a column.
+
+    Uses Databricks' hash() and pmod() functions, so every row (including
+    NULLs) falls in exactly one bucket.
+
+    Args:
+        column: Column (or SQL expression) to hash.
+        buckets: Number of buckets.
+
+    Returns:
+        Partitions ordered by bucket number.
+    """
+    if buckets < 1:
+        raise ValueError(f"buckets must be positive, got {buckets}")
+
+    return [
+        Partition(
+            name=f"p{bucket:05d}",
+            predicate=f"pmod(hash({column}), {buckets}) = {bucket}",
+        )
+        for bucket in range(buckets)
+    ]
+
+
+def partition_query(query: str, partition: Partition) -> str:
+    """Restrict a query to the rows of one partition.
+
+    Args:
+        query: Source SELECT statement.
+        partition: Partition to extract.
+
+    Returns:
+        SQL statement wrapping the query with the partition predicate.
+    """
+    return filter_query(query, partition.predicate)
+
+
+def filter_query(query: str, predicate: str) -> str:
+    """Wrap a query with an additional WHERE predicate.
+
+    Args:
+        query: Source SELECT statement.
+        predicate: SQL boolean expression over the query's columns.
+
+    Returns:
+        SQL statement returning the rows of the query matching the predicate.
+    """
+    return f"SELECT * FROM ({query.strip().rstrip(';')}) AS src WHERE {predicate}"
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How often a blocked producer checks whether the consumer went away
+_POLL_SECONDS = 0.5
+
+# Marks the end of the items in the queue
+_DONE = object()
+
+
+def prefetch(items: Iterable[T], maxsize: int, name: str = "prefetch") -> Iterator[T]:
+    """Produce the items of an iterable in a background thread.
+
+    The iterable is consumed by its own thread into a bounded queue, so the
+    caller works on one item while the next ones are being produced. When
+    the queue is full the producer blocks, which bounds the memory held by
+    items produced ahead (backpressure). Chaining calls builds a pipeline
+    whose stages run concurrently, e.g. fetch -> stage -> load.
+
+    An exception raised by the producer is raised in the caller, after the
+    items produced before it. Closing the returned generator (or leaving
+    the loop consuming it) stops the producer, closes the iterable and
+    waits for the thread.
+
+    Args:
+        items: Iterable to consume in the background, e.g. a generator.
+        maxsize: Maximum number of items produced ahead of the caller.
+        name: Name of the producer thread.
+
+    Yields:
+        The items of the iterable, in order.
+    """
+    if maxsize < 1:
+        raise ValueError(f"maxsize must be positive, got {maxsize}")
+
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item: object, error: Optional[BaseException] = None) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put((item, error), timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as exc:
+            put(_DONE, exc)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.wrapper.databricks_wrapper import DatabricksClient
+
+logger = logging.getLogger(__name__)
+
+# Default upper bound (in bytes) of the whole cache directory.
+DEFAULT_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+ENTRY_FILE = "entry.json"
+
+_TABLE_PATTERN = re.compile(
+    r"\b(?:FROM|JOIN)\s+((?:`[^`]+`|[\w]+)(?:\.(?:`[^`]+`|\w+))*)", re.IGNORECASE
+)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that cosmetic edits do not change its cache key.
+
+    Line comments are removed, whitespace is collapsed and a trailing
+    semicolon is dropped. Case is preserved, since string literals are
+    case-sensitive.
+    """
+    without_comments = re.sub(r"--[^\n]*", "", query)
+    return " ".join(without_comments.split()).rstrip(";").strip()
+
+
+def source_tables(query: str) -> List[str]:
+    """Best-effort list of the tables read by a query (FROM / JOIN targets)."""
+    tables: List[str] = []
+    for match in _TABLE_PATTERN.finditer(query):
+        table = match.group(1)
+        if table not in tables:
+            tables.append(table)
+    return tables
+
+
+def resolve_cache_key(
+    client: DatabricksClient,
+    query: str,
+    tables: Optional[Sequence[str]] = None,
+) -> Optional[str]:
+    """Build the cache key of a query from its text and its source versions.
+
+    The key changes whenever the normalized query or the Delta version of
+    any source table changes, so a cached result is never stale.
+
+    Args:
+        client: Open Databricks client, used to read the table versions.
+        query: SQL query to cache.
+        tables: Source tables of the query. Detected from the FROM / JOIN
+            clauses when not given.
+
+    Returns:
+        The key, or None when the result cannot be cached safely (no source
+        table found, or a source without Delta history such as a view).
+    """
+    tables = list(tables) if tables else source_tables(query)
+    if not tables:
+        logger.warning("No source table found in the query, bypassing the cache")
+        return None
+
+    versions: Dict[str, int] = {}
+    for table in tables:
+        try:
+            versions[table] = client.table_version(table)
+        except Exception as exc:
+            logger.warning(
+                "No Delta version for %s (%s), bypassing the cache", table, exc
+            )
+            return None
+
+    payload = json.dumps(
+        {"query": normalize_query(query), "tables": versions}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    Content-addressed, on-disk cache of query results as Parquet shards.
+    Each entry is a directory named after its key; the least recently used
+    entries are evicted when the cache grows beyond max_bytes.
+    """
+
+    # Shared by all instances, so concurrent extracts of one run (each with
+    # its own QueryCache) do not evict or publish entries at the same time
+    _lock = threading.Lock()
+
+    def __init__(
+        self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+    ) -> None:
+        if max_bytes < 1:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+        self._cache_dir = Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[List[Path]]:
+        """Return the cached shards of a key, or None on a cache miss."""
+        entry_dir = self._cache_dir / key
+        entry_file = entry_dir / ENTRY_FILE
+        with self._lock:
+            if not entry_file.exists():
+                return None
+            entry = json.loads(entry_file.read_text(encoding="utf-8"))
+            shards = [entry_dir / name for name in entry["shards"]]
+            if not all(shard.exists() for shard in shards):
+                logger.warning("Incomplete cache entry %s, discarding it", key)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return None
+
+            # The entry file mtime is the LRU access time
+            os.utime(entry_file)
+
+        logger.info("Query cache hit %s (%d shards)", key[:12], len(shards))
+        return shards
+
+    def put(self, key: str, shards: Sequence[Path], query: str = "") -> List[Path]:
+        """Move freshly extracted shards into the cache.
+
+        Args:
+            key: Cache key of the query.
+            shards: Parquet shards holding the query result, in load order.
+            query: Query text, stored for troubleshooting.
+
+        Returns:
+            Paths of the shards inside the cache, or the original paths when
+            the result is larger than the whole cache.
+        """
+        size = sum(Path(shard).stat().st_size for shard in shards)
+        if size > self._max_bytes:
+            logger.warning(
+                "Result of %d bytes exceeds the cache size, not caching it", size
+            )
+            return list(shards)
+
+        entry_dir = self._cache_dir / key
+        staging_dir = self._cache_dir / f".tmp-{key}-{uuid.uuid4().hex}"
+        staging_dir.mkdir()
+        names = []
+        for shard in shards:
+            shutil.move(str(shard), staging_dir / Path(shard).name)
+            names.append(Path(shard).name)
+        (staging_dir / ENTRY_FILE).write_text(
+            json.dumps(
+                {
+                    "shards": names,
+                    "bytes": size,
+                    "query": normalize_query(query),
+                    "created": time.time(),
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+        with self._lock:
+            if entry_dir.exists():
+                # Cached concurrently by another run: keep the existing entry
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            else:
+                staging_dir.rename(entry_dir)
+            self._evict(keep=key)
+
+        logger.info("Cached query result %s (%d bytes)", key[:12], size)
+        return [entry_dir / name for name in names]
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        total = 0
+        for entry_dir in self._cache_dir.iterdir():
+            entry_file = entry_dir / ENTRY_FILE
+            if entry_dir.name.startswith(".") or not entry_file.exists():
+                continue
+            size = sum(path.stat().st_size for path in entry_dir.iterdir())
+            entries.append((entry_file.stat().st_mtime, size, entry_dir))
+            total += size
+
+        # Least recently used first
+        for _, size, entry_dir in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self._max_bytes:
+                break
+            if entry_dir.name == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logger.info("Evicted query cache entry %s", entry_dir.name[:12])
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import logging
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from src.wrapper.config import ConfigWrapper, StagingSettings
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the per-run directories, used to find those left by failed runs.
+RUN_DIR_PREFIX = "run-"
+
+
+def ensure_free_space(directory: Path, nbytes: int, min_free_bytes: int) -> None:
+    """Check that writing nbytes leaves min_free_bytes free on a file system.
+
+    Raises:
+        RuntimeError: If the file system holding directory is too full.
+    """
+    free = shutil.disk_usage(directory).free
+    if free - nbytes < min_free_bytes:
+        raise RuntimeError(
+            f"Not enough free space to stage {nbytes} bytes in {directory}: "
+            f"{free} bytes free, {min_free_bytes} bytes must stay free"
+        )
+
+
+class StagingWorkspace:
+    """
+    Per-run directory holding the intermediate files of one extract.
+    Each run stages into its own directory, so files of earlier runs can
+    never be loaded again. The directory is removed when the run succeeds,
+    and kept for debugging when it fails (unless disabled); kept
+    directories are removed after the retention period.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_dir: Path,
+        settings: Optional[StagingSettings] = None,
+    ) -> None:
+        # Runs stage under <staging root>/<name>, or base_dir without root
+        self._settings = settings or ConfigWrapper().staging_settings
+        self.root = (
+            Path(self._settings.root) / name if self._settings.root else base_dir
+        )
+        self.path = self.root / (
+            f"{RUN_DIR_PREFIX}{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        )
+
+    def __enter__(self) -> "StagingWorkspace":
+        self._prune()
+        self.path.mkdir(parents=True)
+        logger.debug("Staging into %s", self.path)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and self._settings.keep_on_failure:
+            logger.warning("Run failed, staged files kept in %s", self.path)
+            return
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @property
+    def min_free_bytes(self) -> int:
+        """Free space to leave on the staging file system."""
+        return self._settings.min_free_bytes
+
+    def subdir(self, name: str) -> Path:
+        """Create (if needed) and return a subdirectory of the run."""
+        path = self.path / name
+        path.mkdir(exist_ok=True)
+        return path
+
+    def ensure_free_space(self, nbytes: int) -> None:
+        """Check that nbytes can be spilled, keeping the free space margin."""
+        ensure_free_space(self.path, nbytes, self._settings.min_free_bytes)
+
+    def _prune(self) -> None:
+        """Remove the directories kept by failed runs past their retention."""
+        if not self.root.is_dir():
+            return
+        cutoff = time.time() - self._settings.retention_days * 86400
+        for run_dir in self.root.glob(f"{RUN_DIR_PREFIX}*"):
+            if run_dir.is_dir() and run_dir.stat().st_mtime < cutoff:
+                shutil.rmtree(run_dir, ignore_errors=True)
+                logger.info("Removed staged files of a failed run: %s", run_dir)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter.
+
+    The delay is drawn uniformly between 0 and base * 2**attempt (capped),
+    so that clients throttled at the same time do not retry in lockstep.
+
+    Args:
+        attempt: Number of failed attempts so far, starting at 0.
+        base: Upper bound of the first delay, in seconds.
+        cap: Maximum delay, in seconds.
+
+    Returns:
+        Delay in seconds.
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted to the responses of a rate-limited service.
+
+    Follows additive increase / multiplicative decrease: the limit grows by
+    one after a full window of successes and is halved when the service
+    throttles a request, between minimum and maximum.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1) -> None:
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError(
+                f"Expected 1 <= minimum <= initial <= maximum, got "
+                f"{minimum}, {initial}, {maximum}"
+            )
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._active = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current number of operations allowed to run at the same time."""
+        with self._condition:
+            return int(self._limit)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the concurrency slots while the block runs."""
+        with self._condition:
+            while self._active >= int(self._limit):
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def on_success(self) -> None:
+        with self._condition:
+            previous = int(self._limit)
+            self._limit = min(self._maximum, self._limit + 1 / self._limit)
+            if int(self._limit) > previous:
+                logger.info("Concurrency raised to %d", int(self._limit))
+                self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            previous = int(self._limit)
+            self._limit = max(self._minimum, self._limit / 2)
+            if int(self._limit) < previous:
+                logger.warning("Throttled: concurrency lowered to %d", int(self._limit))
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import pyarrow as pa
+from tableauhyperapi import (
+    NOT_NULLABLE,
+    NULLABLE,
+    Connection,
+    Name,
+    SqlType,
+    TableDefinition,
+    TableName,
+)
+
+from src.utils.hyper_schema import (
+    SchemaOverrides,
+    column_spec,
+    databricks_to_sql_type,
+    sql_type_name,
+    storable_sql_type,
+)
+
+logger = logging.getLogger(__name__)
+
+# Helper column numbering the rows of each key when deduplicating.
+_ROW_NUMBER_COLUMN = Name("__transform_row_number")
+
+
+@dataclass(frozen=True)
+class Transform:
+    """Declarative reshaping of the source rows, run by Hyper while loading.
+
+    The transform is compiled into the SELECT that reads the staged files,
+    so the work is done by Hyper's multithreaded engine in the same pass
+    that ingests the data.
+
+    Attributes:
+        filter: SQL condition over the source columns; rows for which it is
+            not true are dropped, e.g. "amount > 0".
+        rename: New names of source columns, keyed by source name.
+        drop: Source columns that are not loaded.
+        derive: SQL expressions over the source columns, keyed by the name
+            of the column they add, e.g. {"year": "EXTRACT(YEAR FROM day)"}.
+        casts: Types of output columns, keyed by output name: SqlType or
+            Databricks type name such as "decimal(12,2)".
+        dedup_on: Output columns identifying a row; one row is kept per
+            distinct key.
+        dedup_order: ORDER BY clause over the output columns choosing the
+            row kept per key, e.g. "updated_at DESC". Any row when not set.
+    """
+
+    filter: Optional[str] = None
+    rename: Mapping[str, str] = field(default_factory=dict)
+    drop: Sequence[str] = field(default_factory=tuple)
+    derive: Mapping[str, str] = field(default_factory=dict)
+    casts: Mapping[str, Union[SqlType, str]] = field(default_factory=dict)
+    dedup_on: Sequence[str] = field(default_factory=tuple)
+    dedup_order: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.dedup_order and not self.dedup_on:
+            raise ValueError("dedup_order requires dedup_on columns")
+
+
+@dataclass(frozen=True)
+class CompiledTransform:
+    """SELECT statement applying a transform to a source.
+
+    Attributes:
+        sql: SELECT statement producing the output rows.
+        columns: Output column names, in order.
+        sources: Source column of the output columns that are copied (and
+            possibly renamed or cast) from the source.
+    """
+
+    sql: str
+    columns: List[str]
+    sources: Dict[str, str]
+
+
+def compile_transform(
+    transform: Transform, source_sql: str, source_columns: Sequence[str]
+) -> CompiledTransform:
+    """Compile a transform into a SELECT over a source.
+
+    Args:
+        transform: Transform to apply.
+        source_sql: FROM-clause fragment reading the source rows (a table
+            name or an external() call).
+        source_columns: Columns of the source, in order.
+
+    Returns:
+        The compiled SELECT and its output columns.
+
+    Raises:
+        ValueError: If the transform references unknown columns or produces
+            the same output column twice.
+    """
+    unknown = sorted(
+        (set(transform.rename) | set(transform.drop)) - set(source_columns)
+    )
+    if unknown:
+        raise ValueError(f"Transform of unknown source columns: {unknown}")
+
+    projection: List[Tuple[str, str]] = []
+    sources: Dict[str, str] = {}
+    for column in source_columns:
+        if column in transform.drop:
+            continue
+        output = transform.rename.get(column, column)
+        projection.append((output, str(Name(column))))
+        sources[output] = column
+    for output, expression in transform.derive.items():
+        projection.append((output, f"({expression})"))
+        sources.pop(output, None)
+
+    columns = [output for output, _ in projection]
+    duplicates = sorted({c for c in columns if columns.count(c) > 1})
+    if duplicates:
+        raise ValueError(f"Transform produces duplicate columns: {duplicates}")
+    unknown = sorted((set(transform.casts) | set(transform.dedup_on)) - set(columns))
+    if unknown:
+        raise ValueError(f"Transform of unknown output columns: {unknown}")
+
+    select_items = []
+    for output, expression in projection:
+        if output in transform.casts:
+            expression = f"CAST({expression} AS {_cast_type(transform.casts[output])})"
+        select_items.append(f"{expression} AS {Name(output)}")
+
+    sql = f"SELECT {', '.join(select_items)} FROM {source_sql}"
+    if transform.filter:
+        sql += f" WHERE {transform.filter}"
+
+    if transform.dedup_on:
+        keys_sql = ", ".join(str(Name(key)) for key in transform.dedup_on)
+        order_sql = (
+            f" ORDER BY {transform.dedup_order}" if transform.dedup_order else ""
+        )
+        columns_sql = ", ".join(str(Name(column)) for column in columns)
+        sql = (
+            f"SELECT {columns_sql} FROM (SELECT *, ROW_NUMBER() OVER "
+            f"(PARTITION BY {keys_sql}{order_sql}) AS {_ROW_NUMBER_COLUMN} "
+            f"FROM ({sql}) AS transformed) AS ranked "
+            f"WHERE {_ROW_NUMBER_COLUMN} = 1"
+        )
+
+    return CompiledTransform(sql=sql, columns=columns, sources=sources)
+
+
+def transformed_table_definition(
+    connection: Connection,
+    compiled: CompiledTransform,
+    table_name: TableName,
+    source_schema: pa.Schema,
+    overrides: Optional[SchemaOverrides] = None,
+) -> TableDefinition:
+    """Build the definition of a table receiving transformed rows.
+
+    Column types are those Hyper gives the compiled SELECT, with numerics
+    too wide for an extract stored as DOUBLE PRECISION. Columns copied
+    from a NOT NULL source field stay NOT NULL; others are nullable.
+
+    Args:
+        connection: Open connection able to read the source.
+        compiled: Compiled transform.
+        table_name: Fully qualified Hyper table name.
+        source_schema: Arrow schema of the source.
+        overrides: Optional per-column overrides keyed by output column.
+
+    Returns:
+        TableDefinition with one column per output column.
+    """
+    overrides = overrides or {}
+    unknown = set(overrides) - set(compiled.columns)
+    if unknown:
+        raise ValueError(f"Schema overrides for unknown columns: {sorted(unknown)}")
+
+    with connection.execute_query(
+        f"SELECT * FROM ({compiled.sql}) AS typed LIMIT 0"
+    ) as result:
+        result_types = {
+            column.name.unescaped: column.type for column in result.schema.columns
+        }
+
+    columns = []
+    for output in compiled.columns:
+        spec = column_spec(overrides.get(output))
+        sql_type = result_types[output]
+        if spec.sql_type is not None:
+            sql_type = _sql_type(spec.sql_type)
+        sql_type = storable_sql_type(sql_type, output)
+
+        nullable = spec.nullable
+        if nullable is None:
+            source = compiled.sources.get(output)
+            nullable = source is None or source_schema.field(source).nullable
+        columns.append(
+            TableDefinition.Column(
+                output, sql_type, NULLABLE if nullable else NOT_NULLABLE
+            )
+        )
+    return TableDefinition(table_name=table_name, columns=columns)
+
+
+def _sql_type(sql_type: Union[SqlType, str]) -> SqlType:
+    return databricks_to_sql_type(sql_type) if isinstance(sql_type, str) else sql_type
+
+
+def _cast_type(sql_type: Union[SqlType, str]) -> str:
+    return sql_type_name(_sql_type(sql_type))
@@ -30,6 +30,51 @@ class DatabricksCredentials:
     databricks_token: str
 
 
+@dataclass(frozen=True)
+class DatabricksSettings:
+    # Idle sessions kept open for reuse across clients of the process
+    pool_size: int = 4
+    # Sessions older than this (seconds) are closed instead of reused
+    max_session_age: float = 3600.0
+    # Idle sessions are checked with a trivial query before reuse when
+    # unused for longer than this (seconds)
+    health_check_after: float = 60.0
+    # Rows per fetch round trip; None uses the requested batch size
+    arraysize: Optional[int] = None
+    # Parallel downloads of cloud fetch result files
+    max_download_threads: int = 10
+    # Download large results from cloud storage instead of through the
+    # warehouse
+    use_cloud_fetch: bool = True
+
+
+@dataclass(frozen=True)
+class HyperSettings:
+    telemetry: bool = True
+    memory_limit: Optional[str] = None
+    thread_limit: Optional[int] = None
+    log_dir: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class StagingSettings:
+    # Root of the per-run staging directories, e.g. a tmpfs or local NVMe
+    # mount; None stages under the work directory of each extract
+    root: Optional[str] = None
+    # Free space (bytes) left on the staging file system when spilling
+    min_free_bytes: int = 1024 * 1024 * 1024
+    # Keep the staged files of failed runs for debugging
+    keep_on_failure: bool = True
+    # Staged files kept from failed runs are removed after this many days
+    retention_days: float = 7.0
+
+
+@dataclass(frozen=True)
+class MetricsSettings:
+    json_logs: bool = True
+    prometheus_textfile: Optional[str] = None
+
+
 class ConfigWrapper(metaclass=Singleton):
     """
     Centralised config access.
@@ -49,6 +94,36 @@ class ConfigWrapper(metaclass=Singleton):
             databricks_http_path=os.getenv("databricks_http_path", ""),
             databricks_token=os.getenv("databricks_token", ""),
         )
+        self._databricks_settings = DatabricksSettings(
+            pool_size=int(os.getenv("databricks_pool_size") or 4),
+            max_session_age=float(os.getenv("databricks_max_session_age") or 3600),
+            health_check_after=float(os.getenv("databricks_health_check_after") or 60),
+            arraysize=int(os.getenv("databricks_arraysize") or 0) or None,
+            max_download_threads=int(
+                os.getenv("databricks_max_download_threads") or 10
+            ),
+            use_cloud_fetch=(
+                os.getenv("databricks_use_cloud_fetch", "true").lower() != "false"
+            ),
+        )
+        self._hyper_settings = HyperSettings(
+            telemetry=os.getenv("hyper_telemetry", "true").lower() != "false",
+            memory_limit=os.getenv("hyper_memory_limit") or None,
+            thread_limit=int(os.getenv("hyper_thread_limit") or 0) or None,
+            log_dir=os.getenv("hyper_log_dir") or None,
+        )
+        self._staging_settings = StagingSettings(
+            root=os.getenv("staging_root") or None,
+            min_free_bytes=int(os.getenv("staging_min_free_mb") or 1024) * 1024 * 1024,
+            keep_on_failure=(
+                os.getenv("staging_keep_on_failure", "true").lower() != "false"
+            ),
+            retention_days=float(os.getenv("staging_retention_days") or 7),
+        )
+        self._metrics_settings = MetricsSettings(
+            json_logs=os.getenv("metrics_json_logs", "true").lower() != "false",
+            prometheus_textfile=os.getenv("metrics_prometheus_textfile") or None,
+        )
 
     @property
     def tab_cred(self) -> TabCredentials:
@@ -75,3 +150,19 @@ class ConfigWrapper(metaclass=Singleton):
         ]
         if missing:
             raise ValueError(f"Missing Databricks config vars: {missing}")
+
+    @property
+    def databricks_settings(self) -> DatabricksSettings:
+        return self._databricks_settings
+
+    @property
+    def hyper_settings(self) -> HyperSettings:
+        return self._hyper_settings
+
+    @property
+    def staging_settings(self) -> StagingSettings:
+        return self._staging_settings
+
+    @property
+    def metrics_settings(self) -> MetricsSettings:
+        return self._metrics_settings
@@ -1,24 +1,172 @@
 from __future__ import annotations
 
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional
+
+import pyarrow as pa
+import requests
 from databricks import sql
+from databricks.sql.exc import NonRecoverableNetworkError, OperationalError
 
-from src.wrapper.config import ConfigWrapper
+from src.utils.metrics import track_stage
+from src.wrapper.config import ConfigWrapper, Singleton
 
+logger = logging.getLogger(__name__)
 
-class DatabricksClient:
+# Default number of rows requested per fetchmany_arrow() call.
+DEFAULT_BATCH_SIZE = 100_000
+
+# Default upper bound (in bytes) for a single Arrow batch held in memory.
+DEFAULT_MAX_BATCH_BYTES = 256 * 1024 * 1024
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether a query failure may succeed when tried again.
+
+    Connection and transport failures are transient; errors of the query
+    itself (bad SQL, missing tables or settings) fail the same way on every
+    attempt.
     """
-    Thin, safe wrapper around databricks-sql-connector.
-    Uses ConfigWrapper for credentials.
+    if isinstance(exc, NonRecoverableNetworkError):
+        return False
+    return isinstance(
+        exc,
+        (
+            OperationalError,
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+
+@dataclass
+class _PooledSession:
+    connection: Any
+    created_at: float
+    last_used: float
+
+
+class DatabricksPool(metaclass=Singleton):
+    """
+    Process-wide pool of Databricks SQL sessions.
+    Clients check a session out instead of connecting, so successive
+    queries of a job skip the TLS handshake, authentication and session
+    setup. Sessions past max_session_age are closed, and sessions idle for
+    a while are health-checked before being handed out again.
     """
 
     def __init__(self) -> None:
+        self._settings = ConfigWrapper().databricks_settings
+        self._idle: List[_PooledSession] = []
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def checkout(self) -> _PooledSession:
+        """Take an idle session from the pool, or open a new one."""
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return self._connect()
+
+            now = time.monotonic()
+            if now - session.created_at > self._settings.max_session_age:
+                logger.debug("Closing Databricks session past its maximum age")
+                self._close(session)
+            elif now - session.last_used > self._settings.health_check_after and (
+                not self._healthy(session)
+            ):
+                logger.info("Discarding unhealthy Databricks session")
+                self._close(session)
+            else:
+                return session
+
+    def release(self, session: _PooledSession, broken: bool = False) -> None:
+        """Return a session to the pool; broken or surplus ones are closed."""
+        session.last_used = time.monotonic()
+        with self._lock:
+            if not broken and len(self._idle) < self._settings.pool_size:
+                self._idle.append(session)
+                return
+        self._close(session)
+
+    def close_all(self) -> None:
+        """Close every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close(session)
+
+    def _connect(self) -> _PooledSession:
         cfg = ConfigWrapper().databricks_cred
+        with track_stage("databricks_connect"):
+            connection = sql.connect(
+                server_hostname=cfg.databricks_server_hostname,
+                http_path=cfg.databricks_http_path,
+                access_token=cfg.databricks_token,
+                use_cloud_fetch=self._settings.use_cloud_fetch,
+                max_download_threads=self._settings.max_download_threads,
+            )
+        now = time.monotonic()
+        return _PooledSession(connection, created_at=now, last_used=now)
+
+    @staticmethod
+    def _healthy(session: _PooledSession) -> bool:
+        try:
+            with session.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception as exc:
+            logger.debug("Databricks session health check failed: %s", exc)
+            return False
+
+    @staticmethod
+    def _close(session: _PooledSession) -> None:
+        try:
+            session.connection.close()
+        except Exception as exc:
+            logger.debug("Error closing Databricks session: %s", exc)
+
+
+class DatabricksClient:
+    """
+    Thin, safe wrapper around databricks-sql-connector.
+    Uses ConfigWrapper for credentials and settings. The session comes from
+    the process-wide DatabricksPool and goes back to it on close().
+    """
+
+    def __init__(self, connection: Optional[Any] = None) -> None:
+        self._settings = ConfigWrapper().databricks_settings
+        self._session: Optional[_PooledSession] = None
+        self._broken = False
+
+        # An already open connection (e.g. a stand-in serving synthetic
+        # data for benchmarks) can be injected instead of connecting
+        if connection is not None:
+            self.connection = connection
+            return
 
-        self.connection = sql.connect(
-            server_hostname=cfg.databricks_server_hostname,
-            http_path=cfg.databricks_http_path,
-            access_token=cfg.databricks_token,
-        )
+        self._session = DatabricksPool().checkout()
+        self.connection = self._session.connection
+
+    @contextmanager
+    def _cursor(self, **kwargs: Any) -> Iterator[Any]:
+        """Open a cursor; a failure marks the session as not reusable."""
+        try:
+            with self.connection.cursor(**kwargs) as cursor:
+                yield cursor
+        except Exception:
+            self._broken = True
+            raise
 
     def execute_query(self, query: str):
         """Execute a SQL query and return a pandas DataFrame using Arrow format.
@@ -28,18 +176,99 @@ class DatabricksClient:
         - Is more efficient for large datasets
         - Handles type conversion automatically
 
+        The whole result set is materialized in memory. For large results,
+        prefer fetch_arrow_batches().
+
         Args:
             query: SQL query to execute
 
         Returns:
             pandas DataFrame with proper data types
         """
-        with self.connection.cursor() as cursor:
+        with self._cursor() as cursor:
+            with track_stage("fetch") as stage:
+                cursor.execute(query)
+                # Use Arrow format for better type preservation and performance
+                table = cursor.fetchall_arrow()
+                stage.add(rows=table.num_rows, bytes_read=table.nbytes)
+
+        with track_stage("dtype_conversion") as stage:
+            df = table.to_pandas()
+            stage.add(rows=len(df), bytes_written=int(df.memory_usage(deep=True).sum()))
+        return df
+
+    def fetch_arrow_batches(
+        self,
+        query: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    ) -> Iterator[pa.Table]:
+        """Execute a SQL query and stream the result as Arrow batches.
+
+        Batches are fetched with fetchmany_arrow() so that only one batch is
+        held in memory at a time. When a batch exceeds max_batch_bytes, the
+        number of rows requested for the following batches is reduced
+        proportionally, which keeps wide rows within the memory budget.
+
+        Args:
+            query: SQL query to execute
+            batch_size: Maximum number of rows fetched per batch
+            max_batch_bytes: Memory budget (in bytes) for a single batch
+
+        Yields:
+            pyarrow Tables containing at most batch_size rows each
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if max_batch_bytes < 1:
+            raise ValueError(f"max_batch_bytes must be positive, got {max_batch_bytes}")
+
+        # arraysize sets the rows per server round trip, independently of the
+        # rows handed out per batch
+        with self._cursor(arraysize=self._settings.arraysize or batch_size) as cursor:
             cursor.execute(query)
-            # Use Arrow format for better type preservation and performance
-            return cursor.fetchall_arrow().to_pandas()
+
+            rows_per_fetch = batch_size
+            while True:
+                table = cursor.fetchmany_arrow(rows_per_fetch)
+                if table.num_rows == 0:
+                    break
+
+                # Shrink the next fetches if this batch blew the memory budget
+                if table.nbytes > max_batch_bytes:
+                    rows_per_fetch = max(
+                        1, int(table.num_rows * max_batch_bytes / table.nbytes)
+                    )
+                    logger.debug(
+                        "Arrow batch of %d bytes exceeds budget, fetching %d rows",
+                        table.nbytes,
+                        rows_per_fetch,
+                    )
+
+                yield table
+
+    def table_version(self, table: str) -> int:
+        """Return the current version of a Delta table.
+
+        Args:
+            table: Table name, as written in queries (e.g. catalog.schema.table)
+
+        Returns:
+            Latest version number from the table history
+        """
+        with self._cursor() as cursor:
+            cursor.execute(f"DESCRIBE HISTORY {table} LIMIT 1")
+            history = cursor.fetchall_arrow()
+
+        if history.num_rows == 0:
+            raise ValueError(f"No history found for table {table}")
+        return int(history.column("version")[0].as_py())
 
     def close(self) -> None:
-        """Close the Databricks connection."""
-        if self.connection:
+        """Return the session to the pool, or close an injected connection."""
+        if self._session is not None:
+            DatabricksPool().release(self._session, broken=self._broken)
+            self._session = None
+        elif self.connection:
             self.connection.close()
+        self.connection = None
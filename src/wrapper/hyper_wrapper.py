@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from tableauhyperapi import Connection, CreateMode, HyperProcess, Telemetry
+
+from src.wrapper.config import ConfigWrapper, HyperSettings, Singleton
+
+logger = logging.getLogger(__name__)
+
+
+class HyperEngine(metaclass=Singleton):
+    """
+    Process-wide, long-lived Hyper engine.
+    Starts a single HyperProcess on first use and hands out connections
+    to any number of .hyper databases, from any thread.
+    """
+
+    def __init__(self) -> None:
+        self._settings = ConfigWrapper().hyper_settings
+        self._process: Optional[HyperProcess] = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    @staticmethod
+    def process_parameters(settings: HyperSettings) -> Dict[str, str]:
+        """Translate the Hyper settings into HyperProcess parameters."""
+        parameters: Dict[str, str] = {}
+        if settings.memory_limit:
+            parameters["memory_limit"] = settings.memory_limit
+        if settings.thread_limit:
+            parameters["hard_concurrent_query_thread_limit"] = str(
+                settings.thread_limit
+            )
+        if settings.log_dir:
+            parameters["log_dir"] = settings.log_dir
+        return parameters
+
+    # ---------- Process lifecycle ----------
+
+    def start(self) -> HyperProcess:
+        with self._lock:
+            if self._process is None or not self._process.is_open:
+                parameters = self.process_parameters(self._settings)
+                self._process = HyperProcess(
+                    telemetry=(
+                        Telemetry.SEND_USAGE_DATA_TO_TABLEAU
+                        if self._settings.telemetry
+                        else Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU
+                    ),
+                    parameters=parameters,
+                )
+                logger.info("Started Hyper process (parameters: %s)", parameters)
+            return self._process
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._process is not None and self._process.is_open:
+                self._process.close()
+                logger.info("Stopped Hyper process")
+            self._process = None
+
+    def __enter__(self) -> "HyperEngine":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.shutdown()
+
+    # ---------- Connections ----------
+
+    @contextmanager
+    def connect(
+        self,
+        database: str | Path,
+        create_mode: CreateMode = CreateMode.CREATE_IF_NOT_EXISTS,
+    ) -> Iterator[Connection]:
+        """Open a connection to a .hyper database on the shared process.
+
+        Connections must not be shared between threads; each thread opens
+        its own. Several connections (to the same or different databases)
+        can be open at the same time.
+
+        Args:
+            database: Path to the .hyper file.
+            create_mode: What to do if the database does or does not exist.
+
+        Yields:
+            Open Connection, closed when the context exits.
+        """
+        process = self.start()
+        with Connection(
+            endpoint=process.endpoint,
+            database=str(database),
+            create_mode=create_mode,
+        ) as connection:
+            yield connection
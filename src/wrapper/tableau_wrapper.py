@@ -1,10 +1,83 @@
 from __future__ import annotations
 
-from typing import Any, Callable, List
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
 import tableauserverclient as TSC
+from tableauserverclient.server import RequestFactory
+from tableauserverclient.server.endpoint.exceptions import InternalServerError
 
-from src.wrapper.config import ConfigWrapper
+from src.utils.throttle import backoff_delay
+from src.wrapper.config import ConfigWrapper, TabCredentials
+
+logger = logging.getLogger(__name__)
+
+BYTES_PER_MB = 1024 * 1024
+
+# Default size of one uploaded chunk, in bytes.
+DEFAULT_CHUNK_SIZE = 50 * BYTES_PER_MB
+
+# Items requested per page, and pages fetched concurrently, when listing.
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_PAGE_WORKERS = 4
+
+# Prefix of the datasource tag holding the fingerprint of the published content.
+FINGERPRINT_TAG_PREFIX = "fingerprint-"
+
+# HTTP statuses of throttled requests (Too Many Requests, Service Unavailable).
+THROTTLING_STATUSES = (429, 503)
+
+# Longest delay between two retries, in seconds.
+MAX_RETRY_BACKOFF = 60.0
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """Whether a tableau-server-client error means the server is throttling."""
+    if isinstance(exc, InternalServerError):
+        return exc.code in THROTTLING_STATUSES
+    if isinstance(exc, TSC.ServerResponseError):
+        return str(exc.code)[:3] in {str(status) for status in THROTTLING_STATUSES}
+    return False
+
+
+@dataclass
+class UploadState:
+    """
+    Progress of a chunked upload, persisted next to the uploaded file
+    so that an interrupted upload can resume from its last committed chunk.
+    """
+
+    upload_session_id: str
+    file_size: int
+    file_mtime_ns: int
+    chunk_size: int
+    committed_chunks: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["UploadState"]:
+        if not path.exists():
+            return None
+        return cls(**json.loads(path.read_text(encoding="utf-8")))
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(asdict(self)), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def matches(self, filepath: Path, chunk_size: int) -> bool:
+        stat = filepath.stat()
+        return (
+            self.file_size == stat.st_size
+            and self.file_mtime_ns == stat.st_mtime_ns
+            and self.chunk_size == chunk_size
+        )
 
 
 class TableauClient:
@@ -13,8 +86,8 @@ class TableauClient:
     Uses ConfigWrapper for credentials.
     """
 
-    def __init__(self) -> None:
-        cfg = ConfigWrapper().tab_cred
+    def __init__(self, cred: Optional[TabCredentials] = None) -> None:
+        cfg = cred or ConfigWrapper().tab_cred
 
         self._server = TSC.Server(
             cfg.site_url,
@@ -55,27 +128,369 @@ class TableauClient:
 
     # ---------- Pagination helper ----------
 
-    def list_all(self, getter: Callable[[TSC.RequestOptions], Any]) -> List[Any]:
-        items: List[Any] = []
-        page = 1
+    def list_all(
+        self,
+        getter: Callable[[TSC.RequestOptions], Any],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_workers: int = DEFAULT_PAGE_WORKERS,
+    ) -> List[Any]:
+        """Fetch every page of a paginated listing.
+
+        The first page is fetched alone to learn the total number of items;
+        the remaining pages are then fetched concurrently and concatenated
+        in page order.
+
+        Args:
+            getter: Endpoint getter taking RequestOptions and returning
+                (items, pagination), e.g. server.datasources.get.
+            page_size: Items requested per page.
+            max_workers: Maximum number of pages fetched concurrently.
 
-        while True:
-            ro = TSC.RequestOptions()
-            ro.paging.page_number = page
-            ro.paging.page_size = 1000
+        Returns:
+            All items, in server order.
+        """
 
-            chunk, pagination = getter(ro)
-            items.extend(chunk)
+        def fetch(page: int) -> Tuple[List[Any], Any]:
+            return getter(TSC.RequestOptions(pagenumber=page, pagesize=page_size))
 
-            if pagination.total_available <= len(items):
-                break
+        first_page, pagination = fetch(1)
+        items: List[Any] = list(first_page)
 
-            page += 1
+        # The server may cap the page size below the requested one
+        served_page_size = int(pagination.page_size or page_size)
+        total_pages = -(-int(pagination.total_available) // served_page_size)
+        if total_pages > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, total_pages - 1),
+                thread_name_prefix="tableau-pages",
+            ) as pool:
+                for page_items, _ in pool.map(fetch, range(2, total_pages + 1)):
+                    items.extend(page_items)
 
         return items
 
     # ---------- Functions ----------
 
+    def find_datasource(
+        self, name: str, project_luid: str
+    ) -> Optional[TSC.DatasourceItem]:
+        """Return the datasource with this name in a project, if any."""
+
+        def getter(ro: TSC.RequestOptions):
+            ro.filter.add(
+                TSC.Filter(
+                    TSC.RequestOptions.Field.Name,
+                    TSC.RequestOptions.Operator.Equals,
+                    name,
+                )
+            )
+            return self._server.datasources.get(ro)
+
+        return next(
+            (
+                item
+                for item in self.list_all(getter)
+                if item.name == name and item.project_id == project_luid
+            ),
+            None,
+        )
+
+    @staticmethod
+    def datasource_fingerprint(item: TSC.DatasourceItem) -> Optional[str]:
+        """Return the content fingerprint stored in the datasource tags."""
+        return next(
+            (
+                tag[len(FINGERPRINT_TAG_PREFIX) :]
+                for tag in item.tags
+                if tag.startswith(FINGERPRINT_TAG_PREFIX)
+            ),
+            None,
+        )
+
+    def set_datasource_fingerprint(
+        self, item: TSC.DatasourceItem, fingerprint: str
+    ) -> None:
+        """Store a content fingerprint as a tag, replacing any previous one."""
+        stale = {tag for tag in item.tags if tag.startswith(FINGERPRINT_TAG_PREFIX)}
+        tag = f"{FINGERPRINT_TAG_PREFIX}{fingerprint}"
+        if stale == {tag}:
+            return
+        if stale:
+            self._server.datasources.delete_tags(item, stale)
+        item.tags = self._server.datasources.add_tags(item, tag)
+
+    def clear_datasource_fingerprint(self, item: TSC.DatasourceItem) -> None:
+        """Remove the content fingerprint, e.g. after changing rows in place."""
+        stale = {tag for tag in item.tags if tag.startswith(FINGERPRINT_TAG_PREFIX)}
+        if stale:
+            self._server.datasources.delete_tags(item, stale)
+            item.tags -= stale
+
     def publish_datasources(self, server, filepath, project_luid, mode):
         new_datasource = TSC.DatasourceItem(project_luid)
-        server.datasources.publish(new_datasource, file=filepath, mode=mode)
+        return server.datasources.publish(new_datasource, file=filepath, mode=mode)
+
+    def publish_datasource_resumable(
+        self,
+        filepath: str | Path,
+        project_luid: str,
+        mode: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        read_ahead: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0,
+    ) -> TSC.DatasourceItem:
+        """Publish a datasource through a resumable, chunked upload session.
+
+        The upload session id and the number of committed chunks are saved
+        to a ``<file>.upload.json`` state file after every chunk. If the run
+        fails, the next call with the same (unchanged) file resumes the
+        session from the last committed chunk instead of starting over.
+
+        Tableau appends chunks to an upload session strictly in order, so
+        chunks are sent one at a time; only reading and encoding run ahead,
+        on a bounded thread pool, while the current chunk is being sent.
+
+        Args:
+            filepath: Path to the .hyper file.
+            project_luid: Target project LUID.
+            mode: Publish mode (CreateNew, Append or Overwrite).
+            chunk_size: Size of each uploaded chunk, in bytes.
+            read_ahead: Number of chunks read and encoded ahead of the one
+                being sent (chunks themselves are never sent concurrently).
+            max_retries: Retries per chunk after a failed request.
+            retry_backoff: Upper bound (seconds) of the jittered delay before
+                the first retry of a chunk, doubled after each further failure.
+
+        Returns:
+            The published DatasourceItem.
+        """
+        filepath = Path(filepath)
+        if not hasattr(TSC.Server.PublishMode, mode):
+            raise ValueError(f"Invalid publish mode: {mode}")
+
+        upload_session_id, state_path = self._upload_resumable(
+            filepath, chunk_size, read_ahead, max_retries, retry_backoff
+        )
+
+        # Commit the upload session as a datasource publish
+        datasource = TSC.DatasourceItem(project_luid)
+        datasource.name = filepath.stem
+        url = (
+            f"{self._server.datasources.baseurl}"
+            f"?uploadSessionId={upload_session_id}"
+            f"&datasourceType={filepath.suffix.lstrip('.')}"
+            f"&{mode.lower()}=true"
+        )
+        xml_request, content_type = RequestFactory.Datasource.publish_req_chunked(
+            datasource
+        )
+        server_response = self._server.datasources.post_request(
+            url, xml_request, content_type
+        )
+        state_path.unlink(missing_ok=True)
+
+        published = TSC.DatasourceItem.from_response(
+            server_response.content, self._server.namespace
+        )[0]
+        logger.info("Published %s (ID: %s)", filepath.name, published.id)
+        return published
+
+    def update_hyper_data(
+        self,
+        datasource_id: str,
+        payload: str | Path,
+        actions: Sequence[Dict[str, Any]],
+        request_id: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        timeout: Optional[float] = None,
+    ) -> TSC.JobItem:
+        """Apply row-level actions to a published Hyper datasource.
+
+        The payload file is sent through the same resumable upload session
+        as publishes, then the actions (insert, upsert, delete, ...) are
+        submitted as an "update hyper data" request and the resulting
+        server job is awaited.
+
+        Args:
+            datasource_id: LUID of the published datasource.
+            payload: Hyper file holding the rows used by the actions.
+            actions: Action batch, as described by the REST API.
+            request_id: Idempotency key: the server runs a request only
+                once per key, so a retried request is not applied twice.
+            chunk_size: Size of each uploaded chunk, in bytes.
+            timeout: Maximum time (seconds) to wait for the job. None waits
+                until it completes.
+
+        Returns:
+            The completed JobItem.
+        """
+        upload_session_id, state_path = self._upload_resumable(
+            Path(payload), chunk_size
+        )
+
+        url = (
+            f"{self._server.datasources.baseurl}/{datasource_id}/data"
+            f"?uploadSessionId={upload_session_id}"
+        )
+        server_response = self._server.datasources.patch_request(
+            url,
+            json.dumps({"actions": list(actions)}),
+            "application/json",
+            parameters={"headers": {"requestid": request_id}},
+        )
+        state_path.unlink(missing_ok=True)
+
+        job = TSC.JobItem.from_response(
+            server_response.content, self._server.namespace
+        )[0]
+        logger.info("Submitted hyper data update of %s (job %s)", datasource_id, job.id)
+        return self._server.jobs.wait_for_job(job, timeout=timeout)
+
+    def _upload_resumable(
+        self,
+        filepath: Path,
+        chunk_size: int,
+        read_ahead: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0,
+    ) -> Tuple[str, Path]:
+        """Upload a file to a resumable upload session.
+
+        Returns:
+            Tuple of (upload session id, state file path). The state file is
+            to be removed by the caller once the session is committed.
+        """
+        state_path = filepath.with_name(filepath.name + ".upload.json")
+        state = UploadState.load(state_path)
+        if state is not None and not state.matches(filepath, chunk_size):
+            logger.info("Discarding upload state for a modified file: %s", filepath)
+            state = None
+
+        resumed = state is not None
+        if state is None:
+            stat = filepath.stat()
+            state = UploadState(
+                upload_session_id=self._server.fileuploads.initiate(),
+                file_size=stat.st_size,
+                file_mtime_ns=stat.st_mtime_ns,
+                chunk_size=chunk_size,
+            )
+            state.save(state_path)
+        else:
+            logger.info(
+                "Resuming upload session %s at chunk %d",
+                state.upload_session_id,
+                state.committed_chunks + 1,
+            )
+
+        try:
+            self._upload_chunks(
+                filepath, state, state_path, read_ahead, max_retries, retry_backoff
+            )
+        except TSC.ServerResponseError as exc:
+            # Upload sessions expire on the server: start a new one once
+            if not resumed or not str(exc.code).startswith("404"):
+                raise
+            logger.warning(
+                "Upload session %s expired, restarting", state.upload_session_id
+            )
+            state.upload_session_id = self._server.fileuploads.initiate()
+            state.committed_chunks = 0
+            state.save(state_path)
+            self._upload_chunks(
+                filepath, state, state_path, read_ahead, max_retries, retry_backoff
+            )
+
+        return state.upload_session_id, state_path
+
+    def _upload_chunks(
+        self,
+        filepath: Path,
+        state: UploadState,
+        state_path: Path,
+        read_ahead: int,
+        max_retries: int,
+        retry_backoff: float,
+    ) -> None:
+        total_chunks = max(1, -(-state.file_size // state.chunk_size))
+
+        def read_chunk(index: int) -> Tuple[bytes, str, int]:
+            with open(filepath, "rb") as f:
+                f.seek(index * state.chunk_size)
+                chunk = f.read(state.chunk_size)
+            request, content_type = RequestFactory.Fileupload.chunk_req(chunk)
+            return request, content_type, len(chunk)
+
+        pending: Deque[Future] = deque()
+        next_index = state.committed_chunks
+
+        with ThreadPoolExecutor(
+            max_workers=read_ahead, thread_name_prefix="tableau-chunk-read"
+        ) as pool:
+            while state.committed_chunks < total_chunks:
+                # Keep up to read_ahead chunks read and encoded ahead; the
+                # appends below stay sequential
+                while next_index < total_chunks and len(pending) < read_ahead:
+                    pending.append(pool.submit(read_chunk, next_index))
+                    next_index += 1
+
+                request, content_type, chunk_bytes = pending.popleft().result()
+                index = state.committed_chunks
+
+                attempt = 0
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = self._server.fileuploads.append(
+                            state.upload_session_id, request, content_type
+                        )
+                        break
+                    except (TSC.ServerResponseError, InternalServerError, OSError):
+                        if attempt >= max_retries:
+                            raise
+                        delay = backoff_delay(attempt, retry_backoff, MAX_RETRY_BACKOFF)
+                        attempt += 1
+                        logger.warning(
+                            "Chunk %d/%d failed, retrying in %.1fs",
+                            index + 1,
+                            total_chunks,
+                            delay,
+                            exc_info=True,
+                        )
+                        time.sleep(delay)
+                elapsed = time.perf_counter() - start
+
+                state.committed_chunks += 1
+                if not _upload_size_matches(item, state):
+                    # The session no longer mirrors the file: drop it so that
+                    # the next run starts a fresh upload
+                    state_path.unlink(missing_ok=True)
+                    raise RuntimeError(
+                        f"Upload session {state.upload_session_id} holds "
+                        f"{item.file_size} MB after chunk {index + 1}, which does "
+                        f"not match the file; the upload must be restarted"
+                    )
+                state.save(state_path)
+
+                logger.info(
+                    "Uploaded chunk %d/%d (%.1f MB) at %.1f MB/s",
+                    index + 1,
+                    total_chunks,
+                    chunk_bytes / BYTES_PER_MB,
+                    chunk_bytes / BYTES_PER_MB / max(elapsed, 1e-9),
+                )
+
+
+def _upload_size_matches(item: Any, state: UploadState) -> bool:
+    """Detect chunks that were appended twice (or lost) by the server.
+
+    Tableau reports the session size in whole megabytes, so a mismatch of
+    more than one megabyte means that the session content no longer matches
+    the file, e.g. when a retried request had in fact been received.
+    """
+    if item.file_size is None:
+        return True
+
+    expected_bytes = min(state.committed_chunks * state.chunk_size, state.file_size)
+    return abs(float(item.file_size) - expected_bytes / BYTES_PER_MB) <= 1
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+# Read once by ConfigWrapper: keep Hyper logs out of the working directory
+# and usage data off for test runs
+os.environ.setdefault("hyper_telemetry", "false")
+os.environ.setdefault("hyper_log_dir", tempfile.mkdtemp(prefix="hyper-logs-"))
+
+from src.scripts.benchmark.mock_tableau_server import (  # noqa: E402
+    MockProject,
+    MockTableauServer,
+)
+from src.scripts.benchmark.publish_checks import PROJECT_LUID  # noqa: E402
+
+
+@pytest.fixture
+def mock_server() -> Iterator[MockTableauServer]:
+    """A fresh mock Tableau server, with the project of the publish checks."""
+    with MockTableauServer() as server:
+        server.state.projects[PROJECT_LUID] = MockProject(PROJECT_LUID, "Checks")
+        yield server
+
+
+@pytest.fixture
+def hyper_path(tmp_path: Path) -> Path:
+    return tmp_path / "test.hyper"
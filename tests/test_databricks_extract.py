@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List
+
+import pytest
+import requests
+from databricks.sql.exc import (
+    NonRecoverableNetworkError,
+    RequestError,
+    ServerOperationError,
+)
+
+from src.utils import databricks_extract
+from src.utils.databricks_extract import extract_partitions_to_parquet
+from src.utils.partitioning import Partition
+from src.wrapper.databricks_wrapper import is_transient_error
+
+
+@pytest.mark.parametrize(
+    "exc, transient",
+    [
+        (RequestError("connection reset"), True),
+        (requests.ConnectionError("refused"), True),
+        (TimeoutError("timed out"), True),
+        (NonRecoverableNetworkError("unauthorized"), False),
+        (ServerOperationError("syntax error"), False),
+        (KeyError("databricks_token"), False),
+    ],
+)
+def test_is_transient_error(exc: Exception, transient: bool):
+    assert is_transient_error(exc) is transient
+
+
+@pytest.mark.parametrize(
+    "exc, attempts",
+    [(RequestError("connection reset"), 3), (ServerOperationError("bad sql"), 1)],
+)
+def test_partitions_are_retried_on_transient_errors_only(
+    exc: Exception, attempts: int, tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr(databricks_extract.time, "sleep", lambda seconds: None)
+    calls: List[int] = []
+
+    def client_factory():
+        calls.append(1)
+        raise exc
+
+    with pytest.raises(RuntimeError) as info:
+        extract_partitions_to_parquet(
+            "SELECT 1",
+            [Partition("p00000", "1 = 1")],
+            tmp_path,
+            "test",
+            max_retries=2,
+            client_factory=client_factory,
+        )
+
+    assert info.value.__cause__ is exc
+    assert len(calls) == attempts
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import pytest
+from tableauhyperapi import CreateMode, TableName
+
+from src.utils.hyper_fingerprint import CONTENT, FILE, hyper_fingerprint
+from src.wrapper.hyper_wrapper import HyperEngine
+
+TABLE = TableName("Extract", "Extract")
+
+
+def _build(hyper_path: Path, rows: Sequence[Tuple[int, str]]) -> Path:
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_AND_REPLACE
+    ) as connection:
+        connection.catalog.create_schema_if_not_exists(TABLE.schema_name)
+        connection.execute_command(f"CREATE TABLE {TABLE} (id INT, value TEXT)")
+        connection.execute_command(
+            f"INSERT INTO {TABLE} VALUES "
+            + ", ".join(f"({key}, '{value}')" for key, value in rows)
+        )
+    return hyper_path
+
+
+def test_content_fingerprint_ignores_row_order(tmp_path: Path):
+    first = _build(tmp_path / "first.hyper", [(1, "a"), (2, "b")])
+    second = _build(tmp_path / "second.hyper", [(2, "b"), (1, "a")])
+
+    assert hyper_fingerprint(first, CONTENT) == hyper_fingerprint(second, CONTENT)
+
+
+def test_content_fingerprint_changes_with_the_rows(tmp_path: Path):
+    first = _build(tmp_path / "first.hyper", [(1, "a"), (2, "b")])
+    changed = _build(tmp_path / "changed.hyper", [(1, "a"), (2, "c")])
+    appended = _build(tmp_path / "appended.hyper", [(1, "a"), (2, "b"), (2, "b")])
+
+    fingerprints = {
+        hyper_fingerprint(path, CONTENT) for path in (first, changed, appended)
+    }
+    assert len(fingerprints) == 3
+
+
+def test_file_fingerprint_matches_copies_only(tmp_path: Path):
+    first = _build(tmp_path / "first.hyper", [(1, "a")])
+    copy = tmp_path / "copy.hyper"
+    shutil.copyfile(first, copy)
+    changed = _build(tmp_path / "changed.hyper", [(2, "a")])
+
+    assert hyper_fingerprint(first, FILE) == hyper_fingerprint(copy, FILE)
+    assert hyper_fingerprint(first, FILE) != hyper_fingerprint(changed, FILE)
+
+
+def test_unknown_method_is_rejected(tmp_path: Path):
+    with pytest.raises(ValueError):
+        hyper_fingerprint(_build(tmp_path / "first.hyper", [(1, "a")]), "mtime")
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import pytest
+from tableauhyperapi import Connection, CreateMode, TableName
+
+from src.utils.incremental import (
+    APPEND,
+    UPSERT,
+    IncrementalConfig,
+    apply_delta,
+    delta_path,
+)
+from src.wrapper.hyper_wrapper import HyperEngine
+
+TARGET = TableName("Extract", "Extract")
+SOURCE = "delta_source"
+COLUMNS = ["id", "value"]
+
+
+@pytest.fixture
+def connection(hyper_path: Path) -> Iterator[Connection]:
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_AND_REPLACE
+    ) as connection:
+        connection.catalog.create_schema_if_not_exists(TARGET.schema_name)
+        connection.execute_command(f"CREATE TABLE {TARGET} (id INT, value TEXT)")
+        connection.execute_command(
+            f"INSERT INTO {TARGET} VALUES (1, 'a'), (2, 'b'), (3, 'c')"
+        )
+        connection.execute_command(
+            f"CREATE TEMPORARY TABLE {SOURCE} (id INT, value TEXT)"
+        )
+        yield connection
+
+
+def _rows(connection: Connection, table: str) -> List[Tuple[int, str]]:
+    return [
+        tuple(row)
+        for row in connection.execute_list_query(
+            f"SELECT id, value FROM {table} ORDER BY id, value"
+        )
+    ]
+
+
+def test_append_applies_rows_above_the_watermark(connection: Connection):
+    connection.execute_command(
+        f"INSERT INTO {SOURCE} VALUES (2, 'old'), (3, 'old'), (4, 'd'), (5, 'e')"
+    )
+
+    applied, watermark = apply_delta(
+        connection, TARGET, SOURCE, COLUMNS, IncrementalConfig("id"), watermark=3
+    )
+
+    assert (applied, watermark) == (2, 5)
+    assert _rows(connection, str(TARGET)) == [
+        (1, "a"),
+        (2, "b"),
+        (3, "c"),
+        (4, "d"),
+        (5, "e"),
+    ]
+
+
+def test_upsert_replaces_rows_sharing_the_key(connection: Connection):
+    # Keyed on value: (4, 'b') replaces the row (2, 'b')
+    connection.execute_command(f"INSERT INTO {SOURCE} VALUES (4, 'b'), (5, 'e')")
+    config = IncrementalConfig("id", mode=UPSERT, key_columns=["value"])
+
+    applied, watermark = apply_delta(
+        connection, TARGET, SOURCE, COLUMNS, config, watermark=3
+    )
+
+    assert (applied, watermark) == (2, 5)
+    assert _rows(connection, str(TARGET)) == [(1, "a"), (3, "c"), (4, "b"), (5, "e")]
+
+
+def test_empty_delta_keeps_the_watermark(connection: Connection):
+    connection.execute_command(f"INSERT INTO {SOURCE} VALUES (1, 'a')")
+
+    applied, watermark = apply_delta(
+        connection, TARGET, SOURCE, COLUMNS, IncrementalConfig("id"), watermark=3
+    )
+
+    assert (applied, watermark) == (0, 3)
+    assert len(_rows(connection, str(TARGET))) == 3
+
+
+def test_delta_file_holds_the_applied_rows(connection: Connection, hyper_path: Path):
+    connection.execute_command(f"INSERT INTO {SOURCE} VALUES (3, 'old'), (4, 'd')")
+    delta_file = delta_path(hyper_path)
+
+    apply_delta(
+        connection,
+        TARGET,
+        SOURCE,
+        COLUMNS,
+        IncrementalConfig("id"),
+        watermark=3,
+        delta_file=delta_file,
+    )
+
+    assert delta_file == hyper_path.parent / "delta" / hyper_path.name
+    with HyperEngine().connect(delta_file, create_mode=CreateMode.NONE) as delta:
+        assert _rows(delta, str(TARGET)) == [(4, "d")]
+
+
+def test_incremental_config_validation():
+    assert IncrementalConfig("id").mode == APPEND
+    with pytest.raises(ValueError):
+        IncrementalConfig("id", mode="merge")
+    with pytest.raises(ValueError):
+        IncrementalConfig("id", mode=UPSERT)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import datetime as dt
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pytest
+from tableauhyperapi import CreateMode
+
+from src.utils.partitioning import (
+    Partition,
+    filter_query,
+    hash_partitions,
+    list_partitions,
+    range_partitions,
+)
+from src.wrapper.hyper_wrapper import HyperEngine
+
+
+def _predicates(partitions: Sequence[Partition]) -> List[str]:
+    return [partition.predicate for partition in partitions]
+
+
+def test_range_partitions_first_and_last_are_unbounded():
+    partitions = range_partitions("x", 0, 25, 10)
+
+    assert _predicates(partitions) == [
+        "x < 10",
+        "x >= 10 AND x < 20",
+        "x >= 20",
+        "x IS NULL",
+    ]
+    assert [partition.name for partition in partitions] == [
+        "p00000",
+        "p00001",
+        "p00002",
+        "p00003",
+    ]
+
+
+def test_range_partitions_single_range_matches_every_value():
+    assert _predicates(range_partitions("x", 0, 5, 10, include_nulls=False)) == [
+        "x IS NOT NULL"
+    ]
+
+
+def test_range_partitions_dates():
+    partitions = range_partitions(
+        "day", dt.date(2024, 1, 1), dt.date(2024, 1, 3), dt.timedelta(days=1)
+    )
+
+    assert _predicates(partitions) == [
+        "day < DATE'2024-01-02'",
+        "day >= DATE'2024-01-02'",
+        "day IS NULL",
+    ]
+
+
+@pytest.mark.parametrize(
+    "start, end, step",
+    [(10, 10, 1), (10, 0, 1), (0, 10, 0), (0, 10, -1)],
+)
+def test_range_partitions_rejects_empty_ranges_and_steps(start, end, step):
+    with pytest.raises(ValueError):
+        range_partitions("x", start, end, step)
+
+
+def test_range_partitions_cover_every_row_once(hyper_path: Path):
+    # Values below start, above end, on every bound and NULL
+    values: List[Optional[int]] = [None, *range(-5, 31)]
+    partitions = range_partitions("x", 0, 25, 10)
+
+    with HyperEngine().connect(
+        hyper_path, create_mode=CreateMode.CREATE_AND_REPLACE
+    ) as connection:
+        connection.execute_command("CREATE TEMPORARY TABLE source (x INT)")
+        connection.execute_command(
+            "INSERT INTO source VALUES "
+            + ", ".join(f"({'NULL' if v is None else v})" for v in values)
+        )
+        matches = [
+            connection.execute_scalar_query(
+                f"SELECT COUNT(*) FROM source WHERE {partition.predicate}"
+            )
+            for partition in partitions
+        ]
+
+    assert sum(matches) == len(values)
+    assert matches == [5 + 10, 10, 11, 1]
+
+
+def test_list_partitions():
+    assert _predicates(list_partitions("country", ["FR", None, "it's"])) == [
+        "country = 'FR'",
+        "country IS NULL",
+        "country = 'it\\'s'",
+    ]
+    with pytest.raises(ValueError):
+        list_partitions("country", [])
+
+
+def test_hash_partitions():
+    assert _predicates(hash_partitions("id", 2)) == [
+        "pmod(hash(id), 2) = 0",
+        "pmod(hash(id), 2) = 1",
+    ]
+    with pytest.raises(ValueError):
+        hash_partitions("id", 0)
+
+
+def test_filter_query_wraps_the_query():
+    assert filter_query("SELECT * FROM t;", "x > 1") == (
+        "SELECT * FROM (SELECT * FROM t) AS src WHERE x > 1"
+    )
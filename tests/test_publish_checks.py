@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from src.scripts.benchmark.mock_tableau_server import MockTableauServer
+from src.scripts.benchmark.publish_checks import CHECKS
+
+
+@pytest.mark.parametrize("name", list(CHECKS))
+def test_publish_check(name: str, mock_server: MockTableauServer, tmp_path: Path):
+    # Each check raises CheckFailed when the server state is wrong
+    CHECKS[name](mock_server, tmp_path)